@@ -1,22 +1,43 @@
 # backend/ai_service.py
 
+import asyncio
 import httpx
+import hashlib
 import json
 import logging
+import os
 import re
+import time
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import TYPE_CHECKING, Any, AsyncIterator, Dict, Iterator, List, Optional
+from pydantic import ValidationError
+from .anomaly import get_anomaly_detector
+from .cache import CategorizationCache
+from .metrics import REGISTRY
+from .llm_router import LLMRouter, NoBackendAvailable, OLLAMA_BACKENDS, parse_backends
+from .normalization import normalize_description
+from .recurring import get_recurring_index
+from .rules import get_rules_engine
 from .schemas import CategorizationResponse
+from .transactions import Transaction
+
+if TYPE_CHECKING:
+    # NumPy n'est importé qu'à la première utilisation de l'index d'embeddings
+    from .vector_index import VectorIndex
 
 OLLAMA_API_URL = "http://localhost:11434/api/generate"
 LLM_MODEL = "llama3.2:3b"
+CACHE_DB_PATH = os.getenv("REVELIO_CACHE_PATH", "revelio_cache.sqlite3")
 
-logger = logging.getLogger(__name__)
+# Paramètres du pool de connexions HTTP partagé vers Ollama
+OLLAMA_CONNECT_TIMEOUT = float(os.getenv("OLLAMA_CONNECT_TIMEOUT", "5"))
+OLLAMA_READ_TIMEOUT = float(os.getenv("OLLAMA_READ_TIMEOUT", "60"))
+OLLAMA_MAX_CONNECTIONS = int(os.getenv("OLLAMA_MAX_CONNECTIONS", "16"))
+OLLAMA_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("OLLAMA_MAX_KEEPALIVE_CONNECTIONS", "8"))
+OLLAMA_KEEPALIVE_EXPIRY = float(os.getenv("OLLAMA_KEEPALIVE_EXPIRY", "30"))
 
-async def categorize_transaction(description: str) -> CategorizationResponse:
-    """
-    Interacts with the Ollama API to categorize a transaction based on its description.
-    Includes detailed logging and an increased timeout.
-    """
-    prompt = f"""
+PROMPT_TEMPLATE = """
     SYSTEM: Tu es un expert comptable. Analyse le libellé de transaction suivant.
     Retourne **UNIQUEMENT** un objet JSON valide avec les clés "marchand_probable", "categorie_suggeree", et "ville".
     La catégorie DOIT être une de ces valeurs : [Alimentation, Logement, Transport, Loisirs, Santé, Abonnements, Autre].
@@ -25,60 +46,609 @@ async def categorize_transaction(description: str) -> CategorizationResponse:
     USER: {description}
     """
 
+# Nombre maximal de libellés regroupés dans un même prompt
+LLM_BATCH_SIZE = int(os.getenv("REVELIO_LLM_BATCH_SIZE", "25"))
+
+# Génération en flux : la réponse est lue au fil des tokens et coupée dès que l'objet JSON est complet
+OLLAMA_STREAM = os.getenv("OLLAMA_STREAM", "1").lower() not in ("0", "false", "no")
+# Plafonds de tokens générés : un objet pour un libellé, et par libellé dans un lot
+LLM_NUM_PREDICT = int(os.getenv("REVELIO_LLM_NUM_PREDICT", "128"))
+LLM_NUM_PREDICT_PER_ITEM = int(os.getenv("REVELIO_LLM_NUM_PREDICT_PER_ITEM", "64"))
+LLM_STOP_SEQUENCES = ["```", "\n\n\n"]
+# Durée pendant laquelle Ollama garde le modèle en mémoire après une requête
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+
+# Journalisation des prompts et réponses du LLM (libellés bancaires inclus) : réservée au débogage
+LOG_LLM_PAYLOADS = os.getenv("REVELIO_LOG_LLM_PAYLOADS", "0").lower() in ("1", "true", "yes")
+
+# Catégorisation par plus proche voisin : un libellé dont l'embedding est assez proche
+# d'un libellé déjà catégorisé reprend sa catégorisation sans appel de génération
+EMBEDDINGS_ENABLED = os.getenv("REVELIO_EMBEDDINGS", "0").lower() in ("1", "true", "yes")
+EMBEDDING_MODEL = os.getenv("OLLAMA_EMBEDDING_MODEL", "nomic-embed-text")
+EMBEDDING_THRESHOLD = float(os.getenv("REVELIO_EMBEDDING_THRESHOLD", "0.92"))
+VECTOR_INDEX_PATH = os.getenv("REVELIO_VECTOR_INDEX_PATH", "revelio_vectors.sqlite3")
+
+BATCH_PROMPT_TEMPLATE = """
+    SYSTEM: Tu es un expert comptable. Analyse chacun des libellés de transaction numérotés ci-dessous.
+    Retourne **UNIQUEMENT** un objet JSON valide de la forme {{"resultats": [...]}}.
+    Le tableau "resultats" DOIT contenir exactement {count} objets, dans l'ordre des libellés, chacun avec les clés "marchand_probable", "categorie_suggeree", et "ville".
+    La catégorie DOIT être une de ces valeurs : [Alimentation, Logement, Transport, Loisirs, Santé, Abonnements, Autre].
+    Ne fournis aucune explication ou texte en dehors de l'objet JSON.
+
+    USER:
+    {descriptions}
+    """
+
+ANOMALY_PROMPT_TEMPLATE = """
+    SYSTEM: Tu es un conseiller bancaire. Une dépense inhabituelle a été détectée.
+    Explique en une phrase courte, en français, pourquoi elle sort de l'ordinaire, en citant les chiffres fournis.
+    Retourne **UNIQUEMENT** un objet JSON valide avec la clé "justification".
+
+    USER: Dépense de {amount:.2f} € chez "{description}" ({reference} "{name}").
+    Historique : {count} dépenses, moyenne {mean:.2f} €, écart-type {std:.2f} €.
+    """
+
+logger = logging.getLogger(__name__)
+
+_LOOKUP_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.05)
+LOOKUP_SECONDS = REGISTRY.histogram(
+    "revelio_lookup_seconds", "Time spent in a categorization lookup before the LLM.", ["stage"], _LOOKUP_BUCKETS)
+CATEGORIZATIONS = REGISTRY.counter(
+    "revelio_categorizations_total", "Categorized descriptions by source of the answer.", ["source"])
+LLM_REQUEST_SECONDS = REGISTRY.histogram(
+    "revelio_llm_request_seconds", "Duration of Ollama requests.", ["endpoint", "outcome"])
+LLM_PARSE_SECONDS = REGISTRY.histogram(
+    "revelio_llm_parse_seconds", "Time spent extracting the JSON value from an Ollama answer.", [], _LOOKUP_BUCKETS)
+LLM_TOKENS = REGISTRY.counter("revelio_llm_generated_tokens_total", "Tokens generated by Ollama.")
+LLM_TOKENS_PER_SECOND = REGISTRY.histogram(
+    "revelio_llm_tokens_per_second", "Ollama generation speed (eval_count / eval_duration).",
+    buckets=(1, 2, 5, 10, 20, 35, 50, 75, 100, 150, 250, 500))
+
+_cache: Optional[CategorizationCache] = None
+_http_client: Optional[httpx.AsyncClient] = None
+_router: Optional[LLMRouter] = None
+_vector_index: Optional["VectorIndex"] = None
+# Categorizations in progress, by dedup key: concurrent callers share the same future
+_in_flight: Dict[str, "asyncio.Future[CategorizationResponse]"] = {}
+# Generation requests sent from the current context (see count_llm_requests)
+_llm_requests: ContextVar[Optional[List[int]]] = ContextVar("llm_requests", default=None)
+# Returned by _generate_json when Ollama could not be reached, as opposed to a bad answer (None)
+_UNAVAILABLE = object()
+
+def create_http_client() -> httpx.AsyncClient:
+    """Builds an AsyncClient configured with the Ollama pool limits and timeouts."""
+    return httpx.AsyncClient(
+        timeout=httpx.Timeout(
+            connect=OLLAMA_CONNECT_TIMEOUT,
+            read=OLLAMA_READ_TIMEOUT,
+            write=OLLAMA_CONNECT_TIMEOUT,
+            pool=OLLAMA_READ_TIMEOUT,
+        ),
+        limits=httpx.Limits(
+            max_connections=OLLAMA_MAX_CONNECTIONS,
+            max_keepalive_connections=OLLAMA_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=OLLAMA_KEEPALIVE_EXPIRY,
+        ),
+    )
+
+async def start_http_client() -> httpx.AsyncClient:
+    """Opens the application-scoped client. Called from the FastAPI lifespan."""
+    global _http_client
+    if _http_client is None:
+        _http_client = create_http_client()
+    return _http_client
+
+async def close_http_client() -> None:
+    """Closes the application-scoped client and its pooled connections."""
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+@asynccontextmanager
+async def ollama_client() -> AsyncIterator[httpx.AsyncClient]:
+    """
+    Yields the shared pooled client when the application lifespan has started it,
+    or a short-lived client otherwise (scripts, tests without lifespan).
+    """
+    if _http_client is not None:
+        yield _http_client
+    else:
+        async with create_http_client() as client:
+            yield client
+
+def get_llm_router() -> LLMRouter:
+    """
+    Returns the router spreading requests over the Ollama instances listed in
+    OLLAMA_BACKENDS (the single OLLAMA_API_URL instance when unset).
+    """
+    global _router
+    if _router is None:
+        default_url = OLLAMA_API_URL.rsplit("/api/", 1)[0]
+        _router = LLMRouter(parse_backends(OLLAMA_BACKENDS, default_url))
+    return _router
+
+def prompt_fingerprint() -> str:
+    """
+    Fingerprint of the model and prompt: changing either one invalidates
+    every cached categorization.
+    """
+    return hashlib.sha256(f"{LLM_MODEL}\n{PROMPT_TEMPLATE}\n{BATCH_PROMPT_TEMPLATE}".encode("utf-8")).hexdigest()
+
+def get_cache() -> CategorizationCache:
+    """Returns the categorization cache, opened on first use."""
+    global _cache
+    fingerprint = prompt_fingerprint()
+    if _cache is None or _cache.fingerprint != fingerprint:
+        if _cache is not None:
+            _cache.close()
+        _cache = CategorizationCache(CACHE_DB_PATH, fingerprint)
+    return _cache
+
+def get_vector_index() -> "VectorIndex":
+    """
+    Returns the embeddings index of categorized descriptions, opened on first use and
+    reopened (purging stale entries) when the embedding model or the prompt fingerprint changes.
+    """
+    from .vector_index import VectorIndex
+
+    global _vector_index
+    fingerprint = prompt_fingerprint()
+    if _vector_index is None or _vector_index.model != EMBEDDING_MODEL or _vector_index.fingerprint != fingerprint:
+        if _vector_index is not None:
+            _vector_index.close()
+        _vector_index = VectorIndex(VECTOR_INDEX_PATH, EMBEDDING_MODEL, fingerprint)
+    return _vector_index
+
+REGISTRY.callback("revelio_cache_entries", "Entries in the categorization cache.", "gauge",
+                  lambda: _cache.stats()["entries"] if _cache is not None else None)
+REGISTRY.callback("revelio_cache_hits_total", "Categorization cache hits.", "counter",
+                  lambda: _cache.hits if _cache is not None else None)
+REGISTRY.callback("revelio_cache_misses_total", "Categorization cache misses.", "counter",
+                  lambda: _cache.misses if _cache is not None else None)
+REGISTRY.callback("revelio_vector_index_entries", "Descriptions in the embeddings index.", "gauge",
+                  lambda: len(_vector_index) if _vector_index is not None else None)
+REGISTRY.callback("revelio_llm_backend_in_flight", "Requests in flight per Ollama instance.", "gauge",
+                  lambda: {(b.base_url,): b.in_flight for b in _router.backends} if _router is not None else {},
+                  ["backend"])
+REGISTRY.callback("revelio_llm_backend_available", "1 if the Ollama instance is healthy with a closed circuit.", "gauge",
+                  lambda: {(b.base_url,): int(b.healthy and not b.is_open(time.monotonic())) for b in _router.backends}
+                  if _router is not None else {},
+                  ["backend"])
+
+def _fallback_response() -> CategorizationResponse:
+    return CategorizationResponse(marchand_probable="Unknown", categorie_suggeree="Autre", ville=None)
+
+def is_fallback(response: CategorizationResponse) -> bool:
+    """Tells whether a categorization is the default answer returned when Ollama failed."""
+    return response == _fallback_response()
+
+async def categorize_transaction(description: str) -> CategorizationResponse:
+    """
+    Categorizes a transaction based on its description.
+    The merchant rules, the known recurring payments and the persistent cache are checked first; Ollama is only
+    queried on a miss, and successful answers are cached for the next occurrences
+    of the libellé.
+    """
+    known = _lookup_known(description, get_rules_engine(), get_recurring_index(), get_cache())
+    if known is not None:
+        return known
+    key = dedup_key(description)
+    return (await _categorize_pending({key: description}))[key]
+
+async def categorize_batch(descriptions: List[str], use_recurring: bool = True) -> List[CategorizationResponse]:
+    """
+    Categorizes several transactions, returning one result per input description, in order.
+
+    Descriptions are deduplicated on their normalized form and resolved by the merchant
+    rules, the known recurring payments or the cache when possible; the remaining ones are sent to Ollama by groups of LLM_BATCH_SIZE in a single prompt
+    that shares the system instructions. A group whose answer is malformed or has the
+    wrong length is retried item by item; a group whose request fails (Ollama unreachable)
+    gets the fallback answer for every item without further requests.
+
+    With `use_recurring=False`, the categorizations stored for known recurring payments
+    are not reused, so a re-categorization run gets fresh answers for them too.
+    """
+    rules = get_rules_engine()
+    recurring = get_recurring_index() if use_recurring else None
+    cache = get_cache()
+    results: Dict[str, CategorizationResponse] = {}
+    pending: Dict[str, str] = {}
+    for description in descriptions:
+        key = dedup_key(description)
+        if key in results or key in pending:
+            continue
+        cached = _lookup_known(description, rules, recurring, cache)
+        if cached is not None:
+            results[key] = cached
+        else:
+            pending[key] = description
+
+    results.update(await _categorize_pending(pending))
+    return [results[dedup_key(description)] for description in descriptions]
+
+async def _categorize_pending(pending: Dict[str, str]) -> Dict[str, CategorizationResponse]:
+    """
+    Categorizes descriptions missed by the rules and the cache, keyed by dedup key.
+
+    Single flight: a description already being categorized by another caller is not
+    sent again, the caller waits for that answer instead. If the first caller fails or
+    is cancelled, the waiting ones categorize the description themselves.
+    """
+    loop = asyncio.get_running_loop()
+    shared = {key: _in_flight[key] for key in pending if key in _in_flight}
+    owned = {key: loop.create_future() for key in pending if key not in shared}
+    _in_flight.update(owned)
+    try:
+        results = await _categorize_new({key: pending[key] for key in owned})
+        for key, future in owned.items():
+            future.set_result(results[key])
+    finally:
+        for key, future in owned.items():
+            if not future.done():
+                future.cancel()
+            if _in_flight.get(key) is future:
+                del _in_flight[key]
+
+    retry: Dict[str, str] = {}
+    for key, future in shared.items():
+        try:
+            results[key] = await asyncio.shield(future)
+            CATEGORIZATIONS.inc(source="coalesced")
+        except asyncio.CancelledError:
+            if not future.cancelled():
+                raise
+            retry[key] = pending[key]
+    if retry:
+        results.update(await _categorize_pending(retry))
+    return results
+
+async def _categorize_new(pending: Dict[str, str]) -> Dict[str, CategorizationResponse]:
+    """
+    Categorizes descriptions no other caller is working on, keyed by dedup key.
+    With REVELIO_EMBEDDINGS, descriptions close enough to an already categorized one
+    reuse its answer; the others go to the LLM and are then added to the index.
+    """
+    cache = get_cache()
+    results: Dict[str, CategorizationResponse] = {}
+    vectors: Dict[str, List[float]] = {}
+    if EMBEDDINGS_ENABLED and pending:
+        vectors = await _embed(list(pending)) or {}
+        if vectors:
+            keys = list(vectors)
+            for key, match in zip(keys, get_vector_index().match([vectors[key] for key in keys], EMBEDDING_THRESHOLD)):
+                if match is not None:
+                    results[key] = match
+                    cache.set(pending[key], match)
+                    CATEGORIZATIONS.inc(source="embedding")
+
+    keys = [key for key in pending if key not in results]
+    for i in range(0, len(keys), LLM_BATCH_SIZE):
+        chunk = keys[i:i + LLM_BATCH_SIZE]
+        chunk_descriptions = [pending[key] for key in chunk]
+        chunk_results = await _query_llm_batch(chunk_descriptions) if len(chunk) > 1 else None
+        if chunk_results is _UNAVAILABLE:
+            # Ollama injoignable : inutile de relancer chaque libellé séparément
+            chunk_results = [_fallback_response() for _ in chunk]
+        elif chunk_results is None:
+            chunk_results = await asyncio.gather(*(_categorize_uncached(d) for d in chunk_descriptions))
+        else:
+            for description, result in zip(chunk_descriptions, chunk_results):
+                cache.set(description, result)
+        for key, result in zip(chunk, chunk_results):
+            results[key] = result
+            CATEGORIZATIONS.inc(source="fallback" if is_fallback(result) else "llm")
+            if key in vectors and not is_fallback(result):
+                get_vector_index().add(key, vectors[key], result)
+
+    return results
+
+async def _embed(keys: List[str]) -> Optional[Dict[str, List[float]]]:
+    """
+    Embeds normalized descriptions in one request to Ollama's /api/embed endpoint.
+    Returns None on failure, so that the descriptions simply go to generation.
+    """
+    payload = {"model": EMBEDDING_MODEL, "input": keys, "keep_alive": OLLAMA_KEEP_ALIVE}
+    started = time.perf_counter()
+    async with ollama_client() as client:
+        try:
+            async with get_llm_router().backend() as backend:
+                response = await client.post(backend.url("/api/embed"), json=payload)
+                response.raise_for_status()
+            embeddings = response.json().get("embeddings")
+            LLM_REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint="embed", outcome="ok")
+        except (httpx.HTTPError, NoBackendAvailable, ValueError, AttributeError) as e:
+            LLM_REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint="embed", outcome="error")
+            logger.error(f"Ollama embedding request failed: {repr(e)}. Skipping nearest-neighbour lookup.")
+            return None
+    if not isinstance(embeddings, list) or len(embeddings) != len(keys):
+        logger.warning("Embedding answer from Ollama is malformed. Skipping nearest-neighbour lookup.")
+        return None
+    return dict(zip(keys, embeddings))
+
+async def preload_models() -> int:
+    """
+    Loads the generation model (and the embedding model with REVELIO_EMBEDDINGS) into
+    every available Ollama instance, kept in memory for OLLAMA_KEEP_ALIVE, so that the
+    first categorization does not pay the model load time.
+    Returns the number of instances ready; raises the last error if none is.
+    """
+    router = get_llm_router()
+    requests = [("/api/generate", {"model": LLM_MODEL, "keep_alive": OLLAMA_KEEP_ALIVE})]
+    if EMBEDDINGS_ENABLED:
+        requests.append(("/api/embed", {"model": EMBEDDING_MODEL, "input": ".", "keep_alive": OLLAMA_KEEP_ALIVE}))
+
+    async def preload(backend) -> None:
+        for path, payload in requests:
+            response = await client.post(backend.url(path), json=payload)
+            response.raise_for_status()
+
+    async with ollama_client() as client:
+        backends = router.available()
+        if not backends:
+            raise NoBackendAvailable("No healthy Ollama instance to load the model into.")
+        outcomes = await asyncio.gather(*(preload(backend) for backend in backends), return_exceptions=True)
+    errors = [outcome for outcome in outcomes if isinstance(outcome, Exception)]
+    if len(errors) == len(outcomes):
+        raise errors[-1]
+    for backend, outcome in zip(backends, outcomes):
+        if isinstance(outcome, Exception):
+            logger.warning(f"Could not load {LLM_MODEL} into {backend.base_url}: {repr(outcome)}")
+    return len(outcomes) - len(errors)
+
+def _lookup_known(description: str, rules, recurring, cache) -> Optional[CategorizationResponse]:
+    """Merchant rules, then known recurring payments (unless `recurring` is None), then the cache; each stage is timed."""
+    stages = [("rules", rules.match), ("cache", cache.get)]
+    if recurring is not None:
+        # Les séries catégorisées sous un autre modèle ou prompt sont ignorées, comme le cache
+        stages.insert(1, ("recurring", lambda d: recurring.match(d, cache.fingerprint)))
+    for stage, lookup in stages:
+        started = time.perf_counter()
+        result = lookup(description)
+        LOOKUP_SECONDS.observe(time.perf_counter() - started, stage=stage)
+        if result is not None:
+            CATEGORIZATIONS.inc(source=stage)
+            return result
+    return None
+
+def dedup_key(description: str) -> str:
+    """Key under which identical descriptions are grouped (normalized form, or raw when empty)."""
+    return normalize_description(description) or description
+
+async def _categorize_uncached(description: str) -> CategorizationResponse:
+    result = await _query_llm(description)
+    if result is None:
+        return _fallback_response()
+    get_cache().set(description, result)
+    return result
+
+async def _query_llm(description: str) -> Optional[CategorizationResponse]:
+    """
+    Asks Ollama to categorize a single transaction description. Returns None on failure.
+    """
+    if LOG_LLM_PAYLOADS:
+        logger.info(f"Sending request to Ollama for description: '{description}'")
+    data = await _generate_json(PROMPT_TEMPLATE.format(description=description))
+    if not isinstance(data, dict):
+        return None
+    try:
+        return CategorizationResponse(**data)
+    except ValidationError as e:
+        logger.error(f"LLM answer does not match the expected schema: {repr(e)}. Falling back to default.")
+        return None
+
+async def _query_llm_batch(descriptions: List[str]) -> Any:
+    """
+    Asks Ollama to categorize several descriptions in one request.
+    Returns None if the answer is not an array of exactly len(descriptions) valid objects,
+    and _UNAVAILABLE if Ollama could not be reached, so that the caller does not retry
+    each description against an instance that is down.
+    """
+    lines = "\n".join(f"{i + 1}. {description}" for i, description in enumerate(descriptions))
+    logger.debug(f"Sending batch request to Ollama for {len(descriptions)} descriptions.")
+    data = await _generate_json(BATCH_PROMPT_TEMPLATE.format(count=len(descriptions), descriptions=lines),
+                                num_predict=LLM_NUM_PREDICT + LLM_NUM_PREDICT_PER_ITEM * len(descriptions))
+    if data is _UNAVAILABLE:
+        return _UNAVAILABLE
+
+    items = data
+    if isinstance(data, dict):
+        items = data.get("resultats")
+        if items is None:
+            items = next((value for value in data.values() if isinstance(value, list)), None)
+    if not isinstance(items, list) or len(items) != len(descriptions):
+        logger.warning("Batch answer from LLM is malformed or has the wrong length. Retrying item by item.")
+        return None
+    try:
+        return [CategorizationResponse(**item) for item in items]
+    except (TypeError, ValidationError) as e:
+        logger.warning(f"Batch answer from LLM does not match the expected schema: {repr(e)}. Retrying item by item.")
+        return None
+
+class _JSONValueScanner:
+    """
+    Finds the end of the first JSON object or array in a text received piece by piece.
+    Braces inside strings are ignored; `value` holds the complete JSON text once found.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.value: Optional[str] = None
+        self._position = 0
+        self._start = -1
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+
+    def feed(self, fragment: str) -> bool:
+        self.text += fragment
+        for i in range(self._position, len(self.text)):
+            char = self.text[i]
+            if self._start == -1:
+                if char in "{[":
+                    self._start, self._depth = i, 1
+                continue
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char in "{[":
+                self._depth += 1
+            elif char in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    self.value = self.text[self._start:i + 1]
+                    return True
+        self._position = len(self.text)
+        return False
+
+async def _read_generation(client: httpx.AsyncClient, url: str, payload: dict) -> str:
+    """
+    Reads an Ollama generation line by line and returns the first complete JSON value
+    it contains (or the whole text if none completes). The stream is closed as soon as
+    that value has been received, which makes Ollama stop generating: trailing
+    whitespace or text after the object is never produced.
+
+    The generation speed comes from Ollama's eval_count/eval_duration when the final
+    line is read, otherwise from the streamed tokens counted since the first one.
+    """
+    scanner = _JSONValueScanner()
+    streamed_tokens, first_token_at, eval_stats = 0, None, None
+    async with client.stream("POST", url, json=payload) as response:
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            if not line.strip():
+                continue
+            chunk = json.loads(line)
+            if chunk.get("done"):
+                eval_stats = (chunk.get("eval_count"), chunk.get("eval_duration"))
+            else:
+                streamed_tokens += 1
+                first_token_at = first_token_at or time.perf_counter()
+            if scanner.feed(chunk.get("response", "")) or chunk.get("done"):
+                break
+
+    if eval_stats and eval_stats[0] and eval_stats[1]:
+        _record_tokens(eval_stats[0], eval_stats[1] / 1e9)
+    elif streamed_tokens > 1:
+        _record_tokens(streamed_tokens, time.perf_counter() - first_token_at)
+    return scanner.value or scanner.text
+
+def _record_tokens(count: int, seconds: float) -> None:
+    LLM_TOKENS.inc(count)
+    if seconds > 0:
+        LLM_TOKENS_PER_SECOND.observe(count / seconds)
+
+@contextmanager
+def count_llm_requests() -> Iterator[List[int]]:
+    """
+    Counts the generation requests sent to Ollama inside the block, including those
+    of tasks started from it. The count is in the first item of the yielded list.
+    """
+    counter = [0]
+    token = _llm_requests.set(counter)
+    try:
+        yield counter
+    finally:
+        _llm_requests.reset(token)
+
+async def _generate_json(prompt: str, num_predict: int = LLM_NUM_PREDICT) -> Any:
+    """
+    Sends a prompt to Ollama and returns the JSON value found in its answer, None when
+    the answer holds no usable JSON, or _UNAVAILABLE when no instance could be reached
+    (network error, HTTP error status, open circuits). `num_predict` caps the number of generated tokens for this request.
+    Prompts and answers are only logged when REVELIO_LOG_LLM_PAYLOADS is set.
+    """
     payload = {
         "model": LLM_MODEL,
         "prompt": prompt,
-        "stream": False,
-        "format": "json"
+        "stream": OLLAMA_STREAM,
+        "format": "json",
+        "keep_alive": OLLAMA_KEEP_ALIVE,
+        "options": {"num_predict": num_predict, "stop": LLM_STOP_SEQUENCES}
     }
 
-    # --- MODIFICATION CI-DESSOUS ---
-    # Augmentation du timeout à 60 secondes pour laisser le temps au modèle de répondre.
-    async with httpx.AsyncClient(timeout=60.0) as client:
+    counter = _llm_requests.get()
+    if counter is not None:
+        counter[0] += 1
+    started = time.perf_counter()
+    async with ollama_client() as client:
         try:
-            logger.info(f"Sending request to Ollama for description: '{description}'")
-            response = await client.post(OLLAMA_API_URL, json=payload)
-            response.raise_for_status()
-
-            response_text = response.text.strip()
-            logger.info(f"===== RAW RESPONSE FROM OLLAMA =====\n{response_text}\n====================================")
-            
-            try:
-                # Étape 1 : Extraire le contenu de la clé "response"
-                llm_output_str = json.loads(response_text).get("response", "")
-                if not llm_output_str:
-                    logger.warning("The 'response' key from Ollama is empty.")
-                    raise json.JSONDecodeError("Empty 'response' key from LLM", llm_output_str, 0)
-                
-                logger.info(f"--- Content of 'response' key ---\n{llm_output_str}\n---------------------------------")
-
-                # Étape 2 : Utiliser une expression régulière pour trouver le JSON dans la chaîne
-                match = re.search(r'\{.*\}', llm_output_str, re.DOTALL)
-                
-                if not match:
-                    logger.warning("No JSON object found in the LLM response string.")
-                    raise json.JSONDecodeError("No JSON object found in LLM response string", llm_output_str, 0)
-                
-                json_string_cleaned = match.group(0)
-                logger.info(f"--- Cleaned JSON string found ---\n{json_string_cleaned}\n---------------------------------")
-                
-                # Étape 3 : Parser le JSON nettoyé
-                data = json.loads(json_string_cleaned)
-                logger.info("Successfully parsed the cleaned JSON.")
-                return CategorizationResponse(**data)
-
-            except (json.JSONDecodeError, TypeError) as e:
-                logger.error(f"Failed to parse JSON response from LLM: {repr(e)}. Falling back to default.")
-                return CategorizationResponse(marchand_probable="Unknown", categorie_suggeree="Autre", ville=None)
-
-        except httpx.RequestError as e:
+            async with get_llm_router().backend() as backend:
+                llm_output_str = (await _read_generation(client, backend.url("/api/generate"), payload)).strip()
+            LLM_REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint="generate", outcome="ok")
+        except httpx.HTTPError as e:
             # Modification du log pour avoir plus de détails sur l'erreur
+            LLM_REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint="generate", outcome="error")
             logger.error(f"Ollama request failed: {repr(e)}. Falling back to default.")
-            return CategorizationResponse(marchand_probable="Unknown", categorie_suggeree="Autre", ville=None)
+            return _UNAVAILABLE
+        except (json.JSONDecodeError, AttributeError) as e:
+            LLM_REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint="generate", outcome="error")
+            logger.error(f"Malformed response stream from Ollama: {repr(e)}. Falling back to default.")
+            return None
+        except NoBackendAvailable as e:
+            logger.error(f"No Ollama instance available: {repr(e)}. Falling back to default.")
+            return _UNAVAILABLE
+
+    with LLM_PARSE_SECONDS.time():
+        return _extract_json(llm_output_str)
+
+def _extract_json(llm_output_str: str) -> Any:
+    """Parses the JSON value found in the text generated by the LLM, or returns None."""
+    try:
+        if not llm_output_str:
+            logger.warning("The 'response' key from Ollama is empty.")
+            raise json.JSONDecodeError("Empty 'response' key from LLM", llm_output_str, 0)
+
+        if LOG_LLM_PAYLOADS:
+            logger.info(f"--- Content of 'response' key ---\n{llm_output_str}\n---------------------------------")
+
+        # Utiliser une expression régulière pour trouver le JSON dans la chaîne
+        match = re.search(r'[\{\[].*[\}\]]', llm_output_str, re.DOTALL)
+
+        if not match:
+            logger.warning("No JSON object found in the LLM response string.")
+            raise json.JSONDecodeError("No JSON object found in LLM response string", llm_output_str, 0)
+
+        json_string_cleaned = match.group(0)
+        if LOG_LLM_PAYLOADS:
+            logger.info(f"--- Cleaned JSON string found ---\n{json_string_cleaned}\n---------------------------------")
+
+        # Parser le JSON nettoyé
+        return json.loads(json_string_cleaned)
+
+    except (json.JSONDecodeError, TypeError, AttributeError) as e:
+        logger.error(f"Failed to parse JSON response from LLM: {repr(e)}. Falling back to default.")
+        return None
+
+async def analyze_anomaly(transaction: Transaction, history: Optional[dict] = None) -> dict:
+    """
+    Checks a categorized transaction against the server-side spending statistics
+    of its merchant (or category). Only flagged transactions reach the LLM, which
+    phrases the justification. `history` is no longer needed and is ignored.
+    """
+    verdict = get_anomaly_detector().check(transaction)
+    if verdict["est_anomalie"]:
+        verdict["justification"] = await explain_anomaly(transaction, verdict)
+    return verdict
 
-async def analyze_anomaly(transaction: dict, history: dict) -> dict:
+async def explain_anomaly(transaction: Transaction, verdict: dict) -> str:
     """
-    Interacts with the Ollama API to detect anomalies in transactions.
+    Asks Ollama to phrase why a flagged transaction is unusual.
+    Falls back to a plain sentence built from the statistics.
     """
-    # This will be a mock implementation for now.
-    return {"est_anomalie": False, "justification": "Not implemented yet."}
\ No newline at end of file
+    amount = -transaction.amount
+    reference = "marchand" if verdict["reference"] == "marchand" else "catégorie"
+    data = await _generate_json(ANOMALY_PROMPT_TEMPLATE.format(
+        amount=amount, description=transaction.description or "", reference=reference,
+        name=verdict["nom"], count=verdict["historique"], mean=verdict["moyenne"], std=verdict["ecart_type"]
+    ))
+    if isinstance(data, dict) and isinstance(data.get("justification"), str) and data["justification"].strip():
+        return data["justification"].strip()
+    return (f"Dépense de {amount:.2f} € pour une moyenne de {verdict['moyenne']:.2f} € "
+            f"sur {verdict['historique']} dépenses ({reference} {verdict['nom']}).")
@@ -0,0 +1,181 @@
+# backend/analytics.py
+
+import threading
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from .storage import TransactionStore, get_store
+
+UNCATEGORIZED = "Non catégorisé"
+UNKNOWN_MERCHANT = "Inconnu"
+
+
+class _Dictionary:
+    """Encodage des valeurs textuelles d'une colonne en codes entiers."""
+
+    def __init__(self):
+        self.values: List[str] = []
+        self._codes: Dict[str, int] = {}
+
+    def encode(self, value: str) -> int:
+        code = self._codes.get(value)
+        if code is None:
+            code = self._codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def code_of(self, value: str) -> Optional[int]:
+        return self._codes.get(value)
+
+
+def _to_day(value: str) -> int:
+    """Date 'YYYY-MM-DD' → nombre de jours depuis le 1er janvier 1970 (ValueError si invalide)."""
+    return int(np.datetime64(value, "D").astype(np.int64))
+
+
+class TransactionColumns:
+    """
+    Copie en colonnes (tableaux NumPy) des transactions stockées, pour les agrégats.
+
+    Chaque colonne textuelle (compte, catégorie, marchand) est encodée en entiers :
+    un agrégat par groupe est un `np.bincount`, un solde cumulé un `np.cumsum`,
+    sans boucle Python sur les lignes. `refresh()` ne lit dans SQLite que les
+    lignes insérées ou enrichies depuis le rafraîchissement précédent.
+    """
+
+    def __init__(self, store: TransactionStore):
+        self.store = store
+        self._lock = threading.Lock()
+        self._last_id = 0
+        self._last_enriched_at = 0.0
+        self.accounts = _Dictionary()
+        self.categories = _Dictionary()
+        self.merchants = _Dictionary()
+        self.ids = np.empty(0, dtype=np.int64)
+        self.days = np.empty(0, dtype=np.int32)
+        self.amounts = np.empty(0, dtype=np.int64)
+        self.account_codes = np.empty(0, dtype=np.int32)
+        self.category_codes = np.empty(0, dtype=np.int32)
+        self.merchant_codes = np.empty(0, dtype=np.int32)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def refresh(self) -> None:
+        with self._lock:
+            rows = self.store.changes_since(self._last_id, self._last_enriched_at)
+            if not rows:
+                return
+            ids, accounts, dates, amounts, merchants, categories, enriched = zip(*rows)
+            ids = np.fromiter(ids, dtype=np.int64, count=len(rows))
+            category_codes = np.fromiter((self.categories.encode(c or UNCATEGORIZED) for c in categories),
+                                         dtype=np.int32, count=len(rows))
+            merchant_codes = np.fromiter((self.merchants.encode(m or UNKNOWN_MERCHANT) for m in merchants),
+                                         dtype=np.int32, count=len(rows))
+
+            # Lignes déjà chargées dont l'enrichissement a changé
+            known = ids <= self._last_id
+            if known.any():
+                positions = np.searchsorted(self.ids, ids[known])
+                self.category_codes[positions] = category_codes[known]
+                self.merchant_codes[positions] = merchant_codes[known]
+
+            new = ~known
+            if new.any():
+                self.ids = np.concatenate([self.ids, ids[new]])
+                self.days = np.concatenate([self.days, np.array(dates, dtype="datetime64[D]")[new].astype(np.int32)])
+                self.amounts = np.concatenate([self.amounts, np.array(amounts, dtype=np.int64)[new]])
+                self.account_codes = np.concatenate([
+                    self.account_codes,
+                    np.fromiter((self.accounts.encode(a) for a in accounts), dtype=np.int32, count=len(rows))[new]
+                ])
+                self.category_codes = np.concatenate([self.category_codes, category_codes[new]])
+                self.merchant_codes = np.concatenate([self.merchant_codes, merchant_codes[new]])
+                self._last_id = int(self.ids[-1])
+            self._last_enriched_at = max([self._last_enriched_at, *filter(None, enriched)])
+
+    def mask(self, date_from: Optional[str] = None, date_to: Optional[str] = None,
+             account_id: Optional[str] = None) -> np.ndarray:
+        """Sélection des lignes d'une période (bornes incluses) et/ou d'un compte."""
+        selected = np.ones(len(self), dtype=bool)
+        if date_from:
+            selected &= self.days >= _to_day(date_from)
+        if date_to:
+            selected &= self.days <= _to_day(date_to)
+        if account_id is not None:
+            code = self.accounts.code_of(account_id)
+            selected &= self.account_codes == (-1 if code is None else code)
+        return selected
+
+    @staticmethod
+    def _aggregate(codes: np.ndarray, amounts: np.ndarray, labels: List[str]) -> List[dict]:
+        """Dépenses, revenus, solde net et nombre de transactions par code, par dépenses décroissantes."""
+        size = len(labels)
+        debits = np.bincount(codes, weights=np.where(amounts < 0, -amounts, 0), minlength=size)
+        credits = np.bincount(codes, weights=np.where(amounts > 0, amounts, 0), minlength=size)
+        counts = np.bincount(codes, minlength=size)
+        present = np.flatnonzero(counts)
+        order = present[np.argsort(-debits[present], kind="stable")]
+        return [
+            {"cle": labels[code], "depenses": debits[code] / 100, "revenus": credits[code] / 100,
+             "net": (credits[code] - debits[code]) / 100, "nombre": int(counts[code])}
+            for code in order
+        ]
+
+    def by_category(self, **filters) -> List[dict]:
+        selected = self.mask(**filters)
+        return self._aggregate(self.category_codes[selected], self.amounts[selected], self.categories.values)
+
+    def by_merchant(self, limit: Optional[int] = None, **filters) -> List[dict]:
+        selected = self.mask(**filters)
+        return self._aggregate(self.merchant_codes[selected], self.amounts[selected], self.merchants.values)[:limit]
+
+    def by_month(self, **filters) -> List[dict]:
+        """Agrégats par mois, dans l'ordre chronologique."""
+        selected = self.mask(**filters)
+        months = self.days[selected].astype("datetime64[D]").astype("datetime64[M]")
+        unique_months, codes = np.unique(months, return_inverse=True)
+        labels = [str(month) for month in unique_months]
+        rows = {row["cle"]: row for row in self._aggregate(codes.astype(np.int64), self.amounts[selected], labels)}
+        return [rows[label] for label in labels]
+
+    def running_balance(self, **filters) -> List[dict]:
+        """
+        Solde cumulé en fin de journée, par compte, depuis la première transaction
+        sélectionnée (les relevés OFX ne donnent pas toujours le solde d'ouverture).
+        """
+        selected = np.flatnonzero(self.mask(**filters))
+        accounts = self.account_codes[selected]
+        days = self.days[selected]
+        order = np.lexsort((self.ids[selected], days, accounts))
+        accounts, days = accounts[order], days[order]
+        totals = np.cumsum(self.amounts[selected][order])
+        if not len(totals):
+            return []
+
+        # Repartir de zéro à chaque changement de compte
+        starts = np.flatnonzero(np.r_[True, accounts[1:] != accounts[:-1]])
+        offsets = np.r_[0, totals[starts[1:] - 1]]
+        balances = totals - np.repeat(offsets, np.diff(np.r_[starts, len(totals)]))
+
+        # Garder la dernière transaction de chaque jour
+        last_of_day = np.r_[(accounts[1:] != accounts[:-1]) | (days[1:] != days[:-1]), True]
+        dates = np.datetime_as_string(days[last_of_day].astype("datetime64[D]"))
+        return [
+            {"account_id": self.accounts.values[account], "date": str(date), "solde": int(balance) / 100}
+            for account, date, balance in zip(accounts[last_of_day], dates, balances[last_of_day])
+        ]
+
+
+_columns: Optional[TransactionColumns] = None
+
+
+def get_columns() -> TransactionColumns:
+    """Retourne les colonnes des transactions stockées, à jour des derniers imports."""
+    global _columns
+    store = get_store()
+    if _columns is None or _columns.store is not store:
+        _columns = TransactionColumns(store)
+    _columns.refresh()
+    return _columns
@@ -0,0 +1,179 @@
+# backend/anomaly.py
+
+import math
+import os
+import threading
+from typing import Dict, Optional, Tuple
+
+from .storage import TransactionStore, get_store
+from .transactions import Transaction
+
+# Historique minimal (nombre de dépenses) avant de juger un marchand ou une catégorie
+ANOMALY_MIN_HISTORY = int(os.getenv("REVELIO_ANOMALY_MIN_HISTORY", "5"))
+# Écart à la moyenne, en écarts-types, à partir duquel une dépense est suspecte
+ANOMALY_Z_THRESHOLD = float(os.getenv("REVELIO_ANOMALY_Z_THRESHOLD", "3"))
+# La dépense doit aussi dépasser ce quantile des dépenses observées...
+ANOMALY_QUANTILE = float(os.getenv("REVELIO_ANOMALY_QUANTILE", "0.95"))
+# ... et ce multiple de la moyenne (évite de signaler un abonnement qui passe de 13,49 € à 13,99 €)
+ANOMALY_MIN_RATIO = float(os.getenv("REVELIO_ANOMALY_MIN_RATIO", "1.5"))
+
+# Précision relative du sketch de quantiles
+_SKETCH_ACCURACY = 0.02
+_SKETCH_GAMMA = (1 + _SKETCH_ACCURACY) / (1 - _SKETCH_ACCURACY)
+_SKETCH_LOG_GAMMA = math.log(_SKETCH_GAMMA)
+
+
+class RunningStats:
+    """
+    Statistiques glissantes d'une série de montants, mises à jour en O(1).
+
+    La moyenne et la variance suivent l'algorithme de Welford. Les quantiles viennent
+    d'un sketch à buckets logarithmiques (précision relative de 2 %) : la mémoire
+    dépend de l'étendue des montants, pas de leur nombre.
+    """
+
+    __slots__ = ("count", "mean", "_m2", "_buckets", "_zeros")
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+        self._buckets: Dict[int, int] = {}
+        self._zeros = 0
+
+    def add(self, value: float) -> None:
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (value - self.mean)
+        if value <= 0:
+            self._zeros += 1
+        else:
+            index = math.ceil(math.log(value) / _SKETCH_LOG_GAMMA)
+            self._buckets[index] = self._buckets.get(index, 0) + 1
+
+    @property
+    def std(self) -> float:
+        return math.sqrt(self._m2 / (self.count - 1)) if self.count > 1 else 0.0
+
+    def quantile(self, q: float) -> float:
+        if not self.count:
+            return 0.0
+        rank = q * (self.count - 1)
+        seen = self._zeros
+        if rank < seen:
+            return 0.0
+        for index in sorted(self._buckets):
+            seen += self._buckets[index]
+            if rank < seen:
+                return 2 * _SKETCH_GAMMA ** index / (_SKETCH_GAMMA + 1)
+        return 2 * _SKETCH_GAMMA ** max(self._buckets) / (_SKETCH_GAMMA + 1)
+
+
+class AnomalyDetector:
+    """
+    Détection des dépenses inhabituelles, par marchand (ou par catégorie tant que
+    le marchand a trop peu d'historique).
+
+    Une dépense est anormale si elle s'écarte de plus de `z_threshold` écarts-types
+    de la moyenne, dépasse le quantile `quantile` et vaut au moins `min_ratio` fois
+    la moyenne. Seules les dépenses (montants négatifs) sont suivies. Le test et la
+    mise à jour sont en O(1) ; le quantile n'est calculé que pour les candidats.
+    """
+
+    def __init__(self, min_history: int = ANOMALY_MIN_HISTORY, z_threshold: float = ANOMALY_Z_THRESHOLD,
+                 quantile: float = ANOMALY_QUANTILE, min_ratio: float = ANOMALY_MIN_RATIO):
+        self.min_history = min_history
+        self.z_threshold = z_threshold
+        self.quantile = quantile
+        self.min_ratio = min_ratio
+        self._stats: Dict[Tuple[str, str], RunningStats] = {}
+        self.checked = 0
+        self.flagged = 0
+
+    @classmethod
+    def from_store(cls, store: TransactionStore, **options) -> "AnomalyDetector":
+        """Construit les statistiques à partir des transactions déjà enrichies."""
+        detector = cls(**options)
+        for amount_cents, merchant, category in store.enriched_amounts():
+            detector._observe(amount_cents / 100, merchant, category)
+        return detector
+
+    @staticmethod
+    def _keys(merchant: Optional[str], category: Optional[str]):
+        keys = []
+        if merchant:
+            keys.append(("marchand", merchant))
+        if category:
+            keys.append(("categorie", category))
+        return keys
+
+    def _observe(self, amount: float, merchant: Optional[str], category: Optional[str]) -> None:
+        if amount >= 0:
+            return
+        for key in self._keys(merchant, category):
+            stats = self._stats.get(key)
+            if stats is None:
+                stats = self._stats[key] = RunningStats()
+            stats.add(-amount)
+
+    def observe(self, transaction: Transaction) -> None:
+        """Ajoute une transaction enrichie aux statistiques."""
+        self._observe(transaction.amount, transaction.marchand_probable, transaction.categorie_suggeree)
+
+    def check(self, transaction: Transaction) -> dict:
+        """Juge une transaction enrichie par rapport à l'historique, sans l'y ajouter."""
+        self.checked += 1
+        verdict = {"est_anomalie": False, "justification": None}
+        amount = -transaction.amount
+        if amount <= 0:
+            return verdict
+        for kind, name in self._keys(transaction.marchand_probable, transaction.categorie_suggeree):
+            stats = self._stats.get((kind, name))
+            if stats is None or stats.count < self.min_history:
+                continue
+            std = stats.std
+            score = (amount - stats.mean) / std if std > 0 else (math.inf if amount > stats.mean else 0.0)
+            verdict.update({
+                "reference": kind,
+                "nom": name,
+                "historique": stats.count,
+                "moyenne": round(stats.mean, 2),
+                "ecart_type": round(std, 2),
+                "score": round(score, 2) if math.isfinite(score) else None,
+            })
+            if score >= self.z_threshold and amount >= self.min_ratio * stats.mean:
+                threshold = stats.quantile(self.quantile)
+                verdict["quantile"] = round(threshold, 2)
+                if amount > threshold:
+                    verdict["est_anomalie"] = True
+                    self.flagged += 1
+            return verdict
+        return verdict
+
+    def check_and_observe(self, transaction: Transaction) -> dict:
+        verdict = self.check(transaction)
+        self.observe(transaction)
+        return verdict
+
+    def stats(self) -> dict:
+        return {"series": len(self._stats), "checked": self.checked, "flagged": self.flagged}
+
+
+_detector: Optional[AnomalyDetector] = None
+_lock = threading.Lock()
+
+
+def get_anomaly_detector() -> AnomalyDetector:
+    """
+    Retourne le détecteur, construit à la première utilisation depuis les transactions
+    déjà enrichies. Il doit être obtenu avant d'enregistrer un nouvel enrichissement,
+    pour que chaque transaction ne soit comptée qu'une fois. Le préchauffage peut le
+    construire dans un thread : un seul appelant le construit, les autres l'attendent.
+    """
+    global _detector
+    if _detector is None:
+        with _lock:
+            if _detector is None:
+                _detector = AnomalyDetector.from_store(get_store())
+    return _detector
@@ -0,0 +1,131 @@
+# backend/cache.py
+
+import json
+import logging
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+from .normalization import normalize_description
+from .schemas import CategorizationResponse
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_ENTRIES = 50_000
+DEFAULT_TTL_SECONDS = 90 * 24 * 3600
+
+
+class CategorizationCache:
+    """
+    Cache persistant (SQLite) des catégorisations, indexé par libellé normalisé.
+
+    Les entrées sont évincées par ancienneté d'accès (LRU) au-delà de `max_entries`
+    et expirent après `ttl_seconds`. L'empreinte `fingerprint` (modèle + prompt)
+    est stockée avec chaque entrée : une entrée produite par un autre modèle
+    ou un autre prompt n'est jamais servie et est purgée à l'ouverture.
+    """
+
+    def __init__(self, path: str, fingerprint: str,
+                 max_entries: int = DEFAULT_MAX_ENTRIES,
+                 ttl_seconds: Optional[float] = DEFAULT_TTL_SECONDS):
+        self.path = path
+        self.fingerprint = fingerprint
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS categorizations (
+                key TEXT PRIMARY KEY,
+                fingerprint TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_categorizations_last_access ON categorizations(last_access)"
+        )
+        purged = self._conn.execute(
+            "DELETE FROM categorizations WHERE fingerprint != ?", (fingerprint,)
+        ).rowcount
+        if purged:
+            logger.info(f"Cache de catégorisation : {purged} entrées invalidées (modèle ou prompt modifié).")
+        self._conn.commit()
+        self._size = self._conn.execute("SELECT COUNT(*) FROM categorizations").fetchone()[0]
+
+    def get(self, description: str) -> Optional[CategorizationResponse]:
+        """Retourne la catégorisation en cache pour ce libellé, ou None."""
+        key = normalize_description(description)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT payload, created_at FROM categorizations WHERE key = ? AND fingerprint = ?",
+                (key, self.fingerprint)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            payload, created_at = row
+            if self.ttl_seconds is not None and now - created_at > self.ttl_seconds:
+                self._conn.execute("DELETE FROM categorizations WHERE key = ?", (key,))
+                self._conn.commit()
+                self._size -= 1
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE categorizations SET last_access = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+        return CategorizationResponse(**json.loads(payload))
+
+    def set(self, description: str, response: CategorizationResponse) -> None:
+        """Enregistre la catégorisation d'un libellé et applique l'éviction LRU."""
+        key = normalize_description(description)
+        if not key:
+            return
+        now = time.time()
+        payload = json.dumps(response.model_dump(), ensure_ascii=False)
+        with self._lock:
+            exists = self._conn.execute(
+                "SELECT 1 FROM categorizations WHERE key = ?", (key,)
+            ).fetchone() is not None
+            self._conn.execute(
+                "INSERT OR REPLACE INTO categorizations (key, fingerprint, payload, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, self.fingerprint, payload, now, now)
+            )
+            if not exists:
+                self._size += 1
+            if self._size > self.max_entries:
+                overflow = self._size - self.max_entries
+                self._conn.execute(
+                    "DELETE FROM categorizations WHERE key IN "
+                    "(SELECT key FROM categorizations ORDER BY last_access ASC LIMIT ?)",
+                    (overflow,)
+                )
+                self._size -= overflow
+            self._conn.commit()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM categorizations")
+            self._conn.commit()
+            self._size = 0
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "entries": self._size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
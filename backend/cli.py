@@ -0,0 +1,285 @@
+# backend/cli.py
+"""
+Catégorisation hors ligne d'un répertoire de fichiers OFX, sans serveur web.
+
+    python -m backend.cli releves/ --output sorties/ --format csv --concurrency 8
+
+Chaque fichier .ofx/.qfx du répertoire (sous-répertoires compris) est parsé en flux
+puis enrichi par lots (règles, paiements récurrents, cache, LLM), avec la même
+concurrence adaptative que le serveur et la même base de transactions. Les lignes
+enrichies sont écrites au fil de l'eau dans un fichier CSV ou Parquet par fichier OFX,
+à la même place relative dans le répertoire de sortie (`releve.ofx` → `releve.ofx.csv`).
+
+Le manifeste du répertoire de sortie (`manifest.json`) liste les fichiers terminés :
+une nouvelle exécution, après une interruption par exemple, les saute, sauf si le
+fichier, le modèle ou le prompt a changé entre-temps ; les catégorisations stockées
+sous l'ancien modèle ou prompt ne sont alors pas reprises. Un fichier dont une partie n'a
+pas pu être catégorisée (Ollama indisponible) n'y est pas inscrit et sera repris.
+Après un changement de prompt, `--recategorize` ignore les catégorisations déjà
+stockées pour que toutes les transactions repassent par le LLM.
+"""
+
+import argparse
+import asyncio
+import csv
+import datetime
+import hashlib
+import json
+import logging
+import os
+import sys
+from pathlib import Path
+from typing import AsyncIterator, Dict, List, Optional
+
+from .ai_service import (LLM_BATCH_SIZE, close_http_client, get_llm_router, is_fallback, prompt_fingerprint,
+                         start_http_client)
+from .ofx_parser import CHUNK_SIZE
+from .pipeline import ParsingState, apply_enrichment, enrich_lots, feed_ofx_chunks, lots_from_queue
+from .recurring import refresh_recurring_index
+from .scheduler import INITIAL_CONCURRENCY, MAX_CONCURRENCY, AdaptiveLimiter
+from .transactions import Transaction
+
+logger = logging.getLogger(__name__)
+
+OFX_SUFFIXES = (".ofx", ".qfx")
+MANIFEST_NAME = "manifest.json"
+COLUMNS = ("date", "amount", "description", "account_id", "fitid",
+           "marchand_probable", "categorie_suggeree", "ville", "anomalie")
+
+
+def _row(transaction: Transaction) -> tuple:
+    return (
+        transaction.date, transaction.amount, transaction.description, transaction.account_id,
+        transaction.fitid, transaction.marchand_probable, transaction.categorie_suggeree, transaction.ville,
+        transaction.anomalie["justification"] if transaction.anomalie else None,
+    )
+
+
+class CsvOutput:
+    """Fichier CSV écrit lot par lot dans un fichier `.part`, renommé une fois complet."""
+
+    suffix = ".csv"
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.part_path = path.with_name(path.name + ".part")
+        self._file = open(self.part_path, "w", encoding="utf-8", newline="")
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(COLUMNS)
+
+    def write(self, transactions: List[Transaction]) -> None:
+        self._writer.writerows(_row(t) for t in transactions)
+        self._file.flush()
+
+    def finish(self) -> None:
+        self._file.close()
+        os.replace(self.part_path, self.path)
+
+    def abort(self) -> None:
+        self._file.close()
+        self.part_path.unlink(missing_ok=True)
+
+
+class ParquetOutput:
+    """Fichier Parquet écrit avec pyarrow, un groupe de lignes par lot."""
+
+    suffix = ".parquet"
+
+    def __init__(self, path: Path):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self._pa = pa
+        self.path = path
+        self.part_path = path.with_name(path.name + ".part")
+        self._schema = pa.schema([
+            ("date", pa.date32()), ("amount", pa.float64()), ("description", pa.string()),
+            ("account_id", pa.string()), ("fitid", pa.string()), ("marchand_probable", pa.string()),
+            ("categorie_suggeree", pa.string()), ("ville", pa.string()), ("anomalie", pa.string()),
+        ])
+        self._writer = pq.ParquetWriter(str(self.part_path), self._schema)
+
+    def write(self, transactions: List[Transaction]) -> None:
+        rows = [dict(zip(COLUMNS, _row(t))) for t in transactions]
+        self._writer.write_table(self._pa.Table.from_pylist(rows, schema=self._schema))
+
+    def finish(self) -> None:
+        self._writer.close()
+        os.replace(self.part_path, self.path)
+
+    def abort(self) -> None:
+        self._writer.close()
+        self.part_path.unlink(missing_ok=True)
+
+
+OUTPUTS = {"csv": CsvOutput, "parquet": ParquetOutput}
+
+
+class Manifest:
+    """
+    Fichiers terminés, par chemin relatif : empreinte du fichier OFX et du prompt,
+    fichier de sortie et nombre de transactions. Réécrit atomiquement après chaque fichier.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.entries: Dict[str, dict] = {}
+        if path.exists():
+            with open(path, encoding="utf-8") as f:
+                self.entries = json.load(f)
+
+    def is_done(self, name: str, digest: str, fingerprint: str, output: Path) -> bool:
+        entry = self.entries.get(name)
+        return (entry is not None and entry["sha256"] == digest and entry["fingerprint"] == fingerprint
+                and self.path.parent / entry["output"] == output and output.exists())
+
+    def record(self, name: str, entry: dict) -> None:
+        self.entries[name] = entry
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.entries, f, ensure_ascii=False, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+
+def find_ofx_files(directory: Path) -> List[Path]:
+    return sorted(p for p in directory.rglob("*") if p.is_file() and p.suffix.lower() in OFX_SUFFIXES)
+
+
+def file_digest(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+async def _read_chunks(path: Path) -> AsyncIterator[bytes]:
+    with open(path, "rb") as f:
+        while True:
+            chunk = await asyncio.to_thread(f.read, CHUNK_SIZE)
+            if not chunk:
+                return
+            yield chunk
+
+
+async def categorize_file(path: Path, output, limiter: AdaptiveLimiter, recategorize: bool = False) -> dict:
+    """
+    Parse et enrichit un fichier OFX en flux, en écrivant chaque lot enrichi dès qu'il est prêt.
+    Retourne le nombre de transactions et celui des catégorisations de repli. Lève
+    l'erreur de parsing éventuelle une fois le fichier lu.
+    """
+    # File bornée : le parsing attend l'enrichissement au lieu de charger tout le fichier en mémoire
+    queue: asyncio.Queue = asyncio.Queue(maxsize=LLM_BATCH_SIZE * limiter.max_limit * 2)
+    parsing = ParsingState()
+    reader = asyncio.create_task(feed_ofx_chunks(_read_chunks(path), queue, parsing))
+    counts = {"transactions": 0, "fallbacks": 0}
+    try:
+        async for lot, results in enrich_lots(lots_from_queue(queue), limiter, reuse_stored=not recategorize):
+            output.write([apply_enrichment(t, enrichment) for t, enrichment in zip(lot, results)])
+            counts["transactions"] += len(lot)
+            counts["fallbacks"] += sum(map(is_fallback, results))
+    finally:
+        reader.cancel()
+        await asyncio.gather(reader, return_exceptions=True)
+    if parsing.error is not None:
+        raise parsing.error
+    return counts
+
+
+async def run(input_dir: Path, output_dir: Path, output_format: str = "csv",
+              concurrency: int = MAX_CONCURRENCY, recategorize: bool = False) -> dict:
+    """
+    Traite les fichiers OFX de `input_dir` qui ne sont pas déjà terminés d'après le
+    manifeste de `output_dir`, un fichier après l'autre. Retourne le bilan de l'exécution.
+    """
+    output_class = OUTPUTS[output_format]
+    output_dir.mkdir(parents=True, exist_ok=True)
+    manifest = Manifest(output_dir / MANIFEST_NAME)
+    fingerprint = prompt_fingerprint()
+    limiter = AdaptiveLimiter(initial=min(INITIAL_CONCURRENCY, concurrency), min_limit=1, max_limit=concurrency)
+    summary = {"done": 0, "skipped": 0, "incomplete": 0, "failed": 0, "transactions": 0}
+
+    client = await start_http_client()
+    get_llm_router().start_health_checks(client)
+    try:
+        for path in find_ofx_files(input_dir):
+            name = path.relative_to(input_dir).as_posix()
+            # Extension d'origine conservée : releve.ofx et releve.qfx ne s'écrasent pas
+            target = output_dir / (name + output_class.suffix)
+            digest = await asyncio.to_thread(file_digest, path)
+            if manifest.is_done(name, digest, fingerprint, target):
+                summary["skipped"] += 1
+                continue
+
+            target.parent.mkdir(parents=True, exist_ok=True)
+            output = output_class(target)
+            try:
+                counts = await categorize_file(path, output, limiter, recategorize)
+            except Exception as e:
+                output.abort()
+                logger.error(f"{name} : traitement impossible ({repr(e)}).")
+                summary["failed"] += 1
+                continue
+            except BaseException:
+                output.abort()
+                raise
+            output.finish()
+            summary["transactions"] += counts["transactions"]
+
+            if counts["fallbacks"]:
+                # Sortie conservée, mais le fichier sera repris à la prochaine exécution
+                logger.warning(f"{name} : {counts['fallbacks']}/{counts['transactions']} transaction(s) "
+                               f"non catégorisée(s), fichier à reprendre.")
+                summary["incomplete"] += 1
+                continue
+            manifest.record(name, {
+                "sha256": digest,
+                "fingerprint": fingerprint,
+                "output": target.relative_to(output_dir).as_posix(),
+                "transactions": counts["transactions"],
+                "completed_at": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+            })
+            summary["done"] += 1
+            logger.info(f"{name} : {counts['transactions']} transaction(s) → {target}")
+    finally:
+        await get_llm_router().stop_health_checks()
+        await close_http_client()
+
+    if summary["done"] or summary["incomplete"]:
+        # Comme après une analyse du serveur : les nouveaux paiements récurrents servent dès le prochain import
+        await asyncio.to_thread(refresh_recurring_index)
+    return summary
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m backend.cli",
+        description="Catégorise hors ligne les fichiers OFX d'un répertoire (CSV ou Parquet, reprise possible).")
+    parser.add_argument("input", type=Path, help="Répertoire des fichiers .ofx/.qfx (sous-répertoires compris).")
+    parser.add_argument("--output", "-o", type=Path, required=True,
+                        help="Répertoire des fichiers enrichis et du manifeste de reprise.")
+    parser.add_argument("--format", choices=sorted(OUTPUTS), default="csv", dest="output_format")
+    parser.add_argument("--concurrency", type=int, default=MAX_CONCURRENCY,
+                        help="Nombre maximal de requêtes simultanées vers le LLM (la limite s'adapte en dessous).")
+    parser.add_argument("--recategorize", action="store_true",
+                        help="Ignore les catégorisations déjà stockées (après un changement de prompt).")
+    args = parser.parse_args(argv)
+
+    if not args.input.is_dir():
+        parser.error(f"{args.input} n'est pas un répertoire.")
+    if args.concurrency < 1:
+        parser.error("--concurrency doit être au moins 1.")
+    if args.output_format == "parquet":
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            parser.error("Le format parquet nécessite pyarrow (pip install pyarrow).")
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    summary = asyncio.run(run(args.input, args.output, args.output_format, args.concurrency, args.recategorize))
+    print(json.dumps(summary, ensure_ascii=False))
+    return 1 if summary["failed"] or summary["incomplete"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
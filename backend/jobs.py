@@ -0,0 +1,464 @@
+# backend/jobs.py
+
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import AsyncIterator, Dict, List, Optional, Set, Tuple
+
+from . import storage
+from .pipeline import END_OF_STREAM, ParsingState, apply_enrichment, enrich_lots, lots_from_queue
+from .recurring import refresh_recurring_index
+from .scheduler import AdaptiveLimiter
+from .serialization import dumps, loads
+from .transactions import Transaction
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS analysis_jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    input_count INTEGER NOT NULL DEFAULT 0,
+    processed_count INTEGER NOT NULL DEFAULT 0,
+    last_seq INTEGER NOT NULL DEFAULT 0,
+    parsing_complete INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS job_inputs (
+    job_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    payload TEXT NOT NULL,
+    PRIMARY KEY (job_id, idx)
+);
+CREATE TABLE IF NOT EXISTS job_results (
+    job_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    seq INTEGER NOT NULL,
+    payload TEXT NOT NULL,
+    PRIMARY KEY (job_id, idx)
+);
+CREATE INDEX IF NOT EXISTS idx_job_results_seq ON job_results(job_id, seq);
+"""
+
+# Nombre d'analyses soumises traitées simultanément par le pool de fond
+JOB_WORKERS = int(os.getenv("REVELIO_JOB_WORKERS", "2"))
+
+# Statuts d'une analyse
+QUEUED = "queued"
+RUNNING = "running"
+INTERRUPTED = "interrupted"
+COMPLETED = "completed"
+FAILED = "failed"
+
+
+class JobStore:
+    """
+    Points de reprise des analyses.
+
+    Chaque analyse reçoit un identifiant. Ses transactions d'entrée sont numérotées
+    (`index`) et enregistrées dès qu'elles sont prêtes à être enrichies ; chaque résultat
+    est enregistré dès qu'il est produit, avec un numéro de séquence croissant (`seq`).
+    Un client qui se reconnecte indique le dernier `seq` reçu : seuls les résultats
+    suivants lui sont renvoyés, et seules les transactions sans résultat sont retraitées.
+    """
+
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._conn.commit()
+
+    def create_job(self) -> str:
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO analysis_jobs (id, status, created_at, updated_at) VALUES (?, ?, ?, ?)",
+                (job_id, RUNNING, now, now)
+            )
+            self._conn.commit()
+        return job_id
+
+    def get_job(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, status, input_count, processed_count, last_seq, parsing_complete, error, "
+                "created_at, updated_at FROM analysis_jobs WHERE id = ?",
+                (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        keys = ("job_id", "status", "input_count", "processed_count", "last_seq",
+                "parsing_complete", "error", "created_at", "updated_at")
+        job = dict(zip(keys, row))
+        job["parsing_complete"] = bool(job["parsing_complete"])
+        return job
+
+    def add_inputs(self, job_id: str, transactions: List[Transaction]) -> None:
+        """Numérote (attribut `index`) et enregistre des transactions d'entrée."""
+        with self._lock:
+            start = self._conn.execute(
+                "SELECT input_count FROM analysis_jobs WHERE id = ?", (job_id,)
+            ).fetchone()[0]
+            for offset, transaction in enumerate(transactions):
+                transaction.index = start + offset
+            self._conn.executemany(
+                "INSERT INTO job_inputs (job_id, idx, payload) VALUES (?, ?, ?)",
+                [(job_id, t.index, dumps(t).decode()) for t in transactions]
+            )
+            self._conn.execute(
+                "UPDATE analysis_jobs SET input_count = input_count + ?, updated_at = ? WHERE id = ?",
+                (len(transactions), time.time(), job_id)
+            )
+            self._conn.commit()
+
+    def set_parsing_complete(self, job_id: str) -> None:
+        self._update(job_id, parsing_complete=1)
+
+    def checkpoint(self, job_id: str, transactions: List[Transaction]) -> int:
+        """
+        Enregistre des transactions enrichies (porteuses de leur `index`) et retourne
+        le dernier numéro de séquence attribué.
+        """
+        with self._lock:
+            last_seq = self._conn.execute(
+                "SELECT last_seq FROM analysis_jobs WHERE id = ?", (job_id,)
+            ).fetchone()[0]
+            rows = []
+            for transaction in transactions:
+                last_seq += 1
+                transaction.seq = last_seq
+                rows.append((job_id, transaction.index, last_seq, dumps(transaction).decode()))
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO job_results (job_id, idx, seq, payload) VALUES (?, ?, ?, ?)", rows
+            )
+            self._conn.execute(
+                "UPDATE analysis_jobs SET last_seq = ?, processed_count = processed_count + ?, updated_at = ? "
+                "WHERE id = ?",
+                (last_seq, len(rows), time.time(), job_id)
+            )
+            self._conn.commit()
+        return last_seq
+
+    def results_since(self, job_id: str, last_seq: int = 0, limit: Optional[int] = None) -> List[dict]:
+        """Résultats enregistrés après `last_seq`, dans l'ordre de production."""
+        query = "SELECT payload FROM job_results WHERE job_id = ? AND seq > ? ORDER BY seq"
+        params: Tuple = (job_id, last_seq)
+        if limit is not None:
+            query += " LIMIT ?"
+            params += (limit,)
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        return [loads(payload) for (payload,) in rows]
+
+    def pending_inputs(self, job_id: str) -> List[Transaction]:
+        """Transactions d'entrée qui n'ont pas encore de résultat enregistré."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT i.payload FROM job_inputs i LEFT JOIN job_results r "
+                "ON r.job_id = i.job_id AND r.idx = i.idx "
+                "WHERE i.job_id = ? AND r.idx IS NULL ORDER BY i.idx",
+                (job_id,)
+            ).fetchall()
+        return [Transaction.from_dict(loads(payload)) for (payload,) in rows]
+
+    def list_jobs(self, statuses: Optional[List[str]] = None, limit: int = 100) -> List[dict]:
+        query = "SELECT id FROM analysis_jobs"
+        params: Tuple = ()
+        if statuses:
+            query += f" WHERE status IN ({', '.join('?' for _ in statuses)})"
+            params = tuple(statuses)
+        query += " ORDER BY created_at DESC LIMIT ?"
+        with self._lock:
+            rows = self._conn.execute(query, params + (limit,)).fetchall()
+        return [self.get_job(job_id) for (job_id,) in rows]
+
+    def set_status(self, job_id: str, status: str, error: Optional[str] = None) -> None:
+        self._update(job_id, status=status, error=error)
+
+    def _update(self, job_id: str, **fields) -> None:
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock:
+            self._conn.execute(
+                f"UPDATE analysis_jobs SET {assignments}, updated_at = ? WHERE id = ?",
+                (*fields.values(), time.time(), job_id)
+            )
+            self._conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def progress_percent(job: dict) -> Optional[int]:
+    if not job["parsing_complete"] or not job["input_count"]:
+        return None
+    return round(job["processed_count"] / job["input_count"] * 100)
+
+
+class JobManager:
+    """
+    Exécution des analyses en tâche de fond, indépendamment des connexions WebSocket.
+
+    Les analyses soumises (liste de transactions complète) sont placées dans une file
+    traitée par JOB_WORKERS tâches asyncio ; un import en cours de réception est traité
+    dès son ouverture. Toutes partagent le même limiteur de concurrence vers le LLM.
+    La progression est diffusée aux abonnés (WebSocket) sous forme d'événements, et
+    tous les résultats restent consultables via le JobStore.
+    """
+
+    def __init__(self, job_store: JobStore, limiter: AdaptiveLimiter, workers: int = JOB_WORKERS):
+        self.job_store = job_store
+        self.limiter = limiter
+        self.worker_count = workers
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._active: Set[str] = set()
+        self._subscribers: Dict[str, List[asyncio.Queue]] = {}
+        self._tasks: List[asyncio.Task] = []
+        # Analyses alimentées par un import en cours, retirées dès qu'elles se terminent
+        self._uploads: Set[asyncio.Task] = set()
+
+    async def start(self) -> None:
+        """Démarre le pool et relance les analyses restées en file ou en cours au dernier arrêt."""
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.worker_count)]
+        for job in self.job_store.list_jobs([QUEUED, RUNNING], limit=1000):
+            if job["parsing_complete"]:
+                logger.info(f"Reprise de l'analyse {job['job_id']} interrompue par l'arrêt du serveur.")
+                self._enqueue(job["job_id"])
+            else:
+                self.job_store.set_status(job["job_id"], INTERRUPTED, error="Import interrompu par l'arrêt du serveur.")
+
+    async def stop(self) -> None:
+        tasks = [*self._tasks, *self._uploads]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks = []
+
+    def is_active(self, job_id: str) -> bool:
+        return job_id in self._active
+
+    def submit(self, transactions: List[dict]) -> str:
+        """
+        Enregistre une analyse complète et la place dans la file de traitement.
+        Lève ValueError si une transaction n'a pas de montant numérique ou de date valide.
+        """
+        transactions = [Transaction.from_dict(transaction) for transaction in transactions]
+        job_id = self.job_store.create_job()
+        self.job_store.add_inputs(job_id, transactions)
+        self.job_store.set_parsing_complete(job_id)
+        self._enqueue(job_id)
+        return job_id
+
+    def start_upload(self) -> Tuple[str, asyncio.Queue, ParsingState]:
+        """
+        Ouvre une analyse alimentée au fil d'un import : les transactions poussées dans
+        la file retournée sont enregistrées puis enrichies sans attendre la fin de l'import.
+        """
+        job_id = self.job_store.create_job()
+        queue: asyncio.Queue = asyncio.Queue()
+        parsing = ParsingState()
+        self._active.add(job_id)
+        lots = self._recorded_lots(job_id, lots_from_queue(queue), parsing)
+        task = asyncio.create_task(self._run_job(job_id, lots, parsing))
+        self._uploads.add(task)
+        task.add_done_callback(self._uploads.discard)
+        return job_id, queue, parsing
+
+    def resume(self, job_id: str) -> dict:
+        """Relance le traitement des transactions sans résultat d'une analyse existante."""
+        job = self.job_store.get_job(job_id)
+        if job is None:
+            raise KeyError(job_id)
+        if not self.is_active(job_id) and job["parsing_complete"] and self.job_store.pending_inputs(job_id):
+            self._enqueue(job_id)
+        return job
+
+    def subscribe(self, job_id: str) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue()
+        self._subscribers.setdefault(job_id, []).append(queue)
+        return queue
+
+    def unsubscribe(self, job_id: str, queue: asyncio.Queue) -> None:
+        subscribers = self._subscribers.get(job_id, [])
+        if queue in subscribers:
+            subscribers.remove(queue)
+        if not subscribers:
+            self._subscribers.pop(job_id, None)
+
+    async def events(self, job_id: str, last_seq: int = 0) -> AsyncIterator[dict]:
+        """
+        Événements d'une analyse pour un abonné : d'abord les résultats enregistrés après
+        `last_seq`, puis la progression en direct jusqu'à l'événement final.
+        """
+        queue = self.subscribe(job_id)
+        try:
+            replay = self.job_store.results_since(job_id, last_seq)
+            job = self.job_store.get_job(job_id)
+            if replay:
+                last_seq = replay[-1]["seq"]
+                yield self._progress_event(job, replay, last_seq)
+            if not self.is_active(job_id) and queue.empty():
+                yield self._final_event(job)
+                return
+            while True:
+                event = await queue.get()
+                if event["type"] == "progress":
+                    event = dict(event, data=[t for t in event["data"] if t.seq > last_seq])
+                    if not event["data"]:
+                        continue
+                    last_seq = event["last_seq"]
+                yield event
+                if event["type"] in ("complete", "error"):
+                    return
+        finally:
+            self.unsubscribe(job_id, queue)
+
+    def _enqueue(self, job_id: str) -> None:
+        self._active.add(job_id)
+        self.job_store.set_status(job_id, QUEUED)
+        self._queue.put_nowait(job_id)
+
+    async def _worker(self) -> None:
+        while True:
+            job_id = await self._queue.get()
+            queue: asyncio.Queue = asyncio.Queue()
+            for transaction in self.job_store.pending_inputs(job_id):
+                queue.put_nowait(transaction)
+            queue.put_nowait(END_OF_STREAM)
+            parsing = ParsingState()
+            parsing.parsed_count = self.job_store.get_job(job_id)["input_count"]
+            parsing.complete = True
+            await self._run_job(job_id, lots_from_queue(queue), parsing)
+
+    async def _recorded_lots(self, job_id: str, lots, parsing: ParsingState):
+        """Enregistre chaque lot comme entrée de l'analyse (point de reprise) avant son enrichissement."""
+        async for lot in lots:
+            self.job_store.add_inputs(job_id, lot)
+            yield lot
+        if parsing.error is None:
+            self.job_store.set_parsing_complete(job_id)
+
+    async def _run_job(self, job_id: str, lots, parsing: ParsingState) -> None:
+        store = self.job_store
+        store.set_status(job_id, RUNNING)
+        processed_count = store.get_job(job_id)["processed_count"]
+        try:
+            async for batch_transactions, batch_results in enrich_lots(lots, self.limiter):
+                # Préparer les données enrichies pour ce lot et les enregistrer
+                enriched_batch = [apply_enrichment(trn, enrichment)
+                                  for trn, enrichment in zip(batch_transactions, batch_results)]
+                last_seq = store.checkpoint(job_id, enriched_batch)
+
+                # Calculer la progression (le total peut encore augmenter pendant la réception)
+                processed_count += len(batch_transactions)
+                total_transactions = parsing.parsed_count
+                progress = (processed_count / total_transactions) * 100 if parsing.complete else None
+                self._publish(job_id, {
+                    "type": "progress",
+                    "job_id": job_id,
+                    "last_seq": last_seq,
+                    "processed_count": processed_count,
+                    "total_count": total_transactions,
+                    "parsing_complete": parsing.complete,
+                    "progress_percent": round(progress) if progress is not None else None,
+                    "data": enriched_batch
+                })
+
+            job = store.get_job(job_id)
+            if parsing.error is not None or not job["parsing_complete"]:
+                store.set_status(job_id, INTERRUPTED, error=f"Import interrompu : {parsing.error!r}")
+            elif job["input_count"] == 0:
+                store.set_status(job_id, FAILED, error="Impossible de parser le fichier ou aucune transaction trouvée.")
+            else:
+                store.set_status(job_id, COMPLETED)
+                await self._refresh_recurring()
+        except asyncio.CancelledError:
+            store.set_status(job_id, INTERRUPTED, error="Analyse annulée.")
+            raise
+        except Exception as e:
+            logger.error(f"Erreur pendant l'analyse {job_id}: {e}", exc_info=True)
+            store.set_status(job_id, FAILED, error=str(e))
+        finally:
+            self._active.discard(job_id)
+        self._publish(job_id, self._final_event(store.get_job(job_id)))
+
+    def _publish(self, job_id: str, event: dict) -> None:
+        for queue in self._subscribers.get(job_id, []):
+            queue.put_nowait(event)
+
+    @staticmethod
+    def _progress_event(job: dict, data: List[dict], last_seq: int) -> dict:
+        return {
+            "type": "progress",
+            "job_id": job["job_id"],
+            "last_seq": last_seq,
+            "processed_count": job["processed_count"],
+            "total_count": job["input_count"],
+            "parsing_complete": job["parsing_complete"],
+            "progress_percent": progress_percent(job),
+            "data": data
+        }
+
+    @staticmethod
+    async def _refresh_recurring() -> None:
+        """Met à jour les paiements récurrents avec les transactions de l'analyse terminée."""
+        try:
+            await asyncio.to_thread(refresh_recurring_index)
+        except Exception as e:
+            logger.error(f"Détection des paiements récurrents impossible : {repr(e)}")
+
+    @staticmethod
+    def _final_event(job: dict) -> dict:
+        if job["status"] == COMPLETED:
+            return {"type": "complete", "job_id": job["job_id"], "message": "Analyse terminée !"}
+        return {"type": "error", "job_id": job["job_id"], "message": job["error"] or f"Analyse {job['status']}."}
+
+
+_job_store: Optional[JobStore] = None
+_job_manager: Optional[JobManager] = None
+
+
+def get_job_store() -> JobStore:
+    """Retourne le stockage des analyses (même base que les transactions)."""
+    global _job_store
+    if _job_store is None:
+        _job_store = JobStore(storage.DB_PATH)
+    return _job_store
+
+
+def close_job_store() -> None:
+    global _job_store
+    if _job_store is not None:
+        _job_store.close()
+        _job_store = None
+
+
+async def start_job_manager(limiter: AdaptiveLimiter) -> JobManager:
+    """Démarre le pool d'analyses de fond. Appelé depuis le lifespan FastAPI."""
+    global _job_manager
+    if _job_manager is None:
+        _job_manager = JobManager(get_job_store(), limiter)
+        await _job_manager.start()
+    return _job_manager
+
+
+async def stop_job_manager() -> None:
+    global _job_manager
+    if _job_manager is not None:
+        await _job_manager.stop()
+        _job_manager = None
+
+
+def get_job_manager() -> JobManager:
+    if _job_manager is None:
+        raise RuntimeError("Le gestionnaire d'analyses n'est pas démarré.")
+    return _job_manager
@@ -0,0 +1,184 @@
+# backend/llm_router.py
+
+import asyncio
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, List, Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# Liste d'instances Ollama : "url[|poids[|concurrence max]]" séparées par des virgules,
+# par exemple "http://gpu-1:11434|2|8,http://gpu-2:11434|1|4".
+OLLAMA_BACKENDS = os.getenv("OLLAMA_BACKENDS", "")
+OLLAMA_HEALTH_INTERVAL = float(os.getenv("OLLAMA_HEALTH_INTERVAL", "15"))
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("OLLAMA_CIRCUIT_FAILURES", "3"))
+CIRCUIT_COOLDOWN = float(os.getenv("OLLAMA_CIRCUIT_COOLDOWN", "30"))
+DEFAULT_BACKEND_CONCURRENCY = 8
+
+
+class NoBackendAvailable(Exception):
+    """Aucune instance Ollama n'est saine : toutes ont leur disjoncteur ouvert."""
+
+
+class OllamaBackend:
+    """Une instance Ollama, avec son poids, sa concurrence maximale et son disjoncteur."""
+
+    def __init__(self, base_url: str, weight: float = 1.0, max_concurrency: int = DEFAULT_BACKEND_CONCURRENCY):
+        self.base_url = base_url.rstrip("/")
+        self.weight = max(weight, 0.01)
+        self.max_concurrency = max(max_concurrency, 1)
+        self.in_flight = 0
+        self.healthy = True
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+        self.requests = 0
+        self.failures = 0
+
+    def url(self, path: str) -> str:
+        return f"{self.base_url}{path}"
+
+    @property
+    def load(self) -> float:
+        return self.in_flight / self.weight
+
+    def is_open(self, now: float) -> bool:
+        return now < self.open_until
+
+    def stats(self) -> dict:
+        return {
+            "url": self.base_url,
+            "weight": self.weight,
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self.in_flight,
+            "healthy": self.healthy,
+            "circuit_open": self.is_open(time.monotonic()),
+            "requests": self.requests,
+            "failures": self.failures,
+        }
+
+
+def parse_backends(spec: str, default_url: str) -> List[OllamaBackend]:
+    """Construit la liste des instances depuis OLLAMA_BACKENDS (ou l'URL par défaut)."""
+    backends = []
+    for entry in filter(None, (part.strip() for part in spec.split(","))):
+        url, *options = entry.split("|")
+        weight = float(options[0]) if len(options) > 0 and options[0] else 1.0
+        concurrency = int(options[1]) if len(options) > 1 and options[1] else DEFAULT_BACKEND_CONCURRENCY
+        backends.append(OllamaBackend(url, weight, concurrency))
+    return backends or [OllamaBackend(default_url)]
+
+
+class LLMRouter:
+    """
+    Répartit les requêtes entre plusieurs instances Ollama.
+
+    Chaque requête part vers l'instance saine la moins chargée (requêtes en cours
+    divisées par le poids), dans la limite de sa concurrence maximale. Après
+    `failure_threshold` échecs consécutifs, le disjoncteur d'une instance s'ouvre
+    pendant `cooldown` secondes ; à son expiration, une requête d'essai la réhabilite
+    ou rouvre le disjoncteur. Une vérification périodique (/api/tags) met aussi à jour
+    l'état de santé de chaque instance.
+    """
+
+    def __init__(self, backends: List[OllamaBackend],
+                 failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD,
+                 cooldown: float = CIRCUIT_COOLDOWN):
+        self.backends = backends
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self._condition = asyncio.Condition()
+        self._health_task: Optional[asyncio.Task] = None
+
+    def available(self) -> List[OllamaBackend]:
+        """Instances saines dont le disjoncteur est fermé."""
+        now = time.monotonic()
+        return [b for b in self.backends if b.healthy and not b.is_open(now)]
+
+    async def acquire(self) -> OllamaBackend:
+        """Réserve une place sur l'instance la moins chargée ; attend si toutes sont pleines."""
+        async with self._condition:
+            while True:
+                candidates = self.available()
+                if not candidates:
+                    raise NoBackendAvailable("Aucune instance Ollama disponible.")
+                free = [b for b in candidates if b.in_flight < b.max_concurrency]
+                if free:
+                    backend = min(free, key=lambda b: b.load)
+                    backend.in_flight += 1
+                    backend.requests += 1
+                    return backend
+                await self._condition.wait()
+
+    async def release(self, backend: OllamaBackend, success: Optional[bool]) -> None:
+        """Libère la place réservée ; `success=None` (requête annulée) ne compte ni comme succès ni comme échec."""
+        async with self._condition:
+            backend.in_flight -= 1
+            if success is None:
+                pass
+            elif success:
+                backend.consecutive_failures = 0
+                backend.healthy = True
+            else:
+                backend.failures += 1
+                backend.consecutive_failures += 1
+                if backend.consecutive_failures >= self.failure_threshold:
+                    backend.open_until = time.monotonic() + self.cooldown
+                    logger.warning(f"Instance Ollama {backend.base_url} écartée pour {self.cooldown}s "
+                                   f"après {backend.consecutive_failures} échecs.")
+            self._condition.notify_all()
+
+    @asynccontextmanager
+    async def backend(self) -> AsyncIterator[OllamaBackend]:
+        """
+        Fournit une instance pour une requête. Une erreur HTTP compte comme un échec
+        de l'instance ; toute autre exception est simplement propagée.
+        """
+        backend = await self.acquire()
+        success = None
+        try:
+            yield backend
+            success = True
+        except httpx.HTTPError:
+            success = False
+            raise
+        finally:
+            await self.release(backend, success)
+
+    async def check_health(self, client: httpx.AsyncClient) -> None:
+        for backend in self.backends:
+            try:
+                response = await client.get(backend.url("/api/tags"), timeout=5.0)
+                healthy = response.status_code == 200
+            except httpx.HTTPError:
+                healthy = False
+            if healthy != backend.healthy:
+                logger.info(f"Instance Ollama {backend.base_url} : {'saine' if healthy else 'indisponible'}.")
+            backend.healthy = healthy
+            if healthy and not backend.is_open(time.monotonic()):
+                backend.consecutive_failures = 0
+        async with self._condition:
+            self._condition.notify_all()
+
+    def start_health_checks(self, client: httpx.AsyncClient, interval: float = OLLAMA_HEALTH_INTERVAL) -> None:
+        async def loop():
+            while True:
+                try:
+                    await self.check_health(client)
+                except Exception as e:
+                    logger.error(f"Vérification de santé des instances Ollama impossible : {repr(e)}")
+                await asyncio.sleep(interval)
+        if self._health_task is None and interval > 0:
+            self._health_task = asyncio.create_task(loop())
+
+    async def stop_health_checks(self) -> None:
+        if self._health_task is not None:
+            self._health_task.cancel()
+            await asyncio.gather(self._health_task, return_exceptions=True)
+            self._health_task = None
+
+    def stats(self) -> List[dict]:
+        return [backend.stats() for backend in self.backends]
@@ -1,22 +1,67 @@
 # backend/main.py
 
 from fastapi import FastAPI, File, UploadFile, HTTPException, WebSocket, WebSocketDisconnect
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 import logging
-from .ofx_parser import parse_ofx
-from .ai_service import categorize_transaction
+from contextlib import asynccontextmanager
+from .parse_executor import (
+    FileTooLargeError, MAX_OFX_FILE_SIZE, check_file_size, parse_ofx_async, parse_stats,
+    start_parse_executor, shutdown_parse_executor
+)
+from .ai_service import get_llm_router, start_http_client, close_http_client
+from .metrics import REGISTRY
+from .pipeline import feed_ofx_chunks
+from .scheduler import AdaptiveLimiter
+from .serialization import TransactionsJSONResponse, dumps
+from .jobs import close_job_store, get_job_manager, start_job_manager, stop_job_manager
+from .warmup import WARMUP_ENABLED, WarmupState, warm_up
+from .routers import ai as ai_router
+from .routers import rules as rules_router
+from .routers import jobs as jobs_router
+from .routers import analytics as analytics_router
+from .routers import recurring as recurring_router
+from .routers import search as search_router
 import asyncio
-import uvicorn
 import json
 
 # Configuration du logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Ouvre le client HTTP partagé vers Ollama, le pool de parsing et le pool d'analyses
+    de fond au démarrage, et les ferme à l'arrêt. Le limiteur de concurrence est partagé
+    par toutes les analyses. La santé des instances Ollama est vérifiée en continu.
+
+    Le préchauffage (modèle, cache, règles, statistiques) tourne en tâche de fond :
+    le serveur accepte les requêtes aussitôt, et /ready indique quand il est à pleine vitesse.
+    """
+    client = await start_http_client()
+    get_llm_router().start_health_checks(client)
+    app.state.warmup = WarmupState() if WARMUP_ENABLED else WarmupState(steps=())
+    warmup_task = asyncio.create_task(warm_up(app.state.warmup)) if WARMUP_ENABLED else None
+    start_parse_executor()
+    app.state.llm_limiter = AdaptiveLimiter()
+    await start_job_manager(app.state.llm_limiter)
+    try:
+        yield
+    finally:
+        if warmup_task is not None:
+            warmup_task.cancel()
+            await asyncio.gather(warmup_task, return_exceptions=True)
+        await stop_job_manager()
+        shutdown_parse_executor()
+        await get_llm_router().stop_health_checks()
+        await close_http_client()
+        close_job_store()
+
 app = FastAPI(
     title="Revelio Finance API",
     description="API pour analyser les fichiers de transactions OFX avec suivi en temps réel.",
-    version="2.0.0"
+    version="2.0.0",
+    lifespan=lifespan
 )
 
 app.add_middleware(
@@ -27,80 +72,132 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+app.include_router(ai_router.router)
+app.include_router(rules_router.router)
+app.include_router(jobs_router.router)
+app.include_router(analytics_router.router)
+app.include_router(recurring_router.router)
+app.include_router(search_router.router)
+
 @app.get("/")
 async def get_index():
     """Sert le fichier frontend index.html."""
     return FileResponse('frontend/index.html')
 
-@app.post("/parse-ofx/")
+@app.post("/parse-ofx/", response_class=TransactionsJSONResponse)
 async def parse_ofx_file(file: UploadFile = File(...)):
     """
     Endpoint qui parse le fichier OFX et retourne les transactions brutes.
+    Le parsing s'exécute dans le pool de parsing pour ne pas bloquer les autres sessions,
+    et la réponse est sérialisée directement depuis les transactions par orjson.
     L'enrichissement se fera via WebSocket.
     """
     if not file.filename.lower().endswith(('.ofx', '.qfx')):
         raise HTTPException(status_code=400, detail="Type de fichier invalide.")
 
-    file_content = await file.read()
-    transactions = parse_ofx(file_content)
+    try:
+        if file.size is not None:
+            check_file_size(file.size)
+        file_content = await file.read(MAX_OFX_FILE_SIZE + 1)
+        transactions = await parse_ofx_async(file_content)
+    except FileTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
 
     if not transactions:
         raise HTTPException(status_code=400, detail="Impossible de parser le fichier ou aucune transaction trouvée.")
 
-    return {
+    return TransactionsJSONResponse({
         "filename": file.filename,
         "transaction_count": len(transactions),
         "transactions": transactions
-    }
+    })
+
+@app.get("/parse-ofx/stats")
+async def parse_ofx_stats():
+    """Statistiques du pool de parsing, dont le temps d'attente dans la file."""
+    return parse_stats()
+
+REGISTRY.callback("revelio_llm_concurrency_limit", "Current adaptive limit of concurrent LLM requests.", "gauge",
+                  lambda: app.state.llm_limiter.limit if hasattr(app.state, "llm_limiter") else None)
+
+@app.get("/ready")
+async def ready():
+    """
+    Disponibilité à pleine vitesse : 200 une fois le préchauffage terminé, 503 avant
+    (ou si une étape a échoué), avec l'état de chaque étape.
+    """
+    state = app.state.warmup
+    return JSONResponse(state.to_dict(), status_code=200 if state.ready else 503)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Métriques au format texte Prometheus (parsing, recherches, requêtes Ollama)."""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+async def _receive_upload_chunks(websocket: WebSocket):
+    """Produit les morceaux binaires du fichier envoyés par le client jusqu'au message de fin."""
+    received = 0
+    while True:
+        message = await websocket.receive()
+        if message["type"] == "websocket.disconnect":
+            raise WebSocketDisconnect(message.get("code", 1000))
+        if message.get("bytes") is not None:
+            received += len(message["bytes"])
+            check_file_size(received)
+            yield message["bytes"]
+        elif message.get("text") is not None and json.loads(message["text"]).get("type") == "end":
+            return
 
 @app.websocket("/ws/analyze")
 async def websocket_analyze(websocket: WebSocket):
     """
-    Endpoint WebSocket qui reçoit des transactions brutes, les enrichit par lots,
-    et renvoie la progression en temps réel.
+    Endpoint WebSocket qui lance (ou rejoint) une analyse de fond et en relaie la progression.
+
+    Trois messages initiaux sont acceptés :
+    - `{"type": "upload", "filename": ...}`, suivi du fichier OFX en messages binaires puis de
+      `{"type": "end"}` : le fichier est parsé au fil de la réception et les transactions partent
+      vers l'enrichissement sans attendre la fin de l'envoi ;
+    - la liste JSON des transactions (issue de /parse-ofx/), soumise au pool d'analyses ;
+    - `{"type": "resume", "job_id": ..., "last_seq": n}` : reprise du suivi d'une analyse.
+      Les résultats postérieurs à `last_seq` sont renvoyés, et les transactions sans
+      résultat enregistré sont remises en traitement si nécessaire.
+
+    L'analyse vit indépendamment de la connexion : une déconnexion n'arrête que le suivi
+    (sauf pendant l'envoi du fichier, qui ne peut pas se poursuivre sans le client).
     """
     await websocket.accept()
+    reader = None
     try:
-        # 1. Attendre de recevoir la liste des transactions du client
+        manager = get_job_manager()
+
+        # 1. Attendre le premier message du client
         data = await websocket.receive_text()
-        transactions_to_process = json.loads(data)
-        
-        total_transactions = len(transactions_to_process)
-        BATCH_SIZE = 4 # Gardons une taille de lot raisonnable
-        
-        # 2. Traiter les transactions par lots et renvoyer la progression
-        for i in range(0, total_transactions, BATCH_SIZE):
-            batch_transactions = transactions_to_process[i:i + BATCH_SIZE]
-            tasks = [categorize_transaction(trn["description"]) for trn in batch_transactions]
-            
-            # Exécuter le lot en parallèle
-            batch_results = await asyncio.gather(*tasks)
-            
-            # Préparer les données enrichies pour ce lot
-            enriched_batch = []
-            for j, enrichment in enumerate(batch_results):
-                trn = batch_transactions[j]
-                trn.update({
-                    "marchand_probable": enrichment.marchand_probable,
-                    "categorie_suggeree": enrichment.categorie_suggeree,
-                    "ville": enrichment.ville
-                })
-                enriched_batch.append(trn)
-
-            # Calculer la progression
-            progress = min(((i + BATCH_SIZE) / total_transactions) * 100, 100)
-
-            # Envoyer le message de progression au client
-            await websocket.send_json({
-                "type": "progress",
-                "processed_count": min(i + BATCH_SIZE, total_transactions),
-                "total_count": total_transactions,
-                "progress_percent": round(progress),
-                "data": enriched_batch
-            })
-            
-        # 3. Envoyer un message final
-        await websocket.send_json({"type": "complete", "message": "Analyse terminée !"})
+        message = json.loads(data)
+        last_seq = 0
+
+        if isinstance(message, list):
+            job_id = manager.submit(message)
+            await websocket.send_json({"type": "job", "job_id": job_id})
+        elif message.get("type") == "upload":
+            if not str(message.get("filename", "")).lower().endswith(('.ofx', '.qfx')):
+                raise ValueError("Type de fichier invalide.")
+            job_id, queue, parsing = manager.start_upload()
+            reader = asyncio.create_task(feed_ofx_chunks(_receive_upload_chunks(websocket), queue, parsing))
+            await websocket.send_json({"type": "job", "job_id": job_id})
+        elif message.get("type") == "resume":
+            try:
+                job = manager.resume(str(message.get("job_id")))
+            except KeyError:
+                raise ValueError("Analyse inconnue : impossible de la reprendre.")
+            job_id = job["job_id"]
+            last_seq = int(message.get("last_seq", 0))
+            await websocket.send_json({"type": "job", "job_id": job_id, "resumed": True})
+        else:
+            raise ValueError("Message initial non reconnu.")
+
+        # 2. Relayer la progression de l'analyse jusqu'à son événement final
+        async for event in manager.events(job_id, last_seq):
+            await websocket.send_text(dumps(event).decode())
 
     except WebSocketDisconnect:
         logging.info("Client déconnecté.")
@@ -108,7 +205,11 @@ async def websocket_analyze(websocket: WebSocket):
         logging.error(f"Erreur WebSocket: {e}")
         await websocket.send_json({"type": "error", "message": str(e)})
     finally:
+        if reader is not None:
+            reader.cancel()
         await websocket.close()
 
 if __name__ == "__main__":
+    import uvicorn
+
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
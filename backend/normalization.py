@@ -0,0 +1,35 @@
+# backend/normalization.py
+
+import re
+import unicodedata
+
+# Dates au format 12/03, 12/03/24, 12.03.2024 ou 2024-03-12
+_DATE_RE = re.compile(r"\b\d{4}-\d{2}-\d{2}\b|\b\d{1,2}[/.-]\d{1,2}(?:[/.-]\d{2,4})?\b")
+# Numéros de carte masqués : 4974XXXXXXXX1234, XXXX1234, X1234, CARTE 1234
+_CARD_RE = re.compile(r"\bCARTE\s+\S*\d{4}\b|\b\d{0,6}[X*]{2,}\d{0,4}\b|\bX\d{4}\b")
+# Références explicites : REF:ABC123, NUM 99812, MDT/FR12ZZZ... Sans séparateur, le jeton suivant
+# n'est retiré que s'il contient un chiffre : « ID KIDS » ou « NO LIMIT » sont des noms de marchands
+_REFERENCE_RE = re.compile(r"\b(?:REF|NUM|NO|ID|FACT|ECH|MDT|RUM|TRN)\b(?:\s*[:./]\s*\S+|\s+(?=\S*\d)\S+)")
+# Jetons alphanumériques longs contenant au moins un chiffre (identifiants de transaction)
+_LONG_TOKEN_RE = re.compile(r"\b(?=[A-Z]*\d)[A-Z0-9]{6,}\b")
+_NON_WORD_RE = re.compile(r"[^A-Z0-9 ]+")
+_SPACES_RE = re.compile(r"\s+")
+
+
+def normalize_description(description: str) -> str:
+    """
+    Réduit un libellé bancaire à une clé stable en retirant les dates,
+    les numéros de carte et les identifiants de référence.
+
+    "CB CARREFOUR 12/03" et "CB CARREFOUR 28/04" donnent tous deux "CB CARREFOUR".
+    """
+    if not description:
+        return ""
+    text = unicodedata.normalize("NFKD", description)
+    text = text.encode("ascii", "ignore").decode("ascii").upper()
+    text = _DATE_RE.sub(" ", text)
+    text = _CARD_RE.sub(" ", text)
+    text = _REFERENCE_RE.sub(" ", text)
+    text = _LONG_TOKEN_RE.sub(" ", text)
+    text = _NON_WORD_RE.sub(" ", text)
+    return _SPACES_RE.sub(" ", text).strip()
@@ -3,73 +3,163 @@
 import io
 import logging
 import re
-from ofxtools.Parser import OFXTree
-from datetime import datetime
+from datetime import date
+from xml.sax.saxutils import unescape
+from typing import BinaryIO, Iterator, List, Optional
+
+from .transactions import Transaction, intern, parse_cents
 
 logger = logging.getLogger(__name__)
 
-def parse_ofx(file_content: bytes):
+# Taille des blocs lus dans le flux OFX
+CHUNK_SIZE = 64 * 1024
+# Un bloc <STMTTRN> plus gros que ceci indique un fichier corrompu
+MAX_BLOCK_SIZE = 1024 * 1024
+
+_STMTTRN_OPEN = b"<STMTTRN>"
+_STMTTRN_CLOSE = b"</STMTTRN>"
+_BANKTRANLIST_CLOSE = b"</BANKTRANLIST>"
+_ACCOUNT_RE = re.compile(rb"<ACCTID>\s*([^<\r\n]+)")
+_FIELD_RE = re.compile(rb"<(TRNTYPE|DTPOSTED|TRNAMT|FITID|NAME|MEMO)>([^<\r\n]*)")
+# Entités des valeurs OFX (OFX 2.3 §2.3), en plus de &amp; &lt; &gt;
+_ENTITIES = {"&nbsp;": " "}
+
+
+def _decode(value: bytes) -> str:
+    # Tenter de décoder avec cp1252, sinon latin-1, puis remplacer les entités (« M&amp;S » → « M&S »)
+    try:
+        text = value.decode('cp1252')
+    except UnicodeDecodeError:
+        text = value.decode('latin-1')
+    return unescape(text, _ENTITIES).strip()
+
+
+class OFXStreamParser:
     """
-    Analyse le contenu binaire d'un fichier OFX, le nettoie et retourne une liste de transactions.
+    Parser OFX incrémental (SGML 1.x et XML 2.x).
+
+    Les octets sont fournis par morceaux via `feed()`, qui retourne les transactions
+    des blocs <STMTTRN> complets déjà reçus. Seul le bloc en cours est conservé en
+    mémoire : la consommation reste bornée quelle que soit la taille du fichier.
+    Le compte courant (<ACCTID>) est suivi au fil du flux, ce qui couvre tous les
+    relevés et tous les comptes d'un même fichier.
     """
-    try:
-        # Tenter de décoder avec cp1252, sinon latin-1
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self.account_id: Optional[str] = None
+        self.transaction_count = 0
+
+    def feed(self, chunk: bytes) -> List[Transaction]:
+        self._buffer += chunk
+        transactions = []
+        buffer = self._buffer
+        position = 0
+        while True:
+            start = buffer.find(_STMTTRN_OPEN, position)
+            if start == -1:
+                # Conserver à partir du dernier '<' : une balise peut être coupée entre deux morceaux
+                keep_from = max(buffer.rfind(b"<", position), position)
+                self._scan_context(buffer, position, keep_from)
+                position = keep_from
+                break
+
+            self._scan_context(buffer, position, start)
+            block_start = start + len(_STMTTRN_OPEN)
+            end, next_position = self._find_block_end(buffer, block_start)
+            if end == -1:
+                if len(buffer) - start > MAX_BLOCK_SIZE:
+                    raise ValueError("Bloc <STMTTRN> anormalement volumineux : fichier OFX corrompu.")
+                position = start
+                break
+
+            transaction = self._parse_block(bytes(buffer[block_start:end]))
+            if transaction is not None:
+                transactions.append(transaction)
+            position = next_position
+
+        del buffer[:position]
+        self.transaction_count += len(transactions)
+        return transactions
+
+    def close(self) -> List[Transaction]:
+        """Termine le flux : un dernier bloc non fermé est traité tel quel."""
+        transactions = []
+        start = self._buffer.find(_STMTTRN_OPEN)
+        if start != -1:
+            transaction = self._parse_block(bytes(self._buffer[start + len(_STMTTRN_OPEN):]))
+            if transaction is not None:
+                transactions.append(transaction)
+        self._buffer.clear()
+        self.transaction_count += len(transactions)
+        return transactions
+
+    def _scan_context(self, buffer: bytearray, start: int, end: int) -> None:
+        for match in _ACCOUNT_RE.finditer(buffer, start, end):
+            self.account_id = intern(_decode(match.group(1)))
+
+    @staticmethod
+    def _find_block_end(buffer: bytearray, block_start: int):
+        """
+        Retourne (fin du contenu, position de reprise) du bloc commencé à `block_start`.
+        En SGML la balise fermante est facultative : le bloc s'arrête alors au
+        <STMTTRN> suivant ou à la fin de la liste.
+
+        Les balises fermantes ne sont cherchées qu'avant le <STMTTRN> suivant : chaque
+        octet du morceau n'est parcouru qu'une fois, quelle que soit sa taille.
+        """
+        next_open = buffer.find(_STMTTRN_OPEN, block_start)
+        limit = next_open if next_open != -1 else len(buffer)
+        candidates = []
+        close = buffer.find(_STMTTRN_CLOSE, block_start, limit)
+        if close != -1:
+            candidates.append((close, close + len(_STMTTRN_CLOSE)))
+        for index in (buffer.find(_BANKTRANLIST_CLOSE, block_start, limit), next_open):
+            if index != -1:
+                candidates.append((index, index))
+        return min(candidates) if candidates else (-1, -1)
+
+    def _parse_block(self, block: bytes) -> Optional[Transaction]:
+        fields = {tag.decode('ascii'): _decode(value) for tag, value in _FIELD_RE.findall(block)}
         try:
-            content_str = file_content.decode('cp1252')
-        except UnicodeDecodeError:
-            content_str = file_content.decode('latin-1')
-
-        # 1. Nettoyer les données superflues après la balise </OFX>
-        closing_tag = '</OFX>'
-        closing_tag_index = content_str.rfind(closing_tag)
-        if closing_tag_index != -1:
-            content_str = content_str[:closing_tag_index + len(closing_tag)]
-        
-        # 2. Injecter la balise <LEDGERBAL> manquante au bon endroit si nécessaire
-        if '<LEDGERBAL>' not in content_str:
-            dtend_match = re.search(r'<DTEND>(\d+)', content_str)
-            # Utiliser la date du relevé ou la date actuelle
-            dtasof_str = dtend_match.group(1) if dtend_match else datetime.now().strftime('%Y%m%d%H%M%S')
-            # La spec OFX requiert une heure, ajoutons-la si elle est absente
-            if len(dtasof_str) == 8:
-                dtasof_str += '120000'
-
-            ledgerbal_tag = f'<LEDGERBAL><BALAMT>0.00<DTASOF>{dtasof_str}</DTASOF></LEDGERBAL>'
-
-            banktranlist_closing_tag = '</BANKTRANLIST>'
-            if banktranlist_closing_tag in content_str:
-                content_str = content_str.replace(banktranlist_closing_tag, banktranlist_closing_tag + ledgerbal_tag)
-
-        cleaned_content = content_str.encode('latin-1')
-
-        tree = OFXTree()
-        tree.parse(io.BytesIO(cleaned_content))
-        response = tree.convert()
-
-        # Utilisation de l'API de haut niveau "statements" pour une extraction robuste
-        statements = getattr(response, 'statements', [])
-        if not statements:
-            logger.warning("Aucun relevé (statement) n'a été trouvé dans le fichier OFX.")
-            return []
-        
-        # On prend le premier relevé trouvé dans le fichier
-        statement = statements[0]
-
-        transactions = getattr(statement, 'transactions', [])
-        if not transactions:
-            logger.warning("Le relevé a été trouvé, mais il ne contient aucune transaction.")
-            return []
-
-        transaction_list = []
-        for trn in transactions:
-            transaction_list.append({
-                "date": trn.dtposted.strftime('%Y-%m-%d'),
-                "amount": float(trn.trnamt),
-                "description": trn.memo
-            })
+            dtposted = fields["DTPOSTED"]
+            posted = date(int(dtposted[0:4]), int(dtposted[4:6]), int(dtposted[6:8]))
+            amount_cents = parse_cents(fields["TRNAMT"])
+        except (KeyError, ValueError) as e:
+            logger.warning(f"Transaction OFX ignorée (date ou montant invalide) : {repr(e)}")
+            return None
+        return Transaction(
+            date=posted,
+            amount_cents=amount_cents,
+            description=fields.get("MEMO") or fields.get("NAME"),
+            account_id=self.account_id,
+            fitid=fields.get("FITID"),
+        )
 
+def iter_ofx_transactions(stream: BinaryIO, chunk_size: int = CHUNK_SIZE) -> Iterator[Transaction]:
+    """
+    Lit un flux OFX binaire par morceaux et produit ses transactions au fur et à mesure.
+    """
+    parser = OFXStreamParser()
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        yield from parser.feed(chunk)
+    yield from parser.close()
+
+
+def parse_ofx(file_content: bytes) -> List[Transaction]:
+    """
+    Analyse le contenu binaire d'un fichier OFX et retourne la liste de ses transactions,
+    tous relevés et tous comptes confondus.
+    """
+    try:
+        transaction_list = list(iter_ofx_transactions(io.BytesIO(file_content)))
+        if not transaction_list:
+            logger.warning("Aucune transaction n'a été trouvée dans le fichier OFX.")
         return transaction_list
 
     except Exception as e:
         logger.error(f"Erreur détaillée lors du parsing du fichier OFX : {e}", exc_info=True)
-        return []
\ No newline at end of file
+        return []
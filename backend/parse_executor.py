@@ -0,0 +1,108 @@
+# backend/parse_executor.py
+
+import asyncio
+import logging
+import os
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import List, Optional, Tuple
+
+from .metrics import REGISTRY
+from .ofx_parser import parse_ofx
+from .transactions import Transaction
+
+logger = logging.getLogger(__name__)
+
+# "process" (par défaut) ou "thread"
+PARSER_EXECUTOR = os.getenv("REVELIO_PARSER_EXECUTOR", "process")
+PARSER_WORKERS = int(os.getenv("REVELIO_PARSER_WORKERS", str(min(4, os.cpu_count() or 1))))
+MAX_OFX_FILE_SIZE = int(os.getenv("REVELIO_MAX_OFX_FILE_SIZE", str(50 * 1024 * 1024)))
+
+
+class FileTooLargeError(ValueError):
+    """Le fichier OFX dépasse MAX_OFX_FILE_SIZE."""
+
+    def __init__(self, size: int):
+        super().__init__(
+            f"Fichier trop volumineux ({size} octets, maximum {MAX_OFX_FILE_SIZE} octets)."
+        )
+
+
+_executor: Optional[Executor] = None
+
+# Temps d'attente dans la file de l'exécuteur (soumission -> début du parsing) et durée du parsing
+PARSE_QUEUE_WAIT = REGISTRY.histogram(
+    "revelio_parse_queue_wait_seconds", "Time an OFX file waited for a parsing worker.")
+PARSE_QUEUE_WAIT_MAX = REGISTRY.gauge(
+    "revelio_parse_queue_wait_max_seconds", "Longest time an OFX file waited for a parsing worker.")
+PARSE_SECONDS = REGISTRY.histogram("revelio_parse_seconds", "Time spent parsing an OFX file.", ["mode"])
+PARSED_TRANSACTIONS = REGISTRY.counter(
+    "revelio_parsed_transactions_total", "Transactions extracted from OFX files.", ["mode"])
+
+
+def start_parse_executor() -> Executor:
+    """
+    Crée le pool de parsing. Un pool de processus est utilisé par défaut ; si la plateforme
+    ne le permet pas, ou si REVELIO_PARSER_EXECUTOR=thread, un pool de threads le remplace.
+    """
+    global _executor
+    if _executor is not None:
+        return _executor
+    if PARSER_EXECUTOR == "process":
+        try:
+            _executor = ProcessPoolExecutor(max_workers=PARSER_WORKERS)
+        except (OSError, NotImplementedError, ImportError) as e:
+            logger.warning(f"Pool de processus indisponible ({repr(e)}), repli sur un pool de threads.")
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=PARSER_WORKERS, thread_name_prefix="ofx-parser")
+    logger.info(f"Pool de parsing OFX démarré : {type(_executor).__name__} ({PARSER_WORKERS} workers).")
+    return _executor
+
+
+def shutdown_parse_executor() -> None:
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def check_file_size(size: int) -> None:
+    if size > MAX_OFX_FILE_SIZE:
+        raise FileTooLargeError(size)
+
+
+def _timed_parse(file_content: bytes, submitted_at: float) -> Tuple[float, float, List[Transaction]]:
+    # Exécuté dans le worker : l'horloge murale est commune aux processus,
+    # les durées sont renvoyées au processus principal qui tient les métriques
+    started = time.time()
+    transactions = parse_ofx(file_content)
+    return started - submitted_at, time.time() - started, transactions
+
+
+async def parse_ofx_async(file_content: bytes) -> List[Transaction]:
+    """
+    Parse un fichier OFX hors de la boucle d'événements, dans le pool de parsing
+    (ou dans le pool de threads par défaut de la boucle si le pool n'est pas démarré).
+    """
+    check_file_size(len(file_content))
+    loop = asyncio.get_running_loop()
+    queue_wait, duration, transactions = await loop.run_in_executor(
+        _executor, _timed_parse, file_content, time.time()
+    )
+    queue_wait = max(queue_wait, 0.0)
+    PARSE_QUEUE_WAIT.observe(queue_wait)
+    PARSE_QUEUE_WAIT_MAX.set_max(queue_wait)
+    PARSE_SECONDS.observe(duration, mode="file")
+    PARSED_TRANSACTIONS.inc(len(transactions), mode="file")
+    return transactions
+
+
+def parse_stats() -> dict:
+    jobs = PARSE_QUEUE_WAIT.count()
+    return {
+        "executor": type(_executor).__name__ if _executor is not None else None,
+        "workers": PARSER_WORKERS,
+        "jobs": jobs,
+        "queue_wait_avg_seconds": round(PARSE_QUEUE_WAIT.sum() / jobs, 6) if jobs else 0.0,
+        "queue_wait_max_seconds": round(PARSE_QUEUE_WAIT_MAX.value(), 6),
+    }
@@ -0,0 +1,219 @@
+# backend/pipeline.py
+
+import asyncio
+import functools
+import time
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from .ai_service import (categorize_batch, count_llm_requests, dedup_key, explain_anomaly, is_fallback, LLM_BATCH_SIZE,
+                         prompt_fingerprint)
+from .anomaly import get_anomaly_detector
+from .ofx_parser import OFXStreamParser
+from .parse_executor import PARSE_SECONDS, PARSED_TRANSACTIONS
+from .scheduler import AdaptiveLimiter, run_adaptive
+from .schemas import CategorizationResponse
+from .storage import get_store
+from .transactions import Transaction, intern
+
+# Marqueur de fin de flux dans les files de transactions
+END_OF_STREAM = None
+
+
+class ParsingState:
+    """Avancement du parsing d'un fichier en cours de réception."""
+
+    def __init__(self):
+        self.parsed_count = 0
+        self.complete = False
+        self.error: Optional[BaseException] = None
+
+
+async def feed_ofx_chunks(chunks: AsyncIterator[bytes], queue: asyncio.Queue, state: ParsingState) -> None:
+    """
+    Parse un fichier OFX reçu par morceaux et pousse chaque transaction dans `queue`
+    dès que son bloc est complet. La file est toujours terminée par END_OF_STREAM,
+    y compris en cas d'erreur ou d'annulation (conservée dans `state.error` : un
+    import annulé en cours de route n'est pas un import complet).
+    Chaque morceau est parsé dans un thread : un gros morceau ne bloque pas la boucle
+    d'événements, ni donc la progression des autres analyses en cours.
+    Seul le temps passé dans le parser est mesuré, pas l'attente des morceaux.
+    """
+    parser = OFXStreamParser()
+    parse_time = 0.0
+    try:
+        async for chunk in chunks:
+            transactions, duration = await asyncio.to_thread(_timed_feed, parser, chunk)
+            parse_time += duration
+            for transaction in transactions:
+                state.parsed_count += 1
+                await queue.put(transaction)
+        for transaction in parser.close():
+            state.parsed_count += 1
+            await queue.put(transaction)
+    except Exception as e:
+        state.error = e
+    except asyncio.CancelledError as e:
+        state.error = e
+        raise
+    finally:
+        state.complete = True
+        PARSE_SECONDS.observe(parse_time, mode="stream")
+        PARSED_TRANSACTIONS.inc(state.parsed_count, mode="stream")
+        if isinstance(state.error, asyncio.CancelledError):
+            # Ne pas attendre une place dans une file bornée que plus personne ne lit
+            try:
+                queue.put_nowait(END_OF_STREAM)
+            except asyncio.QueueFull:
+                pass
+        else:
+            await queue.put(END_OF_STREAM)
+
+
+def _timed_feed(parser: OFXStreamParser, chunk: bytes) -> Tuple[List[Transaction], float]:
+    started = time.perf_counter()
+    transactions = parser.feed(chunk)
+    return transactions, time.perf_counter() - started
+
+
+async def lots_from_queue(queue: asyncio.Queue, size: int = LLM_BATCH_SIZE) -> AsyncIterator[List[Transaction]]:
+    """
+    Regroupe les transactions d'une file en lots d'au plus `size` éléments.
+    Un lot incomplet est émis dès que la file est momentanément vide, afin que
+    l'enrichissement ne dépende pas de l'arrivée de la suite du fichier.
+    """
+    lot: List[Transaction] = []
+    while True:
+        if lot and queue.empty():
+            yield lot
+            lot = []
+        transaction = await queue.get()
+        if transaction is END_OF_STREAM:
+            break
+        lot.append(transaction)
+        if len(lot) >= size:
+            yield lot
+            lot = []
+    if lot:
+        yield lot
+
+
+async def enrich_lots(lots: AsyncIterator[List[Transaction]], limiter: AdaptiveLimiter,
+                      reuse_stored: bool = True) -> AsyncIterator[Tuple[List[Transaction], List[CategorizationResponse]]]:
+    """
+    Catégorise chaque lot en une requête LLM, avec une concurrence adaptative,
+    et produit (lot, résultats) dans l'ordre de fin de traitement.
+
+    Chaque lot est d'abord enregistré dans le stockage : les transactions déjà
+    importées et enrichies (même compte, même FITID) réutilisent leur catégorisation
+    stockée si elle a été obtenue avec le modèle et le prompt en service, seules les
+    autres partent vers la catégorisation. Avec `reuse_stored=False`
+    (recatégorisation après un changement de prompt), toutes les transactions sont
+    recatégorisées, sans reprendre non plus les catégories des paiements récurrents.
+
+    Les libellés sont regroupés sur toute l'analyse : un libellé déjà catégorisé dans
+    un lot précédent est repris tel quel pour les lignes suivantes, et chaque lot
+    n'envoie qu'une occurrence de chaque libellé restant.
+
+    Les transactions nouvellement enrichies sont comparées aux dépenses habituelles
+    de leur marchand : celles jugées anormales reçoivent un attribut `anomalie`, dont la
+    justification est rédigée par le LLM.
+    """
+    # Catégorisations obtenues pendant cette analyse, par libellé normalisé
+    run_results: Dict[str, CategorizationResponse] = {}
+    categorize = categorize_batch if reuse_stored else functools.partial(categorize_batch, use_recurring=False)
+
+    async def categorize_lot(batch_transactions):
+        store = get_store()
+        results = store.import_transactions(batch_transactions, prompt_fingerprint())
+        if not reuse_stored:
+            results = [None] * len(results)
+        pending = [i for i, result in enumerate(results) if result is None]
+        if pending:
+            groups: Dict[str, List[int]] = {}
+            for i in pending:
+                key = dedup_key(batch_transactions[i].description)
+                if key in run_results:
+                    results[i] = run_results[key]
+                else:
+                    groups.setdefault(key, []).append(i)
+            if groups:
+                # Catégoriser une occurrence par libellé, en une seule requête, puis répartir
+                rows = list(groups.values())
+                enrichments = await categorize([batch_transactions[indexes[0]].description for indexes in rows])
+                for key, indexes, enrichment in zip(groups, rows, enrichments):
+                    for i in indexes:
+                        results[i] = enrichment
+                    if not is_fallback(enrichment):
+                        run_results[key] = enrichment
+            # Les réponses de repli ne sont pas stockées : elles seront retentées au prochain import
+            successful = [i for i in pending if not is_fallback(results[i])]
+            # Les lignes déjà importées figurent dans l'historique du détecteur : ne pas les recompter
+            await flag_anomalies([apply_enrichment(batch_transactions[i], results[i]) for i in successful],
+                                 observe=[bool(batch_transactions[i].nouvelle) for i in successful])
+            if successful:
+                store.save_enrichment([batch_transactions[i] for i in successful], [results[i] for i in successful],
+                                      prompt_fingerprint())
+        return results
+
+    async def enrich_lot(batch_transactions):
+        # Les lots servis sans appel au LLM (stockage, règles, cache) ne mesurent pas sa latence
+        with count_llm_requests() as llm_requests:
+            results = await categorize_lot(batch_transactions)
+        return results, llm_requests[0]
+
+    def lot_failed(outcome):
+        return any(map(is_fallback, outcome[0]))
+
+    def called_llm(outcome):
+        return outcome[1] > 0
+
+    async for lot, (results, _) in run_adaptive(number_repeats(lots), enrich_lot, limiter, is_error=lot_failed,
+                                                is_measured=called_llm):
+        yield lot, results
+
+
+async def number_repeats(lots: AsyncIterator[List[Transaction]]) -> AsyncIterator[List[Transaction]]:
+    """
+    Numérote, dans l'ordre de l'envoi, les transactions sans FITID identiques (compte,
+    date, montant, libellé) : leur identifiant de stockage les distingue ainsi au lieu
+    de traiter la deuxième comme un doublon de la première.
+    """
+    seen: Dict[tuple, int] = {}
+    async for lot in lots:
+        for transaction in lot:
+            if transaction.fitid or transaction.occurrence is not None:
+                continue
+            key = (transaction.account_id, transaction.date, transaction.amount_cents, transaction.description)
+            count = seen.get(key, 0)
+            seen[key] = count + 1
+            if count:
+                transaction.occurrence = count
+        yield lot
+
+
+async def flag_anomalies(transactions: List[Transaction], observe: Optional[List[bool]] = None) -> None:
+    """
+    Compare chaque transaction enrichie à l'historique puis l'y ajoute, sauf celles dont
+    `observe` est faux (déjà comptées, par exemple lors d'une recatégorisation). Le LLM
+    n'est appelé que pour rédiger la justification des quelques anomalies.
+    """
+    detector = get_anomaly_detector()
+    flagged = []
+    for i, transaction in enumerate(transactions):
+        if observe is None or observe[i]:
+            verdict = detector.check_and_observe(transaction)
+        else:
+            verdict = detector.check(transaction)
+        if verdict["est_anomalie"]:
+            flagged.append((transaction, verdict))
+    justifications = await asyncio.gather(*(explain_anomaly(t, verdict) for t, verdict in flagged))
+    for (transaction, verdict), justification in zip(flagged, justifications):
+        verdict["justification"] = justification
+        transaction.anomalie = verdict
+
+
+def apply_enrichment(transaction: Transaction, enrichment: CategorizationResponse) -> Transaction:
+    transaction.marchand_probable = intern(enrichment.marchand_probable)
+    transaction.categorie_suggeree = intern(enrichment.categorie_suggeree)
+    transaction.ville = intern(enrichment.ville)
+    return transaction
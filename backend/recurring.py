@@ -0,0 +1,183 @@
+# backend/recurring.py
+
+import calendar
+import os
+import statistics
+import threading
+from collections import Counter
+from datetime import date
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .normalization import normalize_description
+from .schemas import CategorizationResponse
+from .storage import TransactionStore, get_store
+
+# Écart relatif toléré entre un montant et le montant médian de la série
+RECURRING_AMOUNT_TOLERANCE = float(os.getenv("REVELIO_RECURRING_AMOUNT_TOLERANCE", "0.15"))
+# Part minimale des intervalles compatibles avec la cadence
+RECURRING_REGULARITY = float(os.getenv("REVELIO_RECURRING_REGULARITY", "0.8"))
+
+# Cadence → (intervalle minimal en jours, intervalle maximal, occurrences minimales, pas en mois)
+CADENCES = {
+    "mensuel": (26, 35, 3, 1),
+    "trimestriel": (85, 97, 3, 3),
+    "annuel": (355, 375, 2, 12),
+}
+
+
+def _add_months(day: date, months: int) -> date:
+    month_index = day.month - 1 + months
+    year, month = day.year + month_index // 12, month_index % 12 + 1
+    return date(year, month, min(day.day, calendar.monthrange(year, month)[1]))
+
+
+def _detect_cadence(days: List[int]) -> Optional[str]:
+    intervals = [later - earlier for earlier, later in zip(days, days[1:])]
+    if not intervals:
+        return None
+    for cadence, (low, high, min_count, _) in CADENCES.items():
+        if len(days) < min_count:
+            continue
+        regular = sum(low <= interval <= high for interval in intervals)
+        if regular >= RECURRING_REGULARITY * len(intervals):
+            return cadence
+    return None
+
+
+def detect_series(key: Tuple[str, str], rows: List[tuple]) -> Optional[dict]:
+    """
+    Cherche une série périodique dans les dépenses d'un même libellé normalisé sur un
+    même compte, triées par date : (jour ordinal, montant en centimes, marchand, catégorie,
+    ville, empreinte du prompt). Les montants trop éloignés de la médiane sont écartés
+    avant de mesurer les intervalles.
+
+    La catégorisation de la série est la plus fréquente parmi ses occurrences, avec
+    l'empreinte du prompt sous lequel elle a été obtenue le plus souvent.
+    """
+    median = statistics.median(-row[1] for row in rows)
+    kept = [row for row in rows if abs(-row[1] - median) <= RECURRING_AMOUNT_TOLERANCE * median]
+    cadence = _detect_cadence([row[0] for row in kept])
+    if cadence is None:
+        return None
+
+    merchants = Counter(row[2] for row in kept if row[2])
+    categories = Counter(row[3] for row in kept if row[3])
+    cities = Counter(row[4] for row in kept if row[4])
+    fingerprints = Counter(row[5] for row in kept if row[3])
+    first, last = date.fromordinal(kept[0][0]), date.fromordinal(kept[-1][0])
+    return {
+        "account_id": key[0],
+        "cle": key[1],
+        "marchand": merchants.most_common(1)[0][0] if merchants else None,
+        "categorie": categories.most_common(1)[0][0] if categories else None,
+        "ville": cities.most_common(1)[0][0] if cities else None,
+        "empreinte": fingerprints.most_common(1)[0][0] if fingerprints else None,
+        "cadence": cadence,
+        "montant_moyen": round(sum(-row[1] for row in kept) / len(kept) / 100, 2),
+        "occurrences": len(kept),
+        "premiere_date": first.isoformat(),
+        "derniere_date": last.isoformat(),
+        "prochaine_date": _add_months(last, CADENCES[cadence][3]).isoformat(),
+    }
+
+
+def find_recurring(rows: Iterable[tuple]) -> List[dict]:
+    """
+    Détecte les paiements récurrents à partir des transactions triées par compte puis
+    par date : (account_id, date, amount_cents, description, marchand, catégorie, ville,
+    empreinte du prompt).
+
+    Le passage est unique et linéaire : chaque dépense est rangée dans le groupe de son
+    libellé normalisé, et un groupe est analysé dès que le compte change. Aucune paire
+    de transactions n'est comparée.
+    """
+    series: List[dict] = []
+    groups: Dict[Tuple[str, str], List[tuple]] = {}
+    current_account = None
+
+    def flush():
+        for key, group_rows in groups.items():
+            found = detect_series(key, group_rows)
+            if found is not None:
+                series.append(found)
+        groups.clear()
+
+    for account_id, day, amount_cents, description, merchant, category, city, fingerprint in rows:
+        if account_id != current_account:
+            flush()
+            current_account = account_id
+        if amount_cents >= 0:
+            continue
+        key = normalize_description(description or "")
+        if key:
+            groups.setdefault((account_id, key), []).append(
+                (date.fromisoformat(day).toordinal(), amount_cents, merchant, category, city, fingerprint)
+            )
+    flush()
+    return series
+
+
+class RecurringIndex:
+    """
+    Paiements récurrents détectés dans le stockage, indexés par compte et libellé
+    normalisé. Une série déjà catégorisée fournit directement la catégorisation des
+    nouvelles occurrences du même libellé, tant que le modèle et le prompt qui l'ont
+    produite sont toujours ceux en service.
+    """
+
+    def __init__(self, series: List[dict]):
+        self.series = series
+        self._by_key: Dict[Tuple[str, str], Tuple[CategorizationResponse, Optional[str]]] = {}
+        # Sans compte précisé : les séries du libellé sur tous les comptes, la plus longue d'abord
+        self._by_description: Dict[str, List[Tuple[CategorizationResponse, Optional[str]]]] = {}
+        for s in sorted(series, key=lambda s: s["occurrences"], reverse=True):
+            if not (s["marchand"] and s["categorie"]):
+                continue
+            entry = (CategorizationResponse(marchand_probable=s["marchand"], categorie_suggeree=s["categorie"],
+                                            ville=s["ville"]), s["empreinte"])
+            self._by_key[(s["account_id"], s["cle"])] = entry
+            self._by_description.setdefault(s["cle"], []).append(entry)
+
+    @classmethod
+    def from_store(cls, store: TransactionStore) -> "RecurringIndex":
+        return cls(find_recurring(store.rows_by_account_and_date()))
+
+    def match(self, description: str, fingerprint: Optional[str] = None,
+              account_id: Optional[str] = None) -> Optional[CategorizationResponse]:
+        """
+        Catégorisation de la série du libellé sur le compte `account_id`, ou, sans compte,
+        de la plus longue série de ce libellé. Avec `fingerprint`, une série catégorisée
+        sous un autre modèle ou prompt est ignorée, comme le serait une entrée du cache.
+        """
+        key = normalize_description(description)
+        if account_id is not None:
+            found = self._by_key.get((account_id, key))
+            candidates = [found] if found is not None else []
+        else:
+            candidates = self._by_description.get(key, [])
+        for response, series_fingerprint in candidates:
+            if fingerprint is None or series_fingerprint == fingerprint:
+                return response
+        return None
+
+
+_index: Optional[RecurringIndex] = None
+_lock = threading.Lock()
+
+
+def get_recurring_index() -> RecurringIndex:
+    """Retourne les paiements récurrents, détectés à la première utilisation (une seule fois)."""
+    global _index
+    if _index is None:
+        with _lock:
+            if _index is None:
+                _index = RecurringIndex.from_store(get_store())
+    return _index
+
+
+def refresh_recurring_index() -> RecurringIndex:
+    """Relance la détection sur l'ensemble des transactions stockées."""
+    global _index
+    with _lock:
+        _index = RecurringIndex.from_store(get_store())
+    return _index
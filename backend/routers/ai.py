@@ -2,7 +2,9 @@
 
 from fastapi import APIRouter, HTTPException, Body
 from ..schemas import TransactionDescription, CategorizationResponse
-from ..ai_service import categorize_transaction, analyze_anomaly
+from ..ai_service import categorize_transaction, analyze_anomaly, get_llm_router
+from ..pipeline import apply_enrichment
+from ..transactions import Transaction
 
 router = APIRouter()
 
@@ -17,19 +19,31 @@ async def categorize(transaction_desc: TransactionDescription):
     response = await categorize_transaction(transaction_desc.libelle)
     return response
 
+@router.get("/ai/backends")
+async def list_backends():
+    """
+    Endpoint exposing the state of each Ollama instance (load, health, circuit breaker).
+    """
+    return get_llm_router().stats()
+
 @router.post("/ai/analyze-anomaly")
 async def analyze_anomaly_endpoint(payload: dict = Body(...)):
     """
-    Endpoint to analyze a transaction for anomalies.
-    This is a mock implementation as per the plan.
+    Endpoint to analyze a transaction for anomalies against the spending statistics
+    kept server-side. A transaction without a category is categorized first.
     """
-    # Extract data from payload - assuming a certain structure for now
     transaction_actuelle = payload.get("transaction_actuelle", {})
-    historique_categorie = payload.get("historique_categorie", {})
 
     if not transaction_actuelle:
         raise HTTPException(status_code=400, detail="Payload must contain 'transaction_actuelle'.")
+    try:
+        transaction = Transaction.from_dict(transaction_actuelle, date_required=False)
+    except ValueError:
+        raise HTTPException(status_code=400,
+                            detail="'transaction_actuelle' must contain a numeric 'amount' and, if any, an ISO 'date'.")
 
-    # Call the mock service
-    response = await analyze_anomaly(transaction_actuelle, historique_categorie)
-    return response
\ No newline at end of file
+    if not transaction.categorie_suggeree and transaction.description:
+        apply_enrichment(transaction, await categorize_transaction(transaction.description))
+
+    response = await analyze_anomaly(transaction)
+    return response
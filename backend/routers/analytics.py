@@ -0,0 +1,52 @@
+# backend/routers/analytics.py
+
+from typing import List, Optional
+from fastapi import APIRouter, HTTPException, Query
+from ..schemas import SpendAggregate, BalancePoint
+
+router = APIRouter()
+
+def _columns():
+    # Import at first use: NumPy is only loaded when statistics are requested, not at startup
+    from ..analytics import get_columns
+
+    return get_columns()
+
+def _compute(method, **kwargs):
+    try:
+        return method(**kwargs)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Dates must use the YYYY-MM-DD format.")
+
+@router.get("/analytics/categories", response_model=List[SpendAggregate])
+async def spend_by_category(date_from: Optional[str] = None, date_to: Optional[str] = None,
+                            account_id: Optional[str] = None):
+    """
+    Endpoint returning spend and income per category over the stored transactions.
+    """
+    return _compute(_columns().by_category, date_from=date_from, date_to=date_to, account_id=account_id)
+
+@router.get("/analytics/merchants", response_model=List[SpendAggregate])
+async def spend_by_merchant(date_from: Optional[str] = None, date_to: Optional[str] = None,
+                            account_id: Optional[str] = None, limit: int = Query(50, ge=1, le=1000)):
+    """
+    Endpoint returning spend and income per merchant, biggest spend first.
+    """
+    return _compute(_columns().by_merchant, limit=limit, date_from=date_from, date_to=date_to,
+                    account_id=account_id)
+
+@router.get("/analytics/months", response_model=List[SpendAggregate])
+async def spend_by_month(date_from: Optional[str] = None, date_to: Optional[str] = None,
+                         account_id: Optional[str] = None):
+    """
+    Endpoint returning spend and income per month (YYYY-MM), in chronological order.
+    """
+    return _compute(_columns().by_month, date_from=date_from, date_to=date_to, account_id=account_id)
+
+@router.get("/analytics/balance", response_model=List[BalancePoint])
+async def running_balance(date_from: Optional[str] = None, date_to: Optional[str] = None,
+                          account_id: Optional[str] = None):
+    """
+    Endpoint returning the end-of-day running balance of each account.
+    """
+    return _compute(_columns().running_balance, date_from=date_from, date_to=date_to, account_id=account_id)
@@ -0,0 +1,61 @@
+# backend/routers/jobs.py
+
+from typing import List
+from fastapi import APIRouter, HTTPException, Query
+from ..schemas import JobSubmission, JobStatus, JobResults
+from ..jobs import get_job_manager, get_job_store, progress_percent
+
+router = APIRouter()
+
+def _job_status(job: dict) -> JobStatus:
+    return JobStatus(**job, progress_percent=progress_percent(job))
+
+@router.post("/jobs", response_model=JobStatus, status_code=202)
+async def submit_job(submission: JobSubmission):
+    """
+    Endpoint queuing a batch of transactions for background enrichment.
+    """
+    if not submission.transactions:
+        raise HTTPException(status_code=400, detail="The job must contain at least one transaction.")
+    if any("description" not in trn for trn in submission.transactions):
+        raise HTTPException(status_code=400, detail="Every transaction needs a 'description'.")
+    try:
+        job_id = get_job_manager().submit(submission.transactions)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Every transaction needs a numeric 'amount' and an ISO 'date'.")
+    return _job_status(get_job_store().get_job(job_id))
+
+@router.get("/jobs", response_model=List[JobStatus])
+async def list_jobs(limit: int = Query(50, ge=1, le=1000)):
+    """
+    Endpoint listing the most recent background jobs.
+    """
+    return [_job_status(job) for job in get_job_store().list_jobs(limit=limit)]
+
+@router.get("/jobs/{job_id}", response_model=JobStatus)
+async def get_job(job_id: str):
+    """
+    Endpoint returning the status and progress of a background job.
+    """
+    job = get_job_store().get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job.")
+    return _job_status(job)
+
+@router.get("/jobs/{job_id}/results", response_model=JobResults)
+async def get_job_results(job_id: str, after_seq: int = Query(0, ge=0), limit: int = Query(500, ge=1, le=5000)):
+    """
+    Endpoint returning the enriched results of a job produced after `after_seq`.
+    Pass the returned `last_seq` as `after_seq` to fetch the next page.
+    """
+    store = get_job_store()
+    job = store.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job.")
+    results = store.results_since(job_id, after_seq, limit)
+    return JobResults(
+        job_id=job_id,
+        status=job["status"],
+        last_seq=results[-1]["seq"] if results else after_seq,
+        results=results
+    )
@@ -0,0 +1,19 @@
+# backend/routers/recurring.py
+
+import asyncio
+from typing import List, Optional
+from fastapi import APIRouter
+from ..schemas import RecurringPayment
+from ..recurring import get_recurring_index, refresh_recurring_index
+
+router = APIRouter()
+
+@router.get("/recurring", response_model=List[RecurringPayment])
+async def list_recurring(account_id: Optional[str] = None, refresh: bool = False):
+    """
+    Endpoint returning the recurring payments detected in the stored transactions,
+    with their cadence and next expected date. `refresh=true` reruns the detection.
+    """
+    # Detection scans the whole history: keep it off the event loop
+    index = await asyncio.to_thread(refresh_recurring_index if refresh else get_recurring_index)
+    return [series for series in index.series if account_id is None or series["account_id"] == account_id]
@@ -0,0 +1,23 @@
+# backend/routers/rules.py
+
+from typing import List
+from fastapi import APIRouter
+from ..schemas import MerchantRule
+from ..rules import get_rules_engine, save_rules
+
+router = APIRouter()
+
+@router.get("/rules", response_model=List[MerchantRule])
+async def list_rules():
+    """
+    Endpoint returning the merchant rules table used before calling the LLM.
+    """
+    return get_rules_engine().rules
+
+@router.put("/rules", response_model=List[MerchantRule])
+async def replace_rules(rules: List[MerchantRule]):
+    """
+    Endpoint replacing the merchant rules table. The new table is saved and compiled immediately.
+    """
+    save_rules(rules)
+    return get_rules_engine().rules
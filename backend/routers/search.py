@@ -0,0 +1,36 @@
+# backend/routers/search.py
+
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Query
+from ..serialization import TransactionsJSONResponse
+from ..storage import get_store
+from ..transactions import to_cents
+
+router = APIRouter()
+
+@router.get("/transactions/search")
+async def search_transactions(q: Optional[str] = None, category: Optional[str] = None,
+                              city: Optional[str] = None, account_id: Optional[str] = None,
+                              date_from: Optional[str] = None, date_to: Optional[str] = None,
+                              min_amount: Optional[float] = Query(None, ge=0),
+                              max_amount: Optional[float] = Query(None, ge=0),
+                              kind: Optional[str] = Query(None, pattern="^(debit|credit)$"),
+                              limit: int = Query(50, ge=1, le=500), cursor: Optional[str] = None):
+    """
+    Endpoint searching the stored transactions, most recent first.
+
+    `q` matches words (or word prefixes) of the description and merchant; amounts bound
+    the absolute value, `kind` keeps only debits or credits. Pass the returned
+    `next_cursor` back as `cursor` to get the next page; it is null on the last page.
+    """
+    try:
+        results, next_cursor = get_store().search(
+            text=q, category=category, city=city, account_id=account_id,
+            date_from=date_from, date_to=date_to,
+            min_amount_cents=to_cents(min_amount) if min_amount is not None else None,
+            max_amount_cents=to_cents(max_amount) if max_amount is not None else None,
+            kind=kind, limit=limit, cursor=cursor,
+        )
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Dates must use the YYYY-MM-DD format and the cursor must come from a previous page.")
+    return TransactionsJSONResponse({"results": results, "next_cursor": next_cursor})
@@ -0,0 +1,107 @@
+# backend/rules.py
+
+import json
+import logging
+import os
+import re
+from typing import Dict, List, Optional
+
+from .normalization import normalize_description
+from .schemas import CategorizationResponse, MerchantRule
+
+logger = logging.getLogger(__name__)
+
+# Table livrée avec l'application, en lecture seule
+RULES_PATH = os.getenv(
+    "REVELIO_RULES_PATH",
+    os.path.join(os.path.dirname(__file__), "data", "merchant_rules.json")
+)
+# Table modifiée via PUT /rules, rangée à côté des bases ; elle remplace la table livrée
+USER_RULES_PATH = os.getenv("REVELIO_USER_RULES_PATH", "revelio_rules.json")
+
+
+class RulesEngine:
+    """
+    Catégorisation par règles : table marchand -> catégorie/ville.
+
+    Tous les motifs sont compilés en une seule expression régulière (alternance
+    triée du plus long au plus court) appliquée au libellé normalisé : un seul
+    passage sur le texte, quel que soit le nombre de règles.
+    """
+
+    def __init__(self, rules: List[MerchantRule]):
+        self.rules = list(rules)
+        self.hits = 0
+        self.misses = 0
+        self._by_pattern: Dict[str, MerchantRule] = {}
+        for rule in self.rules:
+            pattern = normalize_description(rule.motif)
+            if pattern:
+                self._by_pattern.setdefault(pattern, rule)
+        if self._by_pattern:
+            alternatives = sorted(self._by_pattern, key=len, reverse=True)
+            self._regex = re.compile(
+                r"(?<![A-Z0-9])(?:" + "|".join(map(re.escape, alternatives)) + r")(?![A-Z0-9])"
+            )
+        else:
+            self._regex = None
+
+    def match(self, description: str) -> Optional[CategorizationResponse]:
+        """Retourne la catégorisation de la première règle trouvée dans le libellé, ou None."""
+        if self._regex is not None:
+            found = self._regex.search(normalize_description(description))
+            if found:
+                self.hits += 1
+                rule = self._by_pattern[found.group(0)]
+                return CategorizationResponse(
+                    marchand_probable=rule.marchand,
+                    categorie_suggeree=rule.categorie,
+                    ville=rule.ville
+                )
+        self.misses += 1
+        return None
+
+    def stats(self) -> dict:
+        return {"rules": len(self.rules), "hits": self.hits, "misses": self.misses}
+
+
+_engine: Optional[RulesEngine] = None
+
+
+def load_rules(path: Optional[str] = None) -> List[MerchantRule]:
+    """
+    Charge la table de règles depuis le fichier JSON ; une table absente est vide.
+    Par défaut, la table de l'utilisateur si elle existe, sinon la table livrée.
+    """
+    if path is None:
+        path = USER_RULES_PATH if os.path.exists(USER_RULES_PATH) else RULES_PATH
+    if not os.path.exists(path):
+        logger.warning(f"Fichier de règles introuvable : {path}. Aucune règle chargée.")
+        return []
+    with open(path, encoding="utf-8") as f:
+        return [MerchantRule(**rule) for rule in json.load(f)]
+
+
+def save_rules(rules: List[MerchantRule], path: Optional[str] = None) -> None:
+    """
+    Écrit la table de règles dans le fichier JSON (par défaut la table de l'utilisateur,
+    jamais la table livrée) et recompile le moteur.
+    """
+    path = path or USER_RULES_PATH
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump([rule.model_dump() for rule in rules], f, ensure_ascii=False, indent=2)
+    reload_rules(path)
+
+
+def reload_rules(path: Optional[str] = None) -> RulesEngine:
+    global _engine
+    _engine = RulesEngine(load_rules(path))
+    return _engine
+
+
+def get_rules_engine() -> RulesEngine:
+    """Retourne le moteur de règles, compilé au premier appel."""
+    if _engine is None:
+        return reload_rules()
+    return _engine
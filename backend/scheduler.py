@@ -0,0 +1,183 @@
+# backend/scheduler.py
+
+import asyncio
+import logging
+import math
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterable, AsyncIterator, Awaitable, Callable, Iterable, Optional, Tuple, TypeVar, Union
+
+logger = logging.getLogger(__name__)
+
+INITIAL_CONCURRENCY = int(os.getenv("REVELIO_INITIAL_CONCURRENCY", "4"))
+MIN_CONCURRENCY = int(os.getenv("REVELIO_MIN_CONCURRENCY", "1"))
+MAX_CONCURRENCY = int(os.getenv("REVELIO_MAX_CONCURRENCY", "16"))
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+_DONE = object()
+
+
+class AdaptiveLimiter:
+    """
+    Sémaphore dont la capacité s'ajuste selon la règle AIMD (additive increase,
+    multiplicative decrease) à partir de la latence et des erreurs observées.
+
+    Chaque appel réussi dont la latence reste sous `latency_tolerance` fois la latence
+    de référence augmente la limite d'environ 1 par « fenêtre » de `limit` appels.
+    Une erreur ou une latence excessive la multiplie par `backoff`, au plus une fois
+    par intervalle d'une latence de référence afin de ne pas sur-réagir à une rafale.
+
+    La latence de référence est une moyenne mobile de toutes les latences observées,
+    hausses comprises : un premier appel anormalement rapide ne la fige pas, elle
+    rejoint la latence réelle du service en quelques dizaines d'appels.
+    """
+
+    def __init__(self, initial: int = INITIAL_CONCURRENCY, min_limit: int = MIN_CONCURRENCY,
+                 max_limit: int = MAX_CONCURRENCY, backoff: float = 0.5,
+                 latency_tolerance: float = 2.0, smoothing: float = 0.1):
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self._limit = float(min(max(initial, self.min_limit), self.max_limit))
+        self.backoff = backoff
+        self.latency_tolerance = latency_tolerance
+        self.smoothing = smoothing
+        self.baseline_latency: Optional[float] = None
+        self.in_flight = 0
+        self.successes = 0
+        self.errors = 0
+        self._last_decrease = 0.0
+        self._condition = asyncio.Condition()
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    async def acquire(self) -> None:
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.in_flight < self.limit)
+            self.in_flight += 1
+
+    async def release(self) -> None:
+        async with self._condition:
+            self.in_flight -= 1
+            self._condition.notify_all()
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        await self.acquire()
+        try:
+            yield
+        finally:
+            await self.release()
+
+    async def record(self, latency: float, success: bool) -> None:
+        """Met à jour la limite à partir du résultat d'un appel."""
+        congested = not success
+        if success:
+            self.successes += 1
+            if self.baseline_latency is None:
+                self.baseline_latency = latency
+            else:
+                congested = latency > self.baseline_latency * self.latency_tolerance
+                self.baseline_latency += self.smoothing * (latency - self.baseline_latency)
+        else:
+            self.errors += 1
+
+        previous = self.limit
+        if congested:
+            now = time.monotonic()
+            if now - self._last_decrease >= (self.baseline_latency or 0.0):
+                self._limit = max(float(self.min_limit), math.floor(self._limit * self.backoff))
+                self._last_decrease = now
+        else:
+            self._limit = min(float(self.max_limit), self._limit + 1.0 / self._limit)
+
+        if self.limit != previous:
+            logger.info(f"Concurrence LLM ajustée : {previous} -> {self.limit}")
+            if self.limit > previous:
+                async with self._condition:
+                    self._condition.notify_all()
+
+    def stats(self) -> dict:
+        return {
+            "limit": self.limit,
+            "in_flight": self.in_flight,
+            "baseline_latency": self.baseline_latency,
+            "successes": self.successes,
+            "errors": self.errors,
+        }
+
+
+async def run_adaptive(items: Union[Iterable[T], AsyncIterable[T]],
+                       worker: Callable[[T], Awaitable[R]],
+                       limiter: AdaptiveLimiter,
+                       is_error: Optional[Callable[[R], bool]] = None,
+                       is_measured: Optional[Callable[[R], bool]] = None) -> AsyncIterator[Tuple[T, R]]:
+    """
+    Exécute `worker` sur chaque élément avec un pool de tâches borné par `limiter`,
+    et produit les couples (élément, résultat) dans l'ordre où ils se terminent.
+
+    Un résultat réussi pour lequel `is_measured` est faux (obtenu sans solliciter le
+    service limité, par exemple depuis le cache) ne compte pas dans l'ajustement.
+
+    Les éléments sont lus depuis une file d'attente alimentée au fil de l'eau : une
+    génération lente n'empêche pas les autres éléments de démarrer. Une exception
+    levée par `worker` est propagée au consommateur.
+    """
+    queue: asyncio.Queue = asyncio.Queue(maxsize=limiter.max_limit * 2)
+    results: asyncio.Queue = asyncio.Queue()
+    worker_count = limiter.max_limit
+
+    async def feed() -> None:
+        try:
+            if hasattr(items, "__aiter__"):
+                async for item in items:
+                    await queue.put(item)
+            else:
+                for item in items:
+                    await queue.put(item)
+        except Exception as e:
+            await results.put((None, e))
+        for _ in range(worker_count):
+            await queue.put(_DONE)
+
+    async def work() -> None:
+        while True:
+            item = await queue.get()
+            if item is _DONE:
+                await results.put(_DONE)
+                return
+            async with limiter.slot():
+                started = time.monotonic()
+                try:
+                    result = await worker(item)
+                except Exception as e:
+                    await limiter.record(time.monotonic() - started, success=False)
+                    await results.put((item, e))
+                    continue
+                failed = bool(is_error and is_error(result))
+                if failed or is_measured is None or is_measured(result):
+                    await limiter.record(time.monotonic() - started, success=not failed)
+            await results.put((item, result))
+
+    feeder = asyncio.create_task(feed())
+    workers = [asyncio.create_task(work()) for _ in range(worker_count)]
+    try:
+        remaining = worker_count
+        while remaining:
+            entry = await results.get()
+            if entry is _DONE:
+                remaining -= 1
+                continue
+            item, result = entry
+            if isinstance(result, Exception):
+                raise result
+            yield item, result
+        await feeder
+    finally:
+        for task in [feeder, *workers]:
+            task.cancel()
+        await asyncio.gather(feeder, *workers, return_exceptions=True)
@@ -1,7 +1,7 @@
 # backend/schemas.py
 
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional
 
 class TransactionDescription(BaseModel):
     """
@@ -15,4 +15,77 @@ class CategorizationResponse(BaseModel):
     """
     marchand_probable: str
     categorie_suggeree: str
-    ville: Optional[str] = None
\ No newline at end of file
+    ville: Optional[str] = None
+
+class MerchantRule(BaseModel):
+    """
+    A user-editable rule mapping a libellé pattern to a merchant, a category and a city.
+    """
+    motif: str
+    marchand: str
+    categorie: str
+    ville: Optional[str] = None
+
+class JobSubmission(BaseModel):
+    """
+    Pydantic model for the request payload of the job submission endpoint.
+    """
+    transactions: List[dict]
+
+class JobStatus(BaseModel):
+    """
+    Pydantic model describing the state of a background analysis job.
+    """
+    job_id: str
+    status: str
+    input_count: int
+    processed_count: int
+    last_seq: int
+    parsing_complete: bool
+    progress_percent: Optional[int] = None
+    error: Optional[str] = None
+    created_at: float
+    updated_at: float
+
+class JobResults(BaseModel):
+    """
+    Pydantic model for a page of enriched results of a background analysis job.
+    """
+    job_id: str
+    status: str
+    last_seq: int
+    results: List[dict]
+
+class SpendAggregate(BaseModel):
+    """
+    Pydantic model for the totals of one group (category, merchant or month) of transactions.
+    """
+    cle: str
+    depenses: float
+    revenus: float
+    net: float
+    nombre: int
+
+class BalancePoint(BaseModel):
+    """
+    Pydantic model for the end-of-day running balance of an account.
+    """
+    account_id: str
+    date: str
+    solde: float
+
+class RecurringPayment(BaseModel):
+    """
+    Pydantic model for a detected recurring payment (subscription, rent, insurance...).
+    """
+    account_id: str
+    cle: str
+    marchand: Optional[str] = None
+    categorie: Optional[str] = None
+    ville: Optional[str] = None
+    cadence: str
+    montant_moyen: float
+    occurrences: int
+    premiere_date: str
+    derniere_date: str
+    prochaine_date: str
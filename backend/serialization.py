@@ -0,0 +1,32 @@
+# backend/serialization.py
+
+from typing import Any
+
+import orjson
+from fastapi.responses import JSONResponse
+
+from .transactions import Transaction
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, Transaction):
+        return value.to_dict()
+    raise TypeError(f"Type non sérialisable en JSON : {type(value).__name__}")
+
+
+def dumps(content: Any) -> bytes:
+    """
+    Sérialise en JSON avec orjson. Les transactions sont converties au format de
+    l'API (`Transaction.to_dict()`) au moment de l'écriture, sans copie préalable.
+    """
+    return orjson.dumps(content, default=_default, option=orjson.OPT_PASSTHROUGH_DATACLASS)
+
+
+loads = orjson.loads
+
+
+class TransactionsJSONResponse(JSONResponse):
+    """Réponse JSON sérialisée par orjson, pour les routes qui renvoient des transactions."""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -0,0 +1,358 @@
+# backend/storage.py
+
+import base64
+import datetime
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from .schemas import CategorizationResponse
+from .transactions import Transaction, intern
+
+logger = logging.getLogger(__name__)
+
+DB_PATH = os.getenv("REVELIO_DB_PATH", "revelio.sqlite3")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS transactions (
+    id INTEGER PRIMARY KEY,
+    account_id TEXT NOT NULL,
+    fitid TEXT NOT NULL,
+    date TEXT NOT NULL,
+    amount_cents INTEGER NOT NULL,
+    description TEXT,
+    marchand_probable TEXT,
+    categorie_suggeree TEXT,
+    ville TEXT,
+    imported_at REAL NOT NULL,
+    enriched_at REAL,
+    prompt_fingerprint TEXT,
+    UNIQUE (account_id, fitid)
+);
+CREATE INDEX IF NOT EXISTS idx_transactions_fitid ON transactions(fitid);
+CREATE INDEX IF NOT EXISTS idx_transactions_account_date ON transactions(account_id, date);
+CREATE INDEX IF NOT EXISTS idx_transactions_date ON transactions(date);
+CREATE INDEX IF NOT EXISTS idx_transactions_category ON transactions(categorie_suggeree);
+CREATE INDEX IF NOT EXISTS idx_transactions_enriched_at ON transactions(enriched_at);
+CREATE INDEX IF NOT EXISTS idx_transactions_amount ON transactions(amount_cents);
+CREATE INDEX IF NOT EXISTS idx_transactions_ville ON transactions(ville COLLATE NOCASE);
+"""
+
+# Index plein texte (libellé et marchand), tenu à jour par des triggers.
+# remove_diacritics : « cafe » trouve « CAFÉ » ; prefix : recherche par début de mot rapide.
+_FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS transactions_fts USING fts5(
+    description, marchand_probable,
+    content='transactions', content_rowid='id',
+    tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+);
+CREATE TRIGGER IF NOT EXISTS transactions_fts_insert AFTER INSERT ON transactions BEGIN
+    INSERT INTO transactions_fts (rowid, description, marchand_probable)
+    VALUES (new.id, new.description, new.marchand_probable);
+END;
+CREATE TRIGGER IF NOT EXISTS transactions_fts_delete AFTER DELETE ON transactions BEGIN
+    INSERT INTO transactions_fts (transactions_fts, rowid, description, marchand_probable)
+    VALUES ('delete', old.id, old.description, old.marchand_probable);
+END;
+CREATE TRIGGER IF NOT EXISTS transactions_fts_update AFTER UPDATE OF description, marchand_probable ON transactions
+BEGIN
+    INSERT INTO transactions_fts (transactions_fts, rowid, description, marchand_probable)
+    VALUES ('delete', old.id, old.description, old.marchand_probable);
+    INSERT INTO transactions_fts (rowid, description, marchand_probable)
+    VALUES (new.id, new.description, new.marchand_probable);
+END;
+"""
+
+SEARCH_COLUMNS = ("id, account_id, fitid, date, amount_cents, description, "
+                  "marchand_probable, categorie_suggeree, ville")
+
+_WORD_RE = re.compile(r"\w+")
+
+
+def transaction_key(transaction: Transaction) -> Tuple[str, str]:
+    """
+    Identifiant (compte, FITID) d'une transaction. Un FITID absent est remplacé par
+    une empreinte de la date, du montant et du libellé, et de son rang parmi les
+    transactions identiques du même envoi : deux achats identiques le même jour
+    restent deux transactions.
+    """
+    account_id = transaction.account_id or ""
+    fitid = transaction.fitid
+    if not fitid:
+        day = transaction.date.isoformat() if transaction.date else None
+        raw = f"{day}|{transaction.amount}|{transaction.description}"
+        if transaction.occurrence:
+            raw += f"|{transaction.occurrence}"
+        fitid = "sha1:" + hashlib.sha1(raw.encode("utf-8")).hexdigest()
+    return account_id, fitid
+
+
+class TransactionStore:
+    """
+    Stockage local (SQLite) des transactions parsées et enrichies.
+
+    Une transaction est identifiée par son compte et son FITID : réimporter un export
+    qui chevauche un import précédent n'insère que les transactions nouvelles.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._add_missing_columns()
+        self.full_text = self._create_full_text_index()
+        self._conn.commit()
+
+    def _add_missing_columns(self) -> None:
+        # Bases antérieures à l'empreinte du prompt : leurs enrichissements n'en ont pas
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(transactions)")}
+        if "prompt_fingerprint" not in columns:
+            self._conn.execute("ALTER TABLE transactions ADD COLUMN prompt_fingerprint TEXT")
+
+    def _create_full_text_index(self) -> bool:
+        """
+        Crée l'index plein texte ; les transactions d'une base antérieure y sont ajoutées.
+        Sans FTS5 dans SQLite, la recherche textuelle se replie sur LIKE.
+        """
+        existed = self._conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'transactions_fts'"
+        ).fetchone() is not None
+        try:
+            self._conn.executescript(_FTS_SCHEMA)
+        except sqlite3.OperationalError as e:
+            logger.warning(f"Index plein texte indisponible ({repr(e)}), recherche par LIKE.")
+            return False
+        if not existed:
+            self._conn.execute("INSERT INTO transactions_fts (transactions_fts) VALUES ('rebuild')")
+        return True
+
+    def import_transactions(self, transactions: List[Transaction],
+                            fingerprint: Optional[str] = None) -> List[Optional[CategorizationResponse]]:
+        """
+        Enregistre les transactions inconnues et retourne, pour chaque transaction, son
+        enrichissement déjà stocké (None si elle est nouvelle ou pas encore enrichie).
+        Avec `fingerprint`, un enrichissement obtenu sous un autre modèle ou prompt est
+        ignoré (None), comme une entrée du cache.
+        L'attribut `nouvelle` de chaque transaction indique si elle vient d'être insérée.
+        """
+        now = time.time()
+        results: List[Optional[CategorizationResponse]] = []
+        with self._lock:
+            for transaction in transactions:
+                account_id, fitid = transaction_key(transaction)
+                inserted = self._conn.execute(
+                    "INSERT OR IGNORE INTO transactions "
+                    "(account_id, fitid, date, amount_cents, description, imported_at) VALUES (?, ?, ?, ?, ?, ?)",
+                    (account_id, fitid, transaction.date.isoformat(), transaction.amount_cents,
+                     transaction.description, now)
+                ).rowcount == 1
+                transaction.nouvelle = inserted
+                if inserted:
+                    results.append(None)
+                    continue
+                row = self._conn.execute(
+                    "SELECT marchand_probable, categorie_suggeree, ville FROM transactions "
+                    "WHERE account_id = ? AND fitid = ? AND enriched_at IS NOT NULL "
+                    "AND (? IS NULL OR prompt_fingerprint = ?)",
+                    (account_id, fitid, fingerprint, fingerprint)
+                ).fetchone()
+                results.append(CategorizationResponse(
+                    marchand_probable=intern(row[0]), categorie_suggeree=intern(row[1]), ville=intern(row[2])
+                ) if row else None)
+            self._conn.commit()
+        return results
+
+    def save_enrichment(self, transactions: List[Transaction], enrichments: List[CategorizationResponse],
+                        fingerprint: Optional[str] = None) -> None:
+        """Enregistre les enrichissements, avec l'empreinte du modèle et du prompt qui les a produits."""
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE transactions SET marchand_probable = ?, categorie_suggeree = ?, ville = ?, enriched_at = ?, "
+                "prompt_fingerprint = ? WHERE account_id = ? AND fitid = ?",
+                [(e.marchand_probable, e.categorie_suggeree, e.ville, now, fingerprint, *transaction_key(t))
+                 for t, e in zip(transactions, enrichments)]
+            )
+            self._conn.commit()
+
+    def changes_since(self, last_id: int, enriched_since: float) -> List[tuple]:
+        """
+        Lignes insérées après `last_id` ou enrichies depuis `enriched_since`, par id croissant :
+        (id, account_id, date, amount_cents, marchand_probable, categorie_suggeree, enriched_at).
+        """
+        with self._lock:
+            return self._conn.execute(
+                "SELECT id, account_id, date, amount_cents, marchand_probable, categorie_suggeree, enriched_at "
+                "FROM transactions WHERE id > ? OR enriched_at >= ? ORDER BY id",
+                (last_id, enriched_since)
+            ).fetchall()
+
+    def enriched_amounts(self) -> List[tuple]:
+        """(amount_cents, marchand_probable, categorie_suggeree) des transactions enrichies, par id croissant."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT amount_cents, marchand_probable, categorie_suggeree FROM transactions "
+                "WHERE enriched_at IS NOT NULL ORDER BY id"
+            ).fetchall()
+
+    def rows_by_account_and_date(self) -> List[tuple]:
+        """
+        (account_id, date, amount_cents, description, marchand_probable, categorie_suggeree, ville,
+        prompt_fingerprint), triées par compte puis date.
+        """
+        with self._lock:
+            return self._conn.execute(
+                "SELECT account_id, date, amount_cents, description, marchand_probable, categorie_suggeree, ville, "
+                "prompt_fingerprint FROM transactions ORDER BY account_id, date, id"
+            ).fetchall()
+
+    def search(self, text: Optional[str] = None, category: Optional[str] = None, city: Optional[str] = None,
+               account_id: Optional[str] = None, date_from: Optional[str] = None, date_to: Optional[str] = None,
+               min_amount_cents: Optional[int] = None, max_amount_cents: Optional[int] = None,
+               kind: Optional[str] = None, limit: int = 50,
+               cursor: Optional[str] = None) -> Tuple[List[Transaction], Optional[str]]:
+        """
+        Recherche dans l'historique, des transactions les plus récentes aux plus anciennes.
+
+        `text` cherche chaque mot (ou début de mot) dans le libellé et le marchand, via
+        l'index plein texte. Les bornes de montant portent sur la valeur absolue ; `kind`
+        ("debit" ou "credit") restreint aux dépenses ou aux revenus. Les autres filtres
+        s'appuient sur les index B-tree (date, montant, catégorie, ville).
+
+        La pagination est par curseur : la page suivante commence après la dernière
+        ligne retournée, quel que soit le nombre de pages déjà lues. Retourne
+        (transactions, curseur de la page suivante ou None). Lève ValueError si le
+        curseur, les dates ou `kind` sont invalides.
+        """
+        clauses: List[str] = []
+        params: List = []
+        words = _WORD_RE.findall(text or "")
+        if words and self.full_text:
+            clauses.append("id IN (SELECT rowid FROM transactions_fts WHERE transactions_fts MATCH ?)")
+            params.append(" ".join('"' + word + '"*' for word in words))
+        elif words:
+            for word in words:
+                clauses.append("(description LIKE ? OR marchand_probable LIKE ?)")
+                params += [f"%{word}%"] * 2
+        if category:
+            clauses.append("categorie_suggeree = ?")
+            params.append(category)
+        if city:
+            clauses.append("ville = ? COLLATE NOCASE")
+            params.append(city)
+        if account_id is not None:
+            clauses.append("account_id = ?")
+            params.append(account_id)
+        if date_from:
+            clauses.append("date >= ?")
+            params.append(datetime.date.fromisoformat(date_from).isoformat())
+        if date_to:
+            clauses.append("date <= ?")
+            params.append(datetime.date.fromisoformat(date_to).isoformat())
+        self._amount_clauses(clauses, params, min_amount_cents, max_amount_cents, kind)
+        if cursor:
+            day, last_id = _decode_cursor(cursor)
+            clauses.append("(date, id) < (?, ?)")
+            params += [day, last_id]
+
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {SEARCH_COLUMNS} FROM transactions{where} ORDER BY date DESC, id DESC LIMIT ?",
+                (*params, limit + 1)
+            ).fetchall()
+        next_cursor = _encode_cursor(rows[limit - 1][3], rows[limit - 1][0]) if len(rows) > limit else None
+        return [_row_to_transaction(row) for row in rows[:limit]], next_cursor
+
+    @staticmethod
+    def _amount_clauses(clauses: List[str], params: List, low: Optional[int], high: Optional[int],
+                        kind: Optional[str]) -> None:
+        """
+        Traduit les bornes sur la valeur absolue en plages de `amount_cents` signés
+        (dépenses négatives, revenus positifs), chacune utilisable par l'index.
+        """
+        if kind not in (None, "debit", "credit"):
+            raise ValueError(f"Type de transaction inconnu : {kind!r} (attendu : debit ou credit)")
+        if kind is None and low is None and high is None:
+            return
+        floor = low or 0
+        if kind is not None:
+            floor = max(floor, 1)
+        ranges = []
+        if kind in (None, "credit"):
+            ranges.append((floor, high))
+        if kind in (None, "debit"):
+            ranges.append((-high if high is not None else None, -floor))
+        parts = []
+        for lower, upper in ranges:
+            bounds = []
+            if lower is not None:
+                bounds.append("amount_cents >= ?")
+                params.append(lower)
+            if upper is not None:
+                bounds.append("amount_cents <= ?")
+                params.append(upper)
+            parts.append(" AND ".join(bounds))
+        clauses.append("(" + " OR ".join(f"({part})" for part in parts) + ")")
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM transactions").fetchone()[0]
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            total, enriched = self._conn.execute(
+                "SELECT COUNT(*), COUNT(enriched_at) FROM transactions"
+            ).fetchone()
+        return {"transactions": total, "enriched": enriched}
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def _encode_cursor(day: str, row_id: int) -> str:
+    return base64.urlsafe_b64encode(f"{day}|{row_id}".encode("ascii")).decode("ascii")
+
+
+def _decode_cursor(cursor: str) -> Tuple[str, int]:
+    try:
+        day, row_id = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("ascii").split("|")
+        return datetime.date.fromisoformat(day).isoformat(), int(row_id)
+    except (ValueError, UnicodeError) as e:
+        raise ValueError(f"Curseur invalide : {cursor!r}") from e
+
+
+def _row_to_transaction(row: tuple) -> Transaction:
+    _, account_id, fitid, day, amount_cents, description, merchant, category, city = row
+    return Transaction(
+        date=datetime.date.fromisoformat(day), amount_cents=amount_cents, description=description,
+        account_id=intern(account_id), fitid=fitid, marchand_probable=intern(merchant),
+        categorie_suggeree=intern(category), ville=intern(city),
+    )
+
+
+_store: Optional[TransactionStore] = None
+
+
+def get_store() -> TransactionStore:
+    """Retourne le stockage des transactions, ouvert à la première utilisation."""
+    global _store
+    if _store is None:
+        _store = TransactionStore(DB_PATH)
+    return _store
+
+
+def close_store() -> None:
+    global _store
+    if _store is not None:
+        _store.close()
+        _store = None
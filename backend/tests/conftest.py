@@ -0,0 +1,31 @@
+import pytest
+
+from backend import ai_service, analytics, anomaly, jobs, main, recurring, rules, storage
+
+
+@pytest.fixture(autouse=True)
+def isolated_cache(tmp_path, monkeypatch):
+    """Point the categorization cache and the transaction store to temporary databases for each test."""
+    monkeypatch.setattr(ai_service, "CACHE_DB_PATH", str(tmp_path / "cache.sqlite3"))
+    monkeypatch.setattr(ai_service, "_cache", None)
+    monkeypatch.setattr(ai_service, "_router", None)
+    monkeypatch.setattr(ai_service, "VECTOR_INDEX_PATH", str(tmp_path / "vectors.sqlite3"))
+    monkeypatch.setattr(ai_service, "_vector_index", None)
+    # Aucune règle marchand par défaut : chaque test choisit les siennes
+    monkeypatch.setattr(rules, "_engine", rules.RulesEngine([]))
+    monkeypatch.setattr(rules, "USER_RULES_PATH", str(tmp_path / "rules.json"))
+    monkeypatch.setattr(storage, "DB_PATH", str(tmp_path / "revelio.sqlite3"))
+    monkeypatch.setattr(storage, "_store", None)
+    monkeypatch.setattr(jobs, "_job_store", None)
+    monkeypatch.setattr(analytics, "_columns", None)
+    monkeypatch.setattr(anomaly, "_detector", None)
+    monkeypatch.setattr(recurring, "_index", None)
+    # Pas de préchauffage en tâche de fond pendant les tests (voir test_warmup.py)
+    monkeypatch.setattr(main, "WARMUP_ENABLED", False)
+    yield
+    if ai_service._cache is not None:
+        ai_service._cache.close()
+    if ai_service._vector_index is not None:
+        ai_service._vector_index.close()
+    storage.close_store()
+    jobs.close_job_store()
@@ -1,5 +1,6 @@
 import pytest
 import respx
+import httpx
 from httpx import Response, RequestError
 import json
 from backend.ai_service import categorize_transaction
@@ -71,4 +72,164 @@ async def test_categorize_transaction_network_error():
     assert isinstance(result, CategorizationResponse)
     assert result.marchand_probable == "Unknown"
     assert result.categorie_suggeree == "Autre"
-    assert result.ville is None
\ No newline at end of file
+    assert result.ville is None
+
+@respx.mock
+async def test_categorize_transaction_reuses_shared_client():
+    """
+    Tests that the application-scoped client is reused across calls once started.
+    """
+    from backend import ai_service
+
+    mock_api_response = {"response": json.dumps({"marchand_probable": "Netflix", "categorie_suggeree": "Abonnements"})}
+    respx.post(ai_service.OLLAMA_API_URL).mock(return_value=Response(200, json=mock_api_response))
+
+    client = await ai_service.start_http_client()
+    try:
+        result = await categorize_transaction("PRLV SEPA NETFLIX")
+        assert result.marchand_probable == "Netflix"
+        assert ai_service._http_client is client
+        assert await ai_service.start_http_client() is client
+    finally:
+        await ai_service.close_http_client()
+    assert ai_service._http_client is None
+
+@respx.mock
+async def test_categorize_batch_single_request_with_dedup():
+    """
+    Tests that duplicate descriptions are sent once and that a batch is one Ollama request.
+    """
+    from backend import ai_service
+    from backend.ai_service import categorize_batch
+
+    batch_answer = {"resultats": [
+        {"marchand_probable": "Carrefour", "categorie_suggeree": "Alimentation", "ville": None},
+        {"marchand_probable": "Netflix", "categorie_suggeree": "Abonnements", "ville": None},
+    ]}
+    route = respx.post(ai_service.OLLAMA_API_URL).mock(
+        return_value=Response(200, json={"response": json.dumps(batch_answer)})
+    )
+
+    results = await categorize_batch(["CB CARREFOUR 12/03", "PRLV SEPA NETFLIX", "CB CARREFOUR 19/03"])
+
+    assert route.call_count == 1
+    assert "CB CARREFOUR 19/03" not in json.loads(route.calls[0].request.content)["prompt"]
+    assert [r.marchand_probable for r in results] == ["Carrefour", "Netflix", "Carrefour"]
+
+@respx.mock
+async def test_categorize_batch_falls_back_to_single_calls_on_wrong_length():
+    """
+    Tests that a batch answer with the wrong number of items triggers per-item requests.
+    """
+    from backend import ai_service
+    from backend.ai_service import categorize_batch
+
+    single = {"marchand_probable": "Shop", "categorie_suggeree": "Autre", "ville": None}
+    route = respx.post(ai_service.OLLAMA_API_URL).mock(side_effect=[
+        Response(200, json={"response": json.dumps({"resultats": [single]})}),
+        Response(200, json={"response": json.dumps(single)}),
+        Response(200, json={"response": json.dumps(single)}),
+    ])
+
+    results = await categorize_batch(["CB SHOP A", "CB SHOP B"])
+
+    assert route.call_count == 3
+    assert all(r.marchand_probable == "Shop" for r in results)
+
+@respx.mock
+async def test_categorize_batch_does_not_retry_items_when_ollama_is_unreachable():
+    """
+    Tests that a network failure on the batch request returns fallbacks without per-item requests.
+    """
+    from backend import ai_service
+    from backend.ai_service import categorize_batch, is_fallback
+
+    route = respx.post(ai_service.OLLAMA_API_URL).mock(side_effect=RequestError("Simulated network error", request=None))
+
+    results = await categorize_batch(["CB SHOP A", "CB SHOP B", "CB SHOP C"])
+
+    assert route.call_count == 1
+    assert len(results) == 3 and all(is_fallback(r) for r in results)
+
+class _TokenStream(httpx.AsyncByteStream):
+    """Streamed Ollama answer that records how many lines were actually read."""
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.sent = 0
+
+    async def __aiter__(self):
+        for token in self.tokens:
+            self.sent += 1
+            yield (json.dumps({"response": token, "done": False}) + "\n").encode()
+        yield (json.dumps({"response": "", "done": True}) + "\n").encode()
+
+@respx.mock
+async def test_generate_json_stops_reading_after_complete_object():
+    """
+    Tests that a streamed generation is cut as soon as the JSON object is complete,
+    including when a string value contains braces.
+    """
+    from backend import ai_service
+
+    stream = _TokenStream(['{"marchand_probable": "Le {Bar}",', ' "categorie_suggeree": "Loisirs"}', "\n", " ", " ", "\n"])
+    route = respx.post(ai_service.OLLAMA_API_URL).mock(return_value=Response(200, stream=stream))
+
+    result = await categorize_transaction("CB LE BAR")
+
+    assert result.marchand_probable == "Le {Bar}"
+    assert stream.sent == 2
+    options = json.loads(route.calls[0].request.content)["options"]
+    assert options["num_predict"] == ai_service.LLM_NUM_PREDICT
+    assert options["stop"]
+
+@respx.mock
+async def test_categorize_batch_reuses_nearest_neighbour(monkeypatch):
+    """
+    Tests that with embeddings enabled, a close variant of a categorized description
+    reuses its categorization instead of a generate call.
+    """
+    from backend import ai_service
+    from backend.ai_service import categorize_batch
+
+    monkeypatch.setattr(ai_service, "EMBEDDINGS_ENABLED", True)
+    embed = respx.post("http://localhost:11434/api/embed").mock(side_effect=[
+        Response(200, json={"embeddings": [[1.0, 0.0, 0.0]]}),
+        Response(200, json={"embeddings": [[0.99, 0.05, 0.0], [0.0, 1.0, 0.0]]}),
+    ])
+    single = {"marchand_probable": "Intermarché", "categorie_suggeree": "Alimentation", "ville": None}
+    generate = respx.post(ai_service.OLLAMA_API_URL).mock(side_effect=[
+        Response(200, json={"response": json.dumps(single)}),
+        Response(200, json={"response": json.dumps({**single, "marchand_probable": "Fnac", "categorie_suggeree": "Loisirs"})}),
+    ])
+
+    first = await categorize_batch(["CB INTERMARCHE 1234"])
+    second = await categorize_batch(["CB INTERMARCHE SUPER 987", "CB FNAC"])
+
+    assert first[0].marchand_probable == "Intermarché"
+    assert [r.marchand_probable for r in second] == ["Intermarché", "Fnac"]
+    assert embed.call_count == 2
+    assert generate.call_count == 2
+    assert len(ai_service.get_vector_index()) == 2
+
+@respx.mock
+async def test_concurrent_identical_descriptions_share_one_request():
+    """
+    Tests that concurrent categorizations of the same normalized description are coalesced.
+    """
+    import asyncio
+    from backend import ai_service
+
+    answer = {"marchand_probable": "Carrefour", "categorie_suggeree": "Alimentation", "ville": None}
+
+    async def slow_answer(request):
+        await asyncio.sleep(0.05)
+        return Response(200, json={"response": json.dumps(answer)})
+
+    route = respx.post(ai_service.OLLAMA_API_URL).mock(side_effect=slow_answer)
+
+    results = await asyncio.gather(*(categorize_transaction(f"CB CARREFOUR {day:02d}/03") for day in range(1, 6)))
+
+    assert route.call_count == 1
+    assert all(result.marchand_probable == "Carrefour" for result in results)
+    assert ai_service._in_flight == {}
@@ -0,0 +1,75 @@
+import pytest
+from fastapi.testclient import TestClient
+from backend.analytics import TransactionColumns
+from backend.main import app
+from backend.schemas import CategorizationResponse
+from backend.storage import TransactionStore, get_store
+from backend.transactions import Transaction
+
+NETFLIX = CategorizationResponse(marchand_probable="Netflix", categorie_suggeree="Abonnements", ville=None)
+CARREFOUR = CategorizationResponse(marchand_probable="Carrefour", categorie_suggeree="Alimentation", ville=None)
+
+def make_transaction(fitid, date, amount, account_id="111"):
+    return Transaction.from_dict({"date": date, "amount": amount, "description": f"TRN {fitid}",
+                                  "account_id": account_id, "fitid": fitid})
+
+@pytest.fixture
+def store(tmp_path):
+    store = TransactionStore(str(tmp_path / "db.sqlite3"))
+    transactions = [
+        make_transaction("A1", "2024-01-05", -13.49),
+        make_transaction("A2", "2024-01-05", -40.10),
+        make_transaction("A3", "2024-02-01", 2000.00),
+        make_transaction("A4", "2024-02-03", -25.00),
+        make_transaction("B1", "2024-01-10", -5.00, account_id="222"),
+    ]
+    store.import_transactions(transactions)
+    store.save_enrichment([transactions[0]], [NETFLIX])
+    store.save_enrichment([transactions[1], transactions[3]], [CARREFOUR, CARREFOUR])
+    yield store
+    store.close()
+
+def test_aggregates_by_category_merchant_and_month(store):
+    columns = TransactionColumns(store)
+    columns.refresh()
+
+    categories = {row["cle"]: row for row in columns.by_category()}
+    assert categories["Alimentation"]["depenses"] == 65.10
+    assert categories["Alimentation"]["nombre"] == 2
+    assert categories["Non catégorisé"]["revenus"] == 2000.0
+    assert columns.by_merchant(limit=1)[0]["cle"] == "Carrefour"
+    assert [(row["cle"], row["net"]) for row in columns.by_month()] == [("2024-01", -58.59), ("2024-02", 1975.0)]
+    assert [row["cle"] for row in columns.by_category(date_from="2024-02-01", account_id="111")] == \
+        ["Alimentation", "Non catégorisé"]
+
+def test_running_balance_per_account_end_of_day(store):
+    columns = TransactionColumns(store)
+    columns.refresh()
+    assert columns.running_balance() == [
+        {"account_id": "111", "date": "2024-01-05", "solde": -53.59},
+        {"account_id": "111", "date": "2024-02-01", "solde": 1946.41},
+        {"account_id": "111", "date": "2024-02-03", "solde": 1921.41},
+        {"account_id": "222", "date": "2024-01-10", "solde": -5.0},
+    ]
+
+def test_refresh_applies_new_imports_and_enrichments_incrementally(store):
+    columns = TransactionColumns(store)
+    columns.refresh()
+    late = make_transaction("A5", "2024-03-01", -9.99)
+    store.import_transactions([late])
+    store.save_enrichment([make_transaction("B1", "2024-01-10", -5.00, account_id="222")], [NETFLIX])
+    columns.refresh()
+
+    assert len(columns) == 6
+    categories = {row["cle"]: row for row in columns.by_category()}
+    assert categories["Abonnements"]["depenses"] == 18.49
+    assert categories["Non catégorisé"]["nombre"] == 2
+
+def test_analytics_endpoints():
+    get_store().import_transactions([make_transaction("A1", "2024-01-05", -13.49)])
+    with TestClient(app) as client:
+        response = client.get("/analytics/months")
+        assert response.status_code == 200
+        assert response.json()[0]["cle"] == "2024-01"
+        assert client.get("/analytics/balance").json()[0]["solde"] == -13.49
+        assert client.get("/analytics/categories", params={"date_from": "janvier"}).status_code == 400
@@ -0,0 +1,121 @@
+import random
+import statistics
+import pytest
+from unittest.mock import AsyncMock, patch
+from fastapi.testclient import TestClient
+from backend.anomaly import AnomalyDetector, RunningStats, get_anomaly_detector
+from backend.main import app
+from backend.pipeline import flag_anomalies
+from backend.schemas import CategorizationResponse
+from backend.storage import get_store
+from backend.transactions import Transaction
+
+def spend(amount, merchant="Carrefour", category="Alimentation"):
+    return Transaction(date=None, amount_cents=-round(amount * 100), description=f"CB {merchant.upper()}",
+                       marchand_probable=merchant, categorie_suggeree=category)
+
+def test_running_stats_match_exact_values():
+    rng = random.Random(7)
+    values = [rng.lognormvariate(3, 0.6) for _ in range(5000)]
+    stats = RunningStats()
+    for value in values:
+        stats.add(value)
+
+    assert stats.mean == pytest.approx(statistics.mean(values))
+    assert stats.std == pytest.approx(statistics.stdev(values))
+    exact = sorted(values)[int(0.95 * (len(values) - 1))]
+    assert stats.quantile(0.95) == pytest.approx(exact, rel=0.03)
+
+def test_detector_flags_outlier_against_merchant_history():
+    detector = AnomalyDetector(min_history=5)
+    for amount in [52.3, 48.1, 61.0, 55.4, 47.9, 58.2, 50.0]:
+        detector.observe(spend(amount))
+
+    normal = detector.check(spend(63.0))
+    assert not normal["est_anomalie"]
+    assert normal["reference"] == "marchand"
+
+    outlier = detector.check(spend(640.0))
+    assert outlier["est_anomalie"]
+    assert outlier["historique"] == 7
+    # Les revenus ne sont jamais signalés
+    assert not detector.check(Transaction(date=None, amount_cents=500000, marchand_probable="Carrefour"))["est_anomalie"]
+
+def test_detector_uses_category_until_merchant_has_history():
+    detector = AnomalyDetector(min_history=3)
+    for merchant, amount in [("Lidl", 30.0), ("Auchan", 35.0), ("Leclerc", 32.0), ("Lidl", 28.0)]:
+        detector.observe(spend(amount, merchant=merchant))
+    verdict = detector.check(spend(400.0, merchant="Monoprix"))
+    assert verdict["reference"] == "categorie"
+    assert verdict["est_anomalie"]
+
+def test_small_change_of_a_fixed_amount_is_not_flagged():
+    detector = AnomalyDetector(min_history=3)
+    for _ in range(6):
+        detector.observe(spend(13.49, merchant="Netflix", category="Abonnements"))
+    assert not detector.check(spend(13.99, merchant="Netflix", category="Abonnements"))["est_anomalie"]
+
+def test_detector_is_built_from_stored_enrichments():
+    store = get_store()
+    transactions = [Transaction.from_dict({"date": "2024-01-0%d" % i, "amount": -50.0 - i, "description": "CB CARREFOUR",
+                                           "account_id": "111", "fitid": f"F{i}"}) for i in range(1, 7)]
+    store.import_transactions(transactions)
+    carrefour = CategorizationResponse(marchand_probable="Carrefour", categorie_suggeree="Alimentation", ville=None)
+    store.save_enrichment(transactions, [carrefour] * len(transactions))
+
+    assert get_anomaly_detector().check(spend(900.0))["historique"] == 6
+
+@pytest.mark.asyncio
+async def test_flag_anomalies_asks_llm_only_for_flagged_transactions():
+    detector = get_anomaly_detector()
+    for amount in [20.0, 22.0, 19.5, 21.0, 20.5, 23.0]:
+        detector.observe(spend(amount))
+    lot = [spend(21.5), spend(480.0)]
+
+    with patch("backend.pipeline.explain_anomaly", new_callable=AsyncMock, return_value="Montant inhabituel.") as explain:
+        await flag_anomalies(lot)
+
+    assert explain.await_count == 1
+    assert lot[0].anomalie is None
+    assert lot[1].anomalie["justification"] == "Montant inhabituel."
+
+@pytest.mark.asyncio
+async def test_recategorization_does_not_count_stored_rows_twice():
+    from backend.pipeline import enrich_lots
+    from backend.scheduler import AdaptiveLimiter
+
+    store = get_store()
+    transactions = [Transaction.from_dict({"date": "2024-01-0%d" % i, "amount": -50.0 - i, "description": "CB CARREFOUR",
+                                           "account_id": "111", "fitid": f"F{i}"}) for i in range(1, 7)]
+    store.import_transactions(transactions)
+    carrefour = CategorizationResponse(marchand_probable="Carrefour", categorie_suggeree="Alimentation", ville=None)
+    store.save_enrichment(transactions, [carrefour] * len(transactions))
+    detector = get_anomaly_detector()
+
+    async def lots():
+        yield [Transaction.from_dict(t.to_dict()) for t in transactions]
+        yield [Transaction.from_dict({"date": "2024-01-09", "amount": -55.0, "description": "CB CARREFOUR",
+                                      "account_id": "111", "fitid": "F9"})]
+
+    with patch("backend.pipeline.categorize_batch", new_callable=AsyncMock) as categorize:
+        categorize.side_effect = lambda descriptions, **options: [carrefour for _ in descriptions]
+        async for _ in enrich_lots(lots(), AdaptiveLimiter(), reuse_stored=False):
+            pass
+
+    # Seule la transaction nouvelle s'ajoute à l'historique
+    assert detector.check(spend(900.0))["historique"] == 7
+
+def test_analyze_anomaly_endpoint_uses_server_side_history():
+    detector = get_anomaly_detector()
+    for amount in [40.0, 42.0, 38.0, 41.0, 39.0]:
+        detector.observe(spend(amount))
+
+    with patch("backend.ai_service._generate_json", new_callable=AsyncMock, return_value=None):
+        with TestClient(app) as client:
+            response = client.post("/ai/analyze-anomaly", json={"transaction_actuelle": spend(950.0).to_dict()})
+            assert client.post("/ai/analyze-anomaly", json={"transaction_actuelle": {"description": "x"}}).status_code == 400
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["est_anomalie"] is True
+    assert "950.00" in body["justification"]
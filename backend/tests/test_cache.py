@@ -0,0 +1,63 @@
+import pytest
+import respx
+from httpx import Response
+import json
+from backend import ai_service
+from backend.cache import CategorizationCache
+from backend.normalization import normalize_description
+from backend.schemas import CategorizationResponse
+
+STARBUCKS = CategorizationResponse(marchand_probable="Starbucks", categorie_suggeree="Loisirs", ville="Paris")
+
+def test_normalize_description_strips_volatile_parts():
+    assert normalize_description("CB CARREFOUR 12/03") == "CB CARREFOUR"
+    assert normalize_description("CB CARREFOUR 28/04/2024 CARTE X1234") == "CB CARREFOUR"
+    assert normalize_description("PRLV SEPA NETFLIX REF:ABC123XYZ") == "PRLV SEPA NETFLIX"
+    assert normalize_description("VIR 20240312AB99812 Café") == "VIR CAFE"
+    assert normalize_description("PRLV EDF NUM 99812 ECH/150324") == "PRLV EDF"
+    # Un mot-clé de référence suivi d'un nom sans chiffre fait partie du marchand
+    assert normalize_description("CB ID KIDS 12/03") == "CB ID KIDS"
+    assert normalize_description("CB NO LIMIT BAR") == "CB NO LIMIT BAR"
+    assert normalize_description("CB ID KIDS 12/03") != normalize_description("CB ID SPORT 12/03")
+
+def test_cache_hit_miss_and_ttl(tmp_path):
+    cache = CategorizationCache(str(tmp_path / "c.sqlite3"), "fp", ttl_seconds=60)
+    assert cache.get("CB STARBUCKS 01/02") is None
+    cache.set("CB STARBUCKS 01/02", STARBUCKS)
+    assert cache.get("CB STARBUCKS 15/03") == STARBUCKS
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+    cache.ttl_seconds = -1
+    assert cache.get("CB STARBUCKS 15/03") is None
+    assert cache.stats()["entries"] == 0
+
+def test_cache_lru_eviction(tmp_path):
+    cache = CategorizationCache(str(tmp_path / "c.sqlite3"), "fp", max_entries=2)
+    cache.set("A", STARBUCKS)
+    cache.set("B", STARBUCKS)
+    assert cache.get("A") is not None  # A devient la plus récemment utilisée
+    cache.set("C", STARBUCKS)
+    assert cache.get("B") is None
+    assert cache.get("A") is not None
+    assert cache.get("C") is not None
+
+def test_cache_invalidated_when_fingerprint_changes(tmp_path):
+    path = str(tmp_path / "c.sqlite3")
+    cache = CategorizationCache(path, "model-a")
+    cache.set("CB STARBUCKS", STARBUCKS)
+    cache.close()
+    reopened = CategorizationCache(path, "model-b")
+    assert reopened.get("CB STARBUCKS") is None
+    assert reopened.stats()["entries"] == 0
+
+@pytest.mark.asyncio
+@respx.mock
+async def test_categorize_transaction_uses_cache():
+    route = respx.post(ai_service.OLLAMA_API_URL).mock(
+        return_value=Response(200, json={"response": json.dumps(STARBUCKS.model_dump())})
+    )
+    first = await ai_service.categorize_transaction("CB STARBUCKS 01/02")
+    second = await ai_service.categorize_transaction("CB STARBUCKS 19/02")
+    assert first == second == STARBUCKS
+    assert route.call_count == 1
@@ -0,0 +1,117 @@
+import csv
+import json
+import pytest
+from unittest.mock import AsyncMock, patch
+from backend import ai_service, cli
+from backend.schemas import CategorizationResponse
+from backend.storage import get_store
+
+NETFLIX = CategorizationResponse(marchand_probable="Netflix", categorie_suggeree="Abonnements", ville=None)
+FALLBACK = CategorizationResponse(marchand_probable="Unknown", categorie_suggeree="Autre", ville=None)
+
+def ofx(account_id, *transactions):
+    lines = "".join(f"<STMTTRN><TRNTYPE>DEBIT<DTPOSTED>{day}<TRNAMT>{amount}<FITID>{fitid}<NAME>{name}\n"
+                    for fitid, day, amount, name in transactions)
+    return (f"OFXHEADER:100\n<OFX><BANKMSGSRSV1><STMTTRNRS><STMTRS>"
+            f"<BANKACCTFROM><ACCTID>{account_id}</BANKACCTFROM><BANKTRANLIST>\n{lines}"
+            f"</BANKTRANLIST></STMTRS></STMTTRNRS></BANKMSGSRSV1></OFX>").encode("utf-8")
+
+@pytest.fixture
+def archive(tmp_path):
+    directory = tmp_path / "releves"
+    (directory / "2024").mkdir(parents=True)
+    (directory / "janvier.ofx").write_bytes(ofx("111", ("A1", "20240105", "-13,49", "PRLV NETFLIX"),
+                                                ("A2", "20240106", "-4,20", "CB BOULANGERIE")))
+    (directory / "2024" / "fevrier.QFX").write_bytes(ofx("111", ("A3", "20240205", "-13,49", "PRLV NETFLIX")))
+    (directory / "notes.txt").write_text("ignoré")
+    return directory
+
+def read_rows(path):
+    with open(path, encoding="utf-8", newline="") as f:
+        return list(csv.DictReader(f))
+
+def fake_categorize(descriptions):
+    return [NETFLIX for _ in descriptions]
+
+@pytest.mark.asyncio
+async def test_run_writes_csv_per_file_and_skips_finished_files(archive, tmp_path):
+    output = tmp_path / "sorties"
+    with patch('backend.pipeline.categorize_batch', new_callable=AsyncMock) as categorize:
+        categorize.side_effect = fake_categorize
+        summary = await cli.run(archive, output, concurrency=2)
+        assert summary == {"done": 2, "skipped": 0, "incomplete": 0, "failed": 0, "transactions": 3}
+
+        rows = read_rows(output / "janvier.ofx.csv")
+        assert sorted((row["fitid"], row["date"], row["amount"], row["categorie_suggeree"]) for row in rows) == [
+            ("A1", "2024-01-05", "-13.49", "Abonnements"), ("A2", "2024-01-06", "-4.2", "Abonnements")]
+        assert [row["fitid"] for row in read_rows(output / "2024" / "fevrier.QFX.csv")] == ["A3"]
+        manifest = json.loads((output / cli.MANIFEST_NAME).read_text())
+        assert manifest["2024/fevrier.QFX"]["output"] == "2024/fevrier.QFX.csv"
+        assert not list(output.rglob("*.part"))
+
+        # Seul le fichier modifié depuis l'exécution précédente est retraité
+        calls = categorize.call_count
+        (archive / "janvier.ofx").write_bytes(ofx("111", ("A1", "20240105", "-13,49", "PRLV NETFLIX"),
+                                                  ("A4", "20240107", "-8,00", "CB CINEMA")))
+        summary = await cli.run(archive, output)
+        assert (summary["done"], summary["skipped"]) == (1, 1)
+        assert [call.args for call in categorize.call_args_list[calls:]] == [(["CB CINEMA"],)]
+
+@pytest.mark.asyncio
+async def test_file_with_fallback_categorizations_is_retried(archive, tmp_path):
+    output = tmp_path / "sorties"
+    with patch('backend.pipeline.categorize_batch', new_callable=AsyncMock) as categorize:
+        categorize.side_effect = lambda descriptions: [FALLBACK for _ in descriptions]
+        summary = await cli.run(archive, output)
+        assert (summary["done"], summary["incomplete"]) == (0, 2)
+        assert (output / "janvier.ofx.csv").exists()
+        assert not (output / cli.MANIFEST_NAME).exists()
+
+        categorize.side_effect = fake_categorize
+        summary = await cli.run(archive, output)
+        assert (summary["done"], summary["incomplete"]) == (2, 0)
+    assert get_store().stats() == {"transactions": 3, "enriched": 3}
+
+@pytest.mark.asyncio
+async def test_recategorize_ignores_stored_categorizations(archive, tmp_path):
+    with patch('backend.pipeline.categorize_batch', new_callable=AsyncMock) as categorize:
+        categorize.side_effect = fake_categorize
+        await cli.run(archive, tmp_path / "avant")
+        calls = categorize.call_count
+
+        await cli.run(archive, tmp_path / "pareil")
+        assert categorize.call_count == calls
+
+        await cli.run(archive, tmp_path / "apres", recategorize=True)
+        sent = [d for call in categorize.call_args_list[calls:] for d in call.args[0]]
+        assert sorted(sent) == ["CB BOULANGERIE", "PRLV NETFLIX", "PRLV NETFLIX"]
+
+@pytest.mark.asyncio
+async def test_prompt_change_recategorizes_without_flag(archive, tmp_path, monkeypatch):
+    output = tmp_path / "sorties"
+    with patch('backend.pipeline.categorize_batch', new_callable=AsyncMock) as categorize:
+        categorize.side_effect = fake_categorize
+        await cli.run(archive, output)
+        calls = categorize.call_count
+
+        monkeypatch.setattr(ai_service, "LLM_MODEL", "autre-modele")
+        summary = await cli.run(archive, output)
+        assert (summary["done"], summary["skipped"]) == (2, 0)
+        sent = [d for call in categorize.call_args_list[calls:] for d in call.args[0]]
+        assert sorted(sent) == ["CB BOULANGERIE", "PRLV NETFLIX", "PRLV NETFLIX"]
+
+@pytest.mark.asyncio
+async def test_same_name_with_another_extension_gets_its_own_output(archive, tmp_path):
+    (archive / "janvier.qfx").write_bytes(ofx("222", ("B1", "20240110", "-9,99", "SPOTIFY")))
+    output = tmp_path / "sorties"
+    with patch('backend.pipeline.categorize_batch', new_callable=AsyncMock) as categorize:
+        categorize.side_effect = fake_categorize
+        summary = await cli.run(archive, output)
+
+    assert summary["done"] == 3
+    assert [row["fitid"] for row in read_rows(output / "janvier.qfx.csv")] == ["B1"]
+    assert len(read_rows(output / "janvier.ofx.csv")) == 2
+
+def test_main_rejects_missing_directory(tmp_path):
+    with pytest.raises(SystemExit):
+        cli.main([str(tmp_path / "absent"), "--output", str(tmp_path / "sorties")])
@@ -0,0 +1,141 @@
+import asyncio
+import time
+import json
+import pytest
+from dataclasses import replace
+from unittest.mock import patch
+from fastapi.testclient import TestClient
+from backend.jobs import JobManager, JobStore, get_job_store, COMPLETED, INTERRUPTED
+from backend.main import app
+from backend.pipeline import feed_ofx_chunks
+from backend.scheduler import AdaptiveLimiter
+from backend.schemas import CategorizationResponse
+from backend.transactions import Transaction
+
+def make_transactions(count):
+    return [{"date": "2024-01-05", "amount": -1.0, "description": f"CB SHOP {i}", "account_id": "1", "fitid": f"F{i}"}
+            for i in range(count)]
+
+async def fake_batch(descriptions):
+    return [CategorizationResponse(marchand_probable="Shop", categorie_suggeree="Autre", ville=None)
+            for _ in descriptions]
+
+def test_job_store_checkpoints_and_pending_inputs(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.sqlite3"))
+    job_id = store.create_job()
+    inputs = [Transaction.from_dict(t) for t in make_transactions(3)]
+    store.add_inputs(job_id, inputs)
+    assert [t.index for t in inputs] == [0, 1, 2]
+
+    assert store.checkpoint(job_id, [replace(inputs[1], marchand_probable="Shop")]) == 1
+    assert [t.index for t in store.pending_inputs(job_id)] == [0, 2]
+    assert store.checkpoint(job_id, [replace(inputs[0]), replace(inputs[2])]) == 3
+    assert [t["seq"] for t in store.results_since(job_id, 1)] == [2, 3]
+    assert store.get_job(job_id)["processed_count"] == 3
+
+def test_resume_replays_results_and_processes_only_pending():
+    transactions = make_transactions(3)
+    with patch('backend.pipeline.categorize_batch', side_effect=fake_batch):
+        with TestClient(app) as client:
+            with client.websocket_connect("/ws/analyze") as websocket:
+                websocket.send_text(json.dumps(transactions))
+                job_id = websocket.receive_json()["job_id"]
+                progress = websocket.receive_json()
+                assert progress["last_seq"] == 3
+                assert websocket.receive_json()["type"] == "complete"
+
+            # Simuler une coupure après le premier résultat : le client n'a reçu que seq=1,
+            # et la dernière transaction n'a pas encore été enrichie côté serveur.
+            job_store = get_job_store()
+            job_store._conn.execute("DELETE FROM job_results WHERE job_id = ? AND seq = 3", (job_id,))
+            job_store._conn.execute("UPDATE analysis_jobs SET processed_count = 2 WHERE id = ?", (job_id,))
+            job_store._conn.commit()
+
+            with client.websocket_connect("/ws/analyze") as websocket:
+                websocket.send_text(json.dumps({"type": "resume", "job_id": job_id, "last_seq": 1}))
+                assert websocket.receive_json() == {"type": "job", "job_id": job_id, "resumed": True}
+                replay = websocket.receive_json()
+                assert [t["seq"] for t in replay["data"]] == [2]
+                resumed = websocket.receive_json()
+                assert [t["index"] for t in resumed["data"]] == [2]
+                assert resumed["processed_count"] == 3
+                assert websocket.receive_json()["type"] == "complete"
+
+            assert job_store.get_job(job_id)["status"] == COMPLETED
+
+def test_resume_unknown_job_is_an_error():
+    with TestClient(app) as client, client.websocket_connect("/ws/analyze") as websocket:
+        websocket.send_text(json.dumps({"type": "resume", "job_id": "inconnu"}))
+        assert websocket.receive_json()["type"] == "error"
+
+def wait_for_status(client, job_id, status="completed"):
+    for _ in range(100):
+        job = client.get(f"/jobs/{job_id}").json()
+        if job["status"] == status:
+            return job
+        time.sleep(0.02)
+    raise AssertionError(f"job {job_id} is {job['status']}")
+
+def test_rest_submit_poll_and_fetch_results():
+    with patch('backend.pipeline.categorize_batch', side_effect=fake_batch):
+        with TestClient(app) as client:
+            response = client.post("/jobs", json={"transactions": make_transactions(5)})
+            assert response.status_code == 202
+            job_id = response.json()["job_id"]
+
+            job = wait_for_status(client, job_id)
+            assert job["processed_count"] == 5
+            assert job["progress_percent"] == 100
+
+            page = client.get(f"/jobs/{job_id}/results", params={"limit": 3}).json()
+            assert [t["seq"] for t in page["results"]] == [1, 2, 3]
+            page = client.get(f"/jobs/{job_id}/results", params={"after_seq": page["last_seq"]}).json()
+            assert [t["seq"] for t in page["results"]] == [4, 5]
+            assert all(t["marchand_probable"] == "Shop" for t in page["results"])
+
+def test_job_keeps_running_after_websocket_disconnects():
+    with patch('backend.pipeline.categorize_batch', side_effect=fake_batch):
+        with TestClient(app) as client:
+            with client.websocket_connect("/ws/analyze") as websocket:
+                websocket.send_text(json.dumps(make_transactions(60)))
+                job_id = websocket.receive_json()["job_id"]
+            assert wait_for_status(client, job_id)["processed_count"] == 60
+
+def test_rest_rejects_empty_submission_and_unknown_job():
+    with TestClient(app) as client:
+        assert client.post("/jobs", json={"transactions": []}).status_code == 400
+        assert client.get("/jobs/inconnu").status_code == 404
+
+def test_rest_rejects_missing_or_non_string_dates():
+    with TestClient(app) as client:
+        for date in (20240101, None, "01/01/2024"):
+            transaction = {"date": date, "amount": -3.0, "description": "CAFE"}
+            assert client.post("/jobs", json={"transactions": [transaction]}).status_code == 400
+        assert client.post("/jobs", json={"transactions": [{"amount": -3.0, "description": "CAFE"}]}).status_code == 400
+
+@pytest.mark.asyncio
+async def test_cancelled_upload_is_interrupted_not_completed(tmp_path):
+    manager = JobManager(JobStore(str(tmp_path / "jobs.sqlite3")), AdaptiveLimiter())
+    job_id, queue, parsing = manager.start_upload()
+    first_part_parsed = asyncio.Event()
+
+    async def chunks():
+        yield b"<OFX><BANKACCTFROM><ACCTID>1</BANKACCTFROM><BANKTRANLIST>" + b"".join(
+            b"<STMTTRN><DTPOSTED>20240105<TRNAMT>-1.00<FITID>F%d<MEMO>CB SHOP %d\n" % (i, i) for i in range(5))
+        first_part_parsed.set()
+        await asyncio.Event().wait()
+
+    with patch('backend.pipeline.categorize_batch', side_effect=fake_batch):
+        reader = asyncio.create_task(feed_ofx_chunks(chunks(), queue, parsing))
+        await first_part_parsed.wait()
+        reader.cancel()
+        await asyncio.gather(reader, return_exceptions=True)
+        await asyncio.gather(*manager._uploads)
+
+    job = manager.job_store.get_job(job_id)
+    assert job["status"] == INTERRUPTED
+    assert not job["parsing_complete"]
+    assert job["input_count"] == 4
+    # La tâche terminée n'est plus retenue par le gestionnaire
+    await asyncio.sleep(0)
+    assert not manager._uploads
@@ -0,0 +1,66 @@
+import asyncio
+import httpx
+import pytest
+import time
+import respx
+
+from backend import ai_service
+from backend.llm_router import LLMRouter, NoBackendAvailable, OllamaBackend, parse_backends
+
+pytestmark = pytest.mark.asyncio
+
+async def test_parse_backends_reads_weight_and_concurrency():
+    backends = parse_backends("http://gpu-1:11434|2|8, http://gpu-2:11434", "http://localhost:11434")
+    assert [(b.base_url, b.weight, b.max_concurrency) for b in backends] == [
+        ("http://gpu-1:11434", 2.0, 8),
+        ("http://gpu-2:11434", 1.0, 8),
+    ]
+    assert [b.base_url for b in parse_backends("", "http://localhost:11434")] == ["http://localhost:11434"]
+
+async def test_router_picks_least_loaded_backend_by_weight():
+    heavy, light = OllamaBackend("http://heavy", weight=2), OllamaBackend("http://light", weight=1)
+    router = LLMRouter([heavy, light])
+    picked = [await router.acquire() for _ in range(3)]
+    # heavy reçoit deux fois plus de requêtes que light
+    assert [b.base_url for b in picked].count("http://heavy") == 2
+    assert light.in_flight == 1
+
+async def test_router_waits_when_backends_are_full():
+    backend = OllamaBackend("http://only", max_concurrency=1)
+    router = LLMRouter([backend])
+    first = await router.acquire()
+    waiting = asyncio.create_task(router.acquire())
+    await asyncio.sleep(0.01)
+    assert not waiting.done()
+
+    await router.release(first, success=True)
+    assert await asyncio.wait_for(waiting, 1) is backend
+
+async def test_circuit_opens_after_consecutive_failures():
+    flaky, stable = OllamaBackend("http://flaky"), OllamaBackend("http://stable")
+    router = LLMRouter([flaky, stable], failure_threshold=2, cooldown=60)
+    # À charge égale, la première instance est choisie : flaky échoue deux fois de suite
+    for _ in range(2):
+        await router.release(await router.acquire(), success=False)
+    assert flaky.is_open(time.monotonic())
+    assert [await router.acquire() for _ in range(3)] == [stable] * 3
+
+    stable.healthy = False
+    with pytest.raises(NoBackendAvailable):
+        await router.acquire()
+
+@respx.mock
+async def test_generate_json_fails_over_to_healthy_backend(monkeypatch):
+    router = LLMRouter([OllamaBackend("http://gpu-1:11434"), OllamaBackend("http://gpu-2:11434")],
+                       failure_threshold=1, cooldown=60)
+    monkeypatch.setattr(ai_service, "_router", router)
+    down = respx.post("http://gpu-1:11434/api/generate").mock(side_effect=httpx.ConnectError("down"))
+    up = respx.post("http://gpu-2:11434/api/generate").mock(
+        return_value=httpx.Response(200, json={"response": '{"ok": true}'})
+    )
+
+    results = [await ai_service._generate_json("prompt") for _ in range(3)]
+
+    assert down.call_count == 1
+    assert up.call_count == 2
+    assert results[1:] == [{"ok": True}, {"ok": True}]
@@ -2,6 +2,8 @@ import pytest
 from fastapi.testclient import TestClient
 from unittest.mock import patch, AsyncMock
 import os
+import json
+import time
 
 # No need to modify sys.path when running pytest from the root directory
 
@@ -77,46 +79,58 @@ def mock_ai_service():
         categorie_suggeree="Restauration",
         ville="Paris 11"
     )
-    # Patch the function in the 'backend.main' module where it's imported and used
-    with patch('backend.main.categorize_transaction', new_callable=AsyncMock) as mock_func:
-        mock_func.return_value = mock_response
+    # Patch the batch categorization where the enrichment pipeline uses it
+    with patch('backend.pipeline.categorize_batch', new_callable=AsyncMock) as mock_func:
+        mock_func.side_effect = lambda descriptions: [mock_response for _ in descriptions]
         yield mock_func
 
 def test_upload_ofx_file_success(mock_ai_service):
     """
     Tests the successful upload and processing of an OFX file.
-    It verifies that the AI service is called and the response is enriched.
+    The file is parsed by /parse-ofx/, then enriched by a background job; it verifies
+    that the AI service is called and the results are enriched.
     """
     # Create a mock file
     files = {'file': ('test.ofx', SAMPLE_OFX_CONTENT, 'application/ofx')}
 
-    # Make the request
-    response = client.post("/upload-ofx/", files=files)
+    with TestClient(app) as job_client:
+        # Make the requests
+        response = job_client.post("/parse-ofx/", files=files)
+        assert response.status_code == 200
+        transactions = response.json()["transactions"]
+        assert len(transactions) == 1
+
+        response = job_client.post("/jobs", json={"transactions": transactions})
+        assert response.status_code == 202
+        job_id = response.json()["job_id"]
+        for _ in range(100):
+            if job_client.get(f"/jobs/{job_id}").json()["status"] == "completed":
+                break
+            time.sleep(0.02)
+        data = job_client.get(f"/jobs/{job_id}/results").json()
 
     # Assertions
-    assert response.status_code == 200
-    data = response.json()
-    assert data["filename"] == "test.ofx"
-    assert data["transaction_count"] == 1
+    assert data["status"] == "completed"
+    assert len(data["results"]) == 1
 
     # Check that the transaction is enriched
-    transaction = data["transactions"][0]
+    transaction = data["results"][0]
     assert transaction["description"] == "PAIEMENT CB 22/07 STARBUCKS PARIS 11"
     assert transaction["marchand_probable"] == "Starbucks"
     assert transaction["categorie_suggeree"] == "Restauration"
     assert transaction["ville"] == "Paris 11"
 
     # Verify that the mocked AI service was called once
-    mock_ai_service.assert_called_once_with("PAIEMENT CB 22/07 STARBUCKS PARIS 11")
+    mock_ai_service.assert_called_once_with(["PAIEMENT CB 22/07 STARBUCKS PARIS 11"])
 
 def test_upload_invalid_file_type():
     """
     Tests that the endpoint correctly rejects a file with an invalid extension.
     """
     files = {'file': ('test.txt', b'some content', 'text/plain')}
-    response = client.post("/upload-ofx/", files=files)
+    response = client.post("/parse-ofx/", files=files)
     assert response.status_code == 400
-    assert "Invalid file type" in response.json()["detail"]
+    assert "Type de fichier invalide" in response.json()["detail"]
 
 def test_get_index_html():
     """
@@ -125,4 +139,111 @@ def test_get_index_html():
     response = client.get("/")
     assert response.status_code == 200
     assert response.headers['content-type'] == 'text/html; charset=utf-8'
-    assert "<h1>Revelio Finance ✨</h1>".encode('utf-8') in response.content
\ No newline at end of file
+    assert "Revelio Finance ✨</h1>".encode('utf-8') in response.content
+
+def test_lifespan_manages_shared_ollama_client():
+    """
+    Tests that the shared Ollama client lives for the duration of the application.
+    """
+    from backend import ai_service
+
+    with TestClient(app):
+        assert ai_service._http_client is not None
+        assert not ai_service._http_client.is_closed
+    assert ai_service._http_client is None
+
+def test_ai_router_is_mounted():
+    """
+    Tests that the AI router endpoints are exposed by the application.
+    """
+    response = client.post("/ai/categorize", json={"libelle": ""})
+    assert response.status_code == 400
+
+def test_websocket_analyze_streams_enriched_lots():
+    """
+    Tests that /ws/analyze enriches the received transactions and reports completion.
+    """
+    async def fake_batch(descriptions):
+        return [CategorizationResponse(marchand_probable="Starbucks", categorie_suggeree="Loisirs", ville="Paris")
+                for _ in descriptions]
+
+    transactions = [{"date": "2024-01-01", "amount": -5.0, "description": f"CB STARBUCKS {i}"} for i in range(3)]
+    with patch('backend.pipeline.categorize_batch', side_effect=fake_batch):
+        with TestClient(app) as ws_client, ws_client.websocket_connect("/ws/analyze") as websocket:
+            websocket.send_text(json.dumps(transactions))
+            assert websocket.receive_json()["type"] == "job"
+            message = websocket.receive_json()
+            assert message["type"] == "progress"
+            assert message["total_count"] == 3
+            assert all(t["marchand_probable"] == "Starbucks" for t in message["data"])
+            assert websocket.receive_json()["type"] == "complete"
+
+def test_websocket_analyze_parses_uploaded_chunks():
+    """
+    Tests that an OFX file streamed over the WebSocket is parsed and enriched server-side.
+    """
+    async def fake_batch(descriptions):
+        return [CategorizationResponse(marchand_probable="Starbucks", categorie_suggeree="Loisirs", ville="Paris")
+                for _ in descriptions]
+
+    with patch('backend.pipeline.categorize_batch', side_effect=fake_batch):
+        with TestClient(app) as ws_client, ws_client.websocket_connect("/ws/analyze") as websocket:
+            websocket.send_text(json.dumps({"type": "upload", "filename": "test.ofx"}))
+            for i in range(0, len(SAMPLE_OFX_CONTENT), 100):
+                websocket.send_bytes(SAMPLE_OFX_CONTENT[i:i + 100])
+            websocket.send_text(json.dumps({"type": "end"}))
+
+            assert websocket.receive_json()["type"] == "job"
+            message = websocket.receive_json()
+            assert message["type"] == "progress"
+            assert message["data"][0]["description"] == "PAIEMENT CB 22/07 STARBUCKS PARIS 11"
+            assert message["data"][0]["marchand_probable"] == "Starbucks"
+            assert websocket.receive_json()["type"] == "complete"
+
+def test_websocket_analyze_rejects_invalid_upload_type():
+    """
+    Tests that the WebSocket upload mode rejects non-OFX files.
+    """
+    with TestClient(app) as ws_client, ws_client.websocket_connect("/ws/analyze") as websocket:
+        websocket.send_text(json.dumps({"type": "upload", "filename": "test.txt"}))
+        message = websocket.receive_json()
+        assert message["type"] == "error"
+
+def test_parse_ofx_runs_in_parse_pool_and_reports_queue_wait():
+    """
+    Tests that /parse-ofx/ parses through the executor pool and records queue wait time.
+    """
+    files = {'file': ('test.ofx', SAMPLE_OFX_CONTENT, 'application/ofx')}
+    with TestClient(app) as pool_client:
+        response = pool_client.post("/parse-ofx/", files=files)
+        assert response.status_code == 200
+        assert response.json()["transactions"][0]["description"] == "PAIEMENT CB 22/07 STARBUCKS PARIS 11"
+
+        stats = pool_client.get("/parse-ofx/stats").json()
+        assert stats["executor"] == "ProcessPoolExecutor"
+        assert stats["jobs"] >= 1
+        assert stats["queue_wait_max_seconds"] >= 0
+
+def test_parse_ofx_rejects_files_over_size_limit(monkeypatch):
+    """
+    Tests that files larger than the configured maximum are refused with 413.
+    """
+    from backend import parse_executor
+    monkeypatch.setattr(parse_executor, "MAX_OFX_FILE_SIZE", 10)
+    files = {'file': ('test.ofx', SAMPLE_OFX_CONTENT, 'application/ofx')}
+    response = client.post("/parse-ofx/", files=files)
+    assert response.status_code == 413
+
+def test_metrics_endpoint_exposes_parse_metrics():
+    """
+    Tests that /metrics serves Prometheus text including the parse stage metrics.
+    """
+    files = {'file': ('test.ofx', SAMPLE_OFX_CONTENT, 'application/ofx')}
+    with TestClient(app) as metrics_client:
+        metrics_client.post("/parse-ofx/", files=files)
+        response = metrics_client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert "# TYPE revelio_parse_seconds histogram" in response.text
+    assert 'revelio_parsed_transactions_total{mode="file"}' in response.text
+    assert "revelio_llm_concurrency_limit" in response.text
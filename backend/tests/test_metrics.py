@@ -0,0 +1,49 @@
+import json
+import logging
+import pytest
+import respx
+from httpx import Response
+from backend import ai_service
+from backend.metrics import MetricsRegistry
+
+def test_registry_renders_prometheus_text():
+    registry = MetricsRegistry()
+    requests = registry.counter("app_requests_total", "Requests.", ["route"])
+    latency = registry.histogram("app_latency_seconds", "Latency.", buckets=(0.1, 1.0))
+    registry.callback("app_queue_size", "Queue size.", "gauge", lambda: 3)
+
+    requests.inc(route='/a"b')
+    requests.inc(2, route='/a"b')
+    for value in (0.05, 0.1, 0.5, 4.0):
+        latency.observe(value)
+
+    text = registry.render()
+    assert 'app_requests_total{route="/a\\"b"} 3' in text
+    assert 'app_latency_seconds_bucket{le="0.1"} 2' in text
+    assert 'app_latency_seconds_bucket{le="1"} 3' in text
+    assert 'app_latency_seconds_bucket{le="+Inf"} 4' in text
+    assert "app_latency_seconds_count 4" in text
+    assert "app_queue_size 3" in text
+    assert registry.counter("app_requests_total", "Requests.", ["route"]) is requests
+
+@pytest.mark.asyncio
+@respx.mock
+async def test_llm_metrics_and_no_payload_logging_by_default(caplog):
+    answer = {"marchand_probable": "Fnac", "categorie_suggeree": "Loisirs", "ville": None}
+    respx.post(ai_service.OLLAMA_API_URL).mock(return_value=Response(200, json={
+        "response": json.dumps(answer), "done": True, "eval_count": 40, "eval_duration": 2 * 10 ** 9
+    }))
+    tokens_before = ai_service.LLM_TOKENS.value()
+    speed_before = ai_service.LLM_TOKENS_PER_SECOND.count()
+    requests_before = ai_service.LLM_REQUEST_SECONDS.count(endpoint="generate", outcome="ok")
+
+    with caplog.at_level(logging.DEBUG, logger="backend.ai_service"):
+        result = await ai_service.categorize_transaction("CB FNAC 4521 SECRET")
+
+    assert result.marchand_probable == "Fnac"
+    assert ai_service.LLM_TOKENS.value() == tokens_before + 40
+    assert ai_service.LLM_TOKENS_PER_SECOND.count() == speed_before + 1
+    assert ai_service.LLM_REQUEST_SECONDS.count(endpoint="generate", outcome="ok") == requests_before + 1
+    assert ai_service.LOOKUP_SECONDS.count(stage="cache") >= 1
+    assert "SECRET" not in caplog.text
+    assert "Fnac" not in caplog.text
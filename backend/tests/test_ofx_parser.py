@@ -0,0 +1,109 @@
+import asyncio
+import io
+import threading
+import time
+import pytest
+from backend.ofx_parser import parse_ofx, iter_ofx_transactions, OFXStreamParser
+from backend.pipeline import ParsingState, feed_ofx_chunks
+from backend.transactions import Transaction
+
+MULTI_ACCOUNT_SGML = b"""OFXHEADER:100
+DATA:OFXSGML
+VERSION:102
+
+<OFX>
+<BANKMSGSRSV1>
+<STMTTRNRS><TRNUID>1
+<STMTRS><CURDEF>EUR
+<BANKACCTFROM><BANKID>12345<ACCTID>111<ACCTTYPE>CHECKING</BANKACCTFROM>
+<BANKTRANLIST><DTSTART>20240101<DTEND>20240131
+<STMTTRN><TRNTYPE>DEBIT<DTPOSTED>20240105<TRNAMT>-12,50<FITID>A1<NAME>CB CARREFOUR<MEMO>CB CARREFOUR 05/01
+<STMTTRN><TRNTYPE>CREDIT<DTPOSTED>20240110120000[+1:CET]<TRNAMT>1500.00<FITID>A2<NAME>VIR SALAIRE
+</BANKTRANLIST>
+</STMTRS></STMTTRNRS>
+<STMTTRNRS><TRNUID>2
+<STMTRS><CURDEF>EUR
+<BANKACCTFROM><BANKID>12345<ACCTID>222<ACCTTYPE>SAVINGS</BANKACCTFROM>
+<BANKTRANLIST><DTSTART>20240101<DTEND>20240131
+<STMTTRN><TRNTYPE>CREDIT<DTPOSTED>20240131<TRNAMT>3.20<FITID>B1<MEMO>INTERETS</STMTTRN>
+</BANKTRANLIST>
+</STMTRS></STMTTRNRS>
+</BANKMSGSRSV1>
+</OFX>
+trailing garbage"""
+
+def test_parse_ofx_covers_every_statement_and_account():
+    transactions = parse_ofx(MULTI_ACCOUNT_SGML)
+    assert [t.to_dict() for t in transactions] == [
+        {"date": "2024-01-05", "amount": -12.5, "description": "CB CARREFOUR 05/01", "account_id": "111", "fitid": "A1"},
+        {"date": "2024-01-10", "amount": 1500.0, "description": "VIR SALAIRE", "account_id": "111", "fitid": "A2"},
+        {"date": "2024-01-31", "amount": 3.2, "description": "INTERETS", "account_id": "222", "fitid": "B1"},
+    ]
+
+def test_stream_parser_is_independent_of_chunk_boundaries():
+    expected = parse_ofx(MULTI_ACCOUNT_SGML)
+    for chunk_size in (1, 7, 64):
+        stream = io.BytesIO(MULTI_ACCOUNT_SGML)
+        assert list(iter_ofx_transactions(stream, chunk_size=chunk_size)) == expected
+
+def test_stream_parser_keeps_only_pending_block_in_memory():
+    parser = OFXStreamParser()
+    block = b"<STMTTRN><DTPOSTED>20240105<TRNAMT>-1.00<MEMO>X</STMTTRN>\n"
+    header = b"<OFX><BANKACCTFROM><ACCTID>1</BANKACCTFROM><BANKTRANLIST>"
+    assert parser.feed(header) == []
+    for _ in range(1000):
+        assert len(parser.feed(block)) == 1
+        assert len(parser._buffer) < len(block)
+    assert parser.transaction_count == 1000
+
+def test_parse_ofx_decodes_cp1252_and_skips_invalid_blocks():
+    content = "<STMTTRN><DTPOSTED>20240105<TRNAMT>-1.00<MEMO>CAFÉ</STMTTRN><STMTTRN><MEMO>SANS DATE</STMTTRN>".encode("cp1252")
+    assert [t.to_dict() for t in parse_ofx(content)] == [{"date": "2024-01-05", "amount": -1.0, "description": "CAFÉ", "account_id": None, "fitid": None}]
+
+def test_parse_ofx_without_transactions_returns_empty_list():
+    assert parse_ofx(b"not an ofx file") == []
+
+def test_amounts_are_exact_integer_cents():
+    content = b"<STMTTRN><DTPOSTED>20240105<TRNAMT>-0,29<MEMO>A</STMTTRN><STMTTRN><DTPOSTED>20240105<TRNAMT>1234.565<MEMO>B</STMTTRN>"
+    transactions = parse_ofx(content)
+    assert [t.amount_cents for t in transactions] == [-29, 123457]
+    assert all(isinstance(t, Transaction) and not hasattr(t, "__dict__") for t in transactions)
+
+def test_parse_time_stays_flat_as_chunk_size_grows():
+    # Blocs SGML sans balise fermante : la fin de chaque bloc est le <STMTTRN> suivant
+    blocks = b"".join(b"<STMTTRN><TRNTYPE>DEBIT<DTPOSTED>20240105<TRNAMT>-1.00<FITID>F%d<MEMO>CB SHOP %d\n" % (i, i)
+                      for i in range(10000))
+    content = b"<OFX><BANKACCTFROM><ACCTID>1</BANKACCTFROM><BANKTRANLIST>" + blocks + b"</BANKTRANLIST></OFX>"
+
+    def best_time(chunk_size):
+        timings = []
+        for _ in range(3):
+            started = time.perf_counter()
+            assert sum(1 for _ in iter_ofx_transactions(io.BytesIO(content), chunk_size=chunk_size)) == 10000
+            timings.append(time.perf_counter() - started)
+        return min(timings)
+
+    assert best_time(len(content)) < 3 * best_time(16 * 1024) + 0.05
+
+def test_field_values_are_unescaped():
+    content = b"<STMTTRN><DTPOSTED>20240105<TRNAMT>-1.00<NAME>A&lt;B&gt;<MEMO>PRLV M&amp;S&nbsp;FOOD</STMTTRN>"
+    assert parse_ofx(content)[0].description == "PRLV M&S FOOD"
+
+@pytest.mark.asyncio
+async def test_streamed_chunks_are_parsed_off_the_event_loop(monkeypatch):
+    threads = []
+    feed = OFXStreamParser.feed
+
+    def recording_feed(self, chunk):
+        threads.append(threading.current_thread())
+        return feed(self, chunk)
+
+    async def chunks():
+        yield MULTI_ACCOUNT_SGML[:200]
+        yield MULTI_ACCOUNT_SGML[200:]
+
+    monkeypatch.setattr(OFXStreamParser, "feed", recording_feed)
+    queue, state = asyncio.Queue(), ParsingState()
+    await feed_ofx_chunks(chunks(), queue, state)
+    assert state.parsed_count == 3 and state.error is None
+    assert threads and threading.main_thread() not in threads
@@ -0,0 +1,95 @@
+import pytest
+from unittest.mock import AsyncMock, patch
+from fastapi.testclient import TestClient
+from backend.ai_service import categorize_batch, prompt_fingerprint
+from backend.main import app
+from backend.recurring import RecurringIndex, find_recurring, refresh_recurring_index
+from backend.schemas import CategorizationResponse
+from backend.storage import get_store
+from backend.transactions import Transaction
+
+def rows(account_id, description, dates, amount_cents, merchant=None, category=None, city=None, fingerprint=None):
+    return [(account_id, day, amount_cents, description, merchant, category, city, fingerprint) for day in dates]
+
+MONTHLY = ["2024-01-03", "2024-02-02", "2024-03-04", "2024-04-03", "2024-05-03"]
+
+def test_detects_monthly_and_annual_series_with_next_date():
+    transactions = sorted(
+        rows("111", "PRLV SEPA NETFLIX 0103", MONTHLY, -1349, "Netflix", "Abonnements")
+        + rows("111", "ASSURANCE HABITATION", ["2022-09-15", "2023-09-14", "2024-09-16"], -21000)
+        + rows("111", "CB BOULANGERIE", ["2024-01-05", "2024-01-07", "2024-03-20", "2024-03-21"], -450)
+        + rows("222", "PRLV SEPA NETFLIX 0103", MONTHLY[:2], -1349),
+        key=lambda row: (row[0], row[1])
+    )
+    series = {(s["account_id"], s["cadence"]): s for s in find_recurring(transactions)}
+
+    assert set(series) == {("111", "mensuel"), ("111", "annuel")}
+    netflix = series[("111", "mensuel")]
+    assert netflix["marchand"] == "Netflix"
+    assert netflix["occurrences"] == 5
+    assert netflix["prochaine_date"] == "2024-06-03"
+    assert series[("111", "annuel")]["prochaine_date"] == "2025-09-16"
+
+def test_amount_outliers_are_ignored_within_a_series():
+    transactions = rows("111", "EDF ABONNEMENT", MONTHLY, -6000)
+    transactions.insert(2, ("111", "2024-02-20", -45000, "EDF ABONNEMENT", None, None, None, None))
+    series, = find_recurring(transactions)
+    assert series["occurrences"] == 5
+    assert series["montant_moyen"] == 60.0
+
+def test_series_of_different_accounts_do_not_overwrite_each_other():
+    index = RecurringIndex(find_recurring(
+        rows("111", "PRLV ASSURANCE", MONTHLY, -3000, "Axa", "Logement", fingerprint="p")
+        + rows("222", "PRLV ASSURANCE", MONTHLY[:3], -1500, "Maif", "Transport", fingerprint="p")
+    ))
+    assert index.match("PRLV ASSURANCE", "p", account_id="111").marchand_probable == "Axa"
+    assert index.match("PRLV ASSURANCE", "p", account_id="222").marchand_probable == "Maif"
+    assert index.match("PRLV ASSURANCE", "p", account_id="333") is None
+    # Sans compte, la série la plus longue
+    assert index.match("PRLV ASSURANCE", "p").marchand_probable == "Axa"
+
+@pytest.mark.asyncio
+async def test_known_recurring_payment_skips_the_llm():
+    store = get_store()
+    netflix = CategorizationResponse(marchand_probable="Netflix", categorie_suggeree="Abonnements", ville="Paris")
+    transactions = [Transaction.from_dict({"date": day, "amount": -13.49, "description": f"PRLV SEPA NETFLIX {day}",
+                                           "account_id": "111", "fitid": day}) for day in MONTHLY]
+    store.import_transactions(transactions)
+    store.save_enrichment(transactions, [netflix] * len(transactions), prompt_fingerprint())
+    refresh_recurring_index()
+
+    with patch("backend.ai_service._query_llm_batch", new_callable=AsyncMock) as batch, \
+         patch("backend.ai_service._query_llm", new_callable=AsyncMock) as single:
+        results = await categorize_batch(["PRLV SEPA NETFLIX 2024-06-03"])
+
+    assert results == [netflix]
+    batch.assert_not_called()
+    single.assert_not_called()
+
+@pytest.mark.asyncio
+async def test_recurring_payment_categorized_under_another_prompt_goes_to_the_llm():
+    store = get_store()
+    netflix = CategorizationResponse(marchand_probable="Netflix", categorie_suggeree="Abonnements", ville=None)
+    transactions = [Transaction.from_dict({"date": day, "amount": -13.49, "description": f"PRLV SEPA NETFLIX {day}",
+                                           "account_id": "111", "fitid": day}) for day in MONTHLY]
+    store.import_transactions(transactions)
+    store.save_enrichment(transactions, [netflix] * len(transactions), "ancien-prompt")
+    index = refresh_recurring_index()
+    assert index.match("PRLV SEPA NETFLIX 2024-06-03") == netflix
+
+    fresh = CategorizationResponse(marchand_probable="Netflix", categorie_suggeree="Loisirs", ville=None)
+    with patch("backend.ai_service._query_llm", new_callable=AsyncMock, return_value=fresh) as single:
+        results = await categorize_batch(["PRLV SEPA NETFLIX 2024-06-03"])
+
+    assert results == [fresh]
+    single.assert_called_once()
+
+def test_recurring_endpoint():
+    store = get_store()
+    store.import_transactions([Transaction.from_dict({"date": day, "amount": -9.99, "description": "SPOTIFY",
+                                                      "account_id": "111", "fitid": day}) for day in MONTHLY])
+    with TestClient(app) as client:
+        response = client.get("/recurring", params={"refresh": True})
+        assert response.status_code == 200
+        assert [s["cle"] for s in response.json()] == ["SPOTIFY"]
+        assert client.get("/recurring", params={"account_id": "999"}).json() == []
@@ -0,0 +1,54 @@
+import pytest
+import respx
+from fastapi.testclient import TestClient
+from backend import ai_service, rules
+from backend.main import app
+from backend.rules import RulesEngine, load_rules
+from backend.schemas import MerchantRule
+
+RULES = [
+    MerchantRule(motif="carrefour", marchand="Carrefour", categorie="Alimentation"),
+    MerchantRule(motif="carrefour market", marchand="Carrefour Market", categorie="Alimentation"),
+    MerchantRule(motif="netflix", marchand="Netflix", categorie="Abonnements"),
+    MerchantRule(motif="RATP", marchand="RATP", categorie="Transport", ville="Paris"),
+]
+
+def test_rules_match_on_normalized_libelle():
+    engine = RulesEngine(RULES)
+    assert engine.match("PRLV SEPA NETFLIX.COM 12/03").marchand_probable == "Netflix"
+    assert engine.match("CB RATP 02/01 CARTE X1234").ville == "Paris"
+    assert engine.match("CB CARREFOUR MARKET 12/03").marchand_probable == "Carrefour Market"
+    assert engine.match("CB CARREFOURCITY") is None
+    assert engine.match("VIR MAMAN") is None
+    assert engine.stats() == {"rules": 4, "hits": 3, "misses": 2}
+
+def test_default_rules_file_is_valid():
+    assert len(load_rules(rules.RULES_PATH)) > 0
+
+@pytest.mark.asyncio
+@respx.mock(assert_all_called=False)
+async def test_rules_bypass_llm(monkeypatch):
+    monkeypatch.setattr(rules, "_engine", RulesEngine(RULES))
+    route = respx.post(ai_service.OLLAMA_API_URL)
+
+    results = await ai_service.categorize_batch(["PRLV SEPA NETFLIX", "CB CARREFOUR 12/03"])
+
+    assert [r.categorie_suggeree for r in results] == ["Abonnements", "Alimentation"]
+    assert not route.called
+
+def test_rules_endpoints_replace_table(tmp_path, monkeypatch):
+    shipped = tmp_path / "shipped.json"
+    shipped.write_text('[{"motif": "netflix", "marchand": "Netflix", "categorie": "Abonnements"}]', encoding="utf-8")
+    monkeypatch.setattr(rules, "RULES_PATH", str(shipped))
+    monkeypatch.setattr(rules, "USER_RULES_PATH", str(tmp_path / "user" / "rules.json"))
+    client = TestClient(app)
+
+    response = client.put("/rules", json=[{"motif": "lidl", "marchand": "Lidl", "categorie": "Alimentation"}])
+    assert response.status_code == 200
+
+    assert client.get("/rules").json()[0]["marchand"] == "Lidl"
+    assert rules.get_rules_engine().match("CB LIDL 1234").marchand_probable == "Lidl"
+
+    # La table livrée reste intacte ; la table de l'utilisateur est rechargée ensuite
+    assert "lidl" not in shipped.read_text(encoding="utf-8")
+    assert [rule.motif for rule in load_rules()] == ["lidl"]
@@ -0,0 +1,74 @@
+import asyncio
+import pytest
+from backend.scheduler import AdaptiveLimiter, run_adaptive
+
+pytestmark = pytest.mark.asyncio
+
+async def test_limiter_additive_increase_and_multiplicative_decrease():
+    limiter = AdaptiveLimiter(initial=4, min_limit=1, max_limit=8)
+    # Environ +1 par fenêtre de `limit` succès
+    for _ in range(5):
+        await limiter.record(0.1, success=True)
+    assert limiter.limit == 5
+
+    await limiter.record(0.1, success=False)
+    assert limiter.limit == 2
+    assert limiter.errors == 1
+
+async def test_limiter_backs_off_on_latency_spike():
+    limiter = AdaptiveLimiter(initial=8, max_limit=16)
+    await limiter.record(0.01, success=True)
+    await limiter.record(1.0, success=True)
+    assert limiter.limit == 4
+
+async def test_run_adaptive_streams_results_as_they_complete():
+    async def worker(delay):
+        await asyncio.sleep(delay)
+        return delay
+
+    limiter = AdaptiveLimiter(initial=4, max_limit=4)
+    order = [result async for _, result in run_adaptive([0.2, 0.01, 0.02], worker, limiter)]
+    assert order == [0.01, 0.02, 0.2]
+
+async def test_run_adaptive_respects_limit():
+    running = 0
+    peak = 0
+
+    async def worker(item):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        return item
+
+    limiter = AdaptiveLimiter(initial=2, max_limit=2)
+    results = [r async for _, r in run_adaptive(range(10), worker, limiter)]
+    assert sorted(results) == list(range(10))
+    assert peak <= 2
+
+async def test_run_adaptive_propagates_worker_errors():
+    async def worker(item):
+        raise ValueError("boom")
+
+    with pytest.raises(ValueError):
+        async for _ in run_adaptive([1], worker, AdaptiveLimiter()):
+            pass
+
+async def test_limiter_baseline_recovers_from_a_fast_first_sample():
+    # Un premier lot servi par le cache (1 ms) ne doit pas figer la référence
+    limiter = AdaptiveLimiter(initial=4, min_limit=1, max_limit=8)
+    await limiter.record(0.001, success=True)
+    for _ in range(200):
+        await limiter.record(2.0, success=True)
+    assert limiter.baseline_latency > 1.0
+    assert limiter.limit == 8
+
+async def test_run_adaptive_ignores_unmeasured_results():
+    async def worker(item):
+        return item
+
+    limiter = AdaptiveLimiter(initial=2, max_limit=4)
+    results = [r async for _, r in run_adaptive([0, 1, 0], worker, limiter, is_measured=bool)]
+    assert sorted(results) == [0, 0, 1]
+    assert limiter.successes == 1
@@ -0,0 +1,92 @@
+import pytest
+from fastapi.testclient import TestClient
+from backend.main import app
+from backend.schemas import CategorizationResponse
+from backend.storage import TransactionStore, get_store
+from backend.transactions import Transaction
+
+CAFE = CategorizationResponse(marchand_probable="Café de Flore", categorie_suggeree="Restaurants", ville="Paris")
+CARREFOUR = CategorizationResponse(marchand_probable="Carrefour", categorie_suggeree="Alimentation", ville="Lyon")
+
+def make_transaction(fitid, date, amount, description, account_id="111"):
+    return Transaction.from_dict({"date": date, "amount": amount, "description": description,
+                                  "account_id": account_id, "fitid": fitid})
+
+def fill(store):
+    transactions = [
+        make_transaction("A1", "2024-01-05", -4.50, "CB CAFE FLORE 05/01"),
+        make_transaction("A2", "2024-01-06", -62.30, "CB CARREFOUR MARKET"),
+        make_transaction("A3", "2024-02-01", 2000.00, "VIR SALAIRE ACME"),
+        make_transaction("A4", "2024-02-03", -120.00, "CB CARREFOUR CITY"),
+        make_transaction("B1", "2024-02-10", -3.80, "CB CAFE FLORE 10/02", account_id="222"),
+    ]
+    store.import_transactions(transactions)
+    store.save_enrichment([transactions[0], transactions[4]], [CAFE, CAFE])
+    store.save_enrichment([transactions[1], transactions[3]], [CARREFOUR, CARREFOUR])
+
+@pytest.fixture
+def store(tmp_path):
+    store = TransactionStore(str(tmp_path / "db.sqlite3"))
+    fill(store)
+    yield store
+    store.close()
+
+def fitids(results):
+    return [t.fitid for t in results]
+
+def test_full_text_matches_description_and_merchant_prefixes(store):
+    assert fitids(store.search("carref")[0]) == ["A4", "A2"]
+    # Sans accents ni casse, sur le marchand enrichi comme sur le libellé
+    assert fitids(store.search("café flore")[0]) == ["B1", "A1"]
+    assert fitids(store.search("salaire acme")[0]) == ["A3"]
+    assert store.search("carrefour salaire")[0] == []
+
+def test_filters_combine_with_text(store):
+    assert fitids(store.search(category="Alimentation", min_amount_cents=10000)[0]) == ["A4"]
+    assert fitids(store.search(city="paris", account_id="111")[0]) == ["A1"]
+    assert fitids(store.search(date_from="2024-02-01", date_to="2024-02-05")[0]) == ["A4", "A3"]
+    assert fitids(store.search(kind="credit")[0]) == ["A3"]
+    assert fitids(store.search(kind="debit", max_amount_cents=500)[0]) == ["B1", "A1"]
+    assert fitids(store.search("cb", max_amount_cents=5000)[0]) == ["B1", "A1"]
+
+def test_cursor_pages_through_every_result_once(store):
+    seen, cursor = [], None
+    while True:
+        page, cursor = store.search(limit=2, cursor=cursor)
+        seen += fitids(page)
+        if cursor is None:
+            break
+    assert seen == ["B1", "A4", "A3", "A2", "A1"]
+
+def test_full_text_index_follows_enrichment_and_existing_databases(tmp_path):
+    path = str(tmp_path / "db.sqlite3")
+    store = TransactionStore(path)
+    fill(store)
+    store._conn.execute("DROP TABLE transactions_fts")
+    store.close()
+    # Base antérieure à l'index : il est reconstruit à l'ouverture
+    store = TransactionStore(path)
+    assert fitids(store.search("market")[0]) == ["A2"]
+    store.save_enrichment([make_transaction("A3", "2024-02-01", 2000.00, "VIR SALAIRE ACME")],
+                          [CategorizationResponse(marchand_probable="Acme Corp", categorie_suggeree="Salaire", ville=None)])
+    assert fitids(store.search("corp")[0]) == ["A3"]
+    store.close()
+
+def test_search_endpoint_returns_pages_and_rejects_bad_input():
+    fill(get_store())
+    client = TestClient(app)
+
+    response = client.get("/transactions/search", params={"q": "carrefour", "limit": 1})
+    assert response.status_code == 200
+    body = response.json()
+    assert [t["fitid"] for t in body["results"]] == ["A4"]
+    assert body["results"][0]["amount"] == -120.0
+    assert body["results"][0]["ville"] == "Lyon"
+
+    response = client.get("/transactions/search", params={"q": "carrefour", "limit": 1, "cursor": body["next_cursor"]})
+    assert [t["fitid"] for t in response.json()["results"]] == ["A2"]
+    assert response.json()["next_cursor"] is None
+
+    assert client.get("/transactions/search", params={"cursor": "nope"}).status_code == 400
+    assert client.get("/transactions/search", params={"date_from": "05/01/2024"}).status_code == 400
+    assert client.get("/transactions/search", params={"kind": "other"}).status_code == 422
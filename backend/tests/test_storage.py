@@ -0,0 +1,93 @@
+import pytest
+from unittest.mock import AsyncMock, patch
+from backend.pipeline import enrich_lots
+from backend.scheduler import AdaptiveLimiter
+from backend.schemas import CategorizationResponse
+from dataclasses import replace
+from backend.storage import TransactionStore, get_store, transaction_key
+from backend.transactions import Transaction
+
+NETFLIX = CategorizationResponse(marchand_probable="Netflix", categorie_suggeree="Abonnements", ville=None)
+
+def make_transaction(fitid, description="PRLV NETFLIX", account_id="111"):
+    return Transaction.from_dict({"date": "2024-01-05", "amount": -13.49, "description": description,
+                                  "account_id": account_id, "fitid": fitid})
+
+def test_import_inserts_only_new_fitids(tmp_path):
+    store = TransactionStore(str(tmp_path / "db.sqlite3"))
+    first = [make_transaction("A1"), make_transaction("A2")]
+    assert store.import_transactions(first) == [None, None]
+    store.save_enrichment(first[:1], [NETFLIX])
+
+    overlap = [make_transaction("A1"), make_transaction("A2"), make_transaction("A3")]
+    assert store.import_transactions(overlap) == [NETFLIX, None, None]
+    assert [t.nouvelle for t in overlap] == [False, False, True]
+    assert store.stats() == {"transactions": 3, "enriched": 1}
+
+def test_enrichment_from_another_prompt_is_not_reused(tmp_path):
+    store = TransactionStore(str(tmp_path / "db.sqlite3"))
+    store.import_transactions([make_transaction("A1")])
+    store.save_enrichment([make_transaction("A1")], [NETFLIX], "ancien-prompt")
+
+    assert store.import_transactions([make_transaction("A1")], "ancien-prompt") == [NETFLIX]
+    assert store.import_transactions([make_transaction("A1")], "nouveau-prompt") == [None]
+
+def test_same_fitid_on_another_account_is_distinct(tmp_path):
+    store = TransactionStore(str(tmp_path / "db.sqlite3"))
+    store.import_transactions([make_transaction("A1", account_id="111")])
+    store.import_transactions([make_transaction("A1", account_id="222")])
+    assert store.count() == 2
+
+def test_missing_fitid_gets_stable_fingerprint():
+    transaction = make_transaction(None)
+    assert transaction_key(transaction) == transaction_key(replace(transaction))
+    assert transaction_key(transaction)[1].startswith("sha1:")
+
+@pytest.mark.asyncio
+async def test_identical_purchases_without_fitid_are_kept():
+    def cafe():
+        return Transaction.from_dict({"date": "2024-01-01", "amount": -3.0, "description": "CAFE", "account_id": "111"})
+
+    async def lots():
+        yield [cafe(), cafe()]
+
+    with patch('backend.pipeline.categorize_batch', new_callable=AsyncMock) as categorize:
+        categorize.side_effect = lambda descriptions: [NETFLIX for _ in descriptions]
+        first = [lot async for lot, _ in enrich_lots(lots(), AdaptiveLimiter())][0]
+        again = [lot async for lot, _ in enrich_lots(lots(), AdaptiveLimiter())][0]
+
+    assert [t.nouvelle for t in first] == [True, True]
+    # Le même envoi rejoué n'insère rien de plus
+    assert [t.nouvelle for t in again] == [False, False]
+    assert get_store().count() == 2
+
+@pytest.mark.asyncio
+async def test_reimport_sends_only_new_transactions_to_categorization():
+    async def lots(batch):
+        yield batch
+
+    with patch('backend.pipeline.categorize_batch', new_callable=AsyncMock) as categorize:
+        categorize.side_effect = lambda descriptions: [NETFLIX for _ in descriptions]
+        async for _ in enrich_lots(lots([make_transaction("A1"), make_transaction("A2")]), AdaptiveLimiter()):
+            pass
+        reimport = [make_transaction("A1"), make_transaction("A2"), make_transaction("A3", "CB NOUVEAU")]
+        async for _, results in enrich_lots(lots(reimport), AdaptiveLimiter()):
+            assert results == [NETFLIX] * 3
+
+    assert categorize.call_args_list[-1].args == (["CB NOUVEAU"],)
+    assert get_store().stats() == {"transactions": 3, "enriched": 3}
+
+@pytest.mark.asyncio
+async def test_identical_descriptions_are_categorized_once_per_run():
+    async def lots():
+        yield [make_transaction("B1", "CB CARREFOUR 01/03"), make_transaction("B2", "CB CARREFOUR 02/03"),
+               make_transaction("B3")]
+        yield [make_transaction("B4", "CB CARREFOUR 09/03"), make_transaction("B5")]
+
+    with patch('backend.pipeline.categorize_batch', new_callable=AsyncMock) as categorize:
+        categorize.side_effect = lambda descriptions: [NETFLIX for _ in descriptions]
+        async for lot, results in enrich_lots(lots(), AdaptiveLimiter()):
+            assert results == [NETFLIX] * len(lot)
+
+    assert [call.args for call in categorize.call_args_list] == [(["CB CARREFOUR 01/03", "PRLV NETFLIX"],)]
+    assert get_store().stats() == {"transactions": 5, "enriched": 5}
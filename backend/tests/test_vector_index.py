@@ -0,0 +1,58 @@
+from backend.schemas import CategorizationResponse
+from backend.vector_index import VectorIndex
+
+CARREFOUR = CategorizationResponse(marchand_probable="Carrefour", categorie_suggeree="Alimentation", ville=None)
+SNCF = CategorizationResponse(marchand_probable="SNCF", categorie_suggeree="Transport", ville=None)
+
+def test_search_returns_nearest_neighbour_by_cosine(tmp_path):
+    index = VectorIndex(str(tmp_path / "vectors.sqlite3"), "embed-model", "prompt")
+    index.add("CB CARREFOUR MARKET", [1.0, 0.0, 0.1], CARREFOUR)
+    index.add("SNCF INTERNET", [0.0, 1.0, 0.0], SNCF)
+
+    (similarity, response), = index.search([[10.0, 0.5, 1.0]])
+    assert response == CARREFOUR
+    assert similarity > 0.99
+
+    assert index.match([[0.1, 1.0, 0.0], [1.0, 1.0, 1.0]], threshold=0.95) == [SNCF, None]
+    assert index.stats()["hits"] == 1
+    index.close()
+
+def test_index_grows_and_persists(tmp_path):
+    path = str(tmp_path / "vectors.sqlite3")
+    index = VectorIndex(path, "embed-model", "prompt")
+    for i in range(2000):
+        index.add(f"LIBELLE {i}", [float(i), 1.0], CARREFOUR)
+    index.add("LIBELLE 0", [0.0, 1.0], SNCF)
+    assert len(index) == 2000
+    index.close()
+
+    reopened = VectorIndex(path, "embed-model", "prompt")
+    assert len(reopened) == 2000
+    assert reopened.search([[0.0, 1.0]])[0][1] == SNCF
+    reopened.close()
+
+def test_other_embedding_model_is_purged(tmp_path):
+    path = str(tmp_path / "vectors.sqlite3")
+    index = VectorIndex(path, "embed-model", "prompt")
+    index.add("CB CARREFOUR MARKET", [1.0, 0.0], CARREFOUR)
+    index.close()
+
+    other = VectorIndex(path, "other-model", "prompt")
+    assert len(other) == 0
+    assert other.search([[1.0, 0.0]]) == [None]
+    other.close()
+
+def test_categorizations_from_another_prompt_are_purged(tmp_path):
+    path = str(tmp_path / "vectors.sqlite3")
+    index = VectorIndex(path, "embed-model", "ancien-prompt")
+    index.add("CB CARREFOUR MARKET", [1.0, 0.0], CARREFOUR)
+    index.close()
+
+    same = VectorIndex(path, "embed-model", "ancien-prompt")
+    assert len(same) == 1
+    same.close()
+
+    other = VectorIndex(path, "embed-model", "nouveau-prompt")
+    assert len(other) == 0
+    assert other.match([[1.0, 0.0]], threshold=0.9) == [None]
+    other.close()
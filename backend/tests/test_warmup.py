@@ -0,0 +1,46 @@
+import json
+import time
+import pytest
+import respx
+from httpx import Response
+from unittest.mock import AsyncMock, patch
+from fastapi.testclient import TestClient
+from backend import ai_service, anomaly, main, recurring
+from backend.llm_router import NoBackendAvailable
+from backend.warmup import DONE, WarmupState, warm_up
+
+@pytest.mark.asyncio
+async def test_warm_up_primes_local_state_and_retries_model_load():
+    state = WarmupState()
+    assert not state.ready
+    with patch("backend.warmup.preload_models", new_callable=AsyncMock) as preload:
+        preload.side_effect = [NoBackendAvailable("down"), 1]
+        await warm_up(state, retry_interval=0)
+
+    assert preload.await_count == 2
+    assert state.ready
+    assert set(state.steps.values()) == {DONE}
+    assert state.errors == {}
+    assert recurring._index is not None and anomaly._detector is not None and ai_service._cache is not None
+
+@respx.mock
+@pytest.mark.asyncio
+async def test_preload_models_keeps_model_loaded():
+    route = respx.post(ai_service.OLLAMA_API_URL).mock(return_value=Response(200, json={"done": True}))
+    assert await ai_service.preload_models() == 1
+    payload = json.loads(route.calls[0].request.content)
+    assert payload == {"model": ai_service.LLM_MODEL, "keep_alive": ai_service.OLLAMA_KEEP_ALIVE}
+
+def test_ready_endpoint_reports_warm_up_progress(monkeypatch):
+    monkeypatch.setattr(main, "WARMUP_ENABLED", True)
+    with patch("backend.warmup.preload_models", new_callable=AsyncMock, return_value=1):
+        with TestClient(main.app) as client:
+            deadline = time.monotonic() + 5
+            response = client.get("/ready")
+            while response.status_code != 200 and time.monotonic() < deadline:
+                assert response.json()["ready"] is False
+                time.sleep(0.01)
+                response = client.get("/ready")
+
+    assert response.status_code == 200
+    assert response.json()["steps"]["model"] == DONE
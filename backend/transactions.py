@@ -0,0 +1,114 @@
+# backend/transactions.py
+
+import datetime
+import sys
+from dataclasses import dataclass
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+from typing import Any, Dict, Optional
+
+# Champs facultatifs exportés seulement lorsqu'ils sont renseignés
+_RUN_FIELDS = ("index", "nouvelle", "anomalie", "seq", "occurrence")
+
+
+def to_cents(amount: float) -> int:
+    return int(round(amount * 100))
+
+
+def parse_cents(value: str) -> int:
+    """Montant OFX ('-12,50', '1500.00') → centimes entiers, sans passer par un float."""
+    try:
+        return int((Decimal(value.strip().replace(",", ".")) * 100).to_integral_value(ROUND_HALF_UP))
+    except InvalidOperation:
+        raise ValueError(f"Montant invalide : {value!r}")
+
+
+def intern(value: Optional[str]) -> Optional[str]:
+    """Partage les chaînes très répétées (comptes, marchands, catégories, villes) entre les lignes."""
+    return sys.intern(value) if value else value
+
+
+@dataclass(slots=True)
+class Transaction:
+    """
+    Transaction importée, telle qu'elle circule dans le backend.
+
+    Le montant est un nombre entier de centimes et la date un `datetime.date` ; les
+    chaînes répétées d'une ligne à l'autre sont internées. Les clés de l'API (montant
+    en euros, date ISO) ne sont produites qu'à la sérialisation, par `to_dict()`.
+    """
+
+    date: Optional[datetime.date]
+    amount_cents: int
+    description: Optional[str] = None
+    account_id: Optional[str] = None
+    fitid: Optional[str] = None
+    marchand_probable: Optional[str] = None
+    categorie_suggeree: Optional[str] = None
+    ville: Optional[str] = None
+    # Numéro d'entrée et de résultat dans l'analyse, et indicateurs posés par le pipeline
+    index: Optional[int] = None
+    seq: Optional[int] = None
+    nouvelle: Optional[bool] = None
+    anomalie: Optional[dict] = None
+    # Rang parmi les transactions identiques sans FITID d'un même envoi (1 pour la deuxième, etc.)
+    occurrence: Optional[int] = None
+
+    @property
+    def amount(self) -> float:
+        return self.amount_cents / 100
+
+    @property
+    def is_enriched(self) -> bool:
+        return self.categorie_suggeree is not None
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any], date_required: bool = True) -> "Transaction":
+        """
+        Transaction reçue de l'API ou relue d'un point de reprise. Lève ValueError
+        si le montant n'est pas numérique ou si la date n'est pas une chaîne au format
+        ISO ; une date absente n'est acceptée qu'avec `date_required=False`.
+        """
+        amount = data.get("amount")
+        if isinstance(amount, bool) or not isinstance(amount, (int, float)):
+            raise ValueError("Chaque transaction doit avoir un montant numérique ('amount').")
+        day = data.get("date")
+        if day is None and not date_required:
+            date = None
+        elif isinstance(day, str):
+            date = datetime.date.fromisoformat(day)
+        else:
+            raise ValueError("Chaque transaction doit avoir une date ISO ('date').")
+        return cls(
+            date=date,
+            amount_cents=to_cents(amount),
+            description=data.get("description"),
+            account_id=intern(data.get("account_id")),
+            fitid=data.get("fitid"),
+            marchand_probable=intern(data.get("marchand_probable")),
+            categorie_suggeree=intern(data.get("categorie_suggeree")),
+            ville=intern(data.get("ville")),
+            index=data.get("index"),
+            seq=data.get("seq"),
+            nouvelle=data.get("nouvelle"),
+            anomalie=data.get("anomalie"),
+            occurrence=data.get("occurrence"),
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Représentation de l'API : date ISO, montant en euros, enrichissement s'il existe."""
+        data = {
+            "date": self.date.isoformat() if self.date else None,
+            "amount": self.amount,
+            "description": self.description,
+            "account_id": self.account_id,
+            "fitid": self.fitid,
+        }
+        if self.is_enriched:
+            data["marchand_probable"] = self.marchand_probable
+            data["categorie_suggeree"] = self.categorie_suggeree
+            data["ville"] = self.ville
+        for name in _RUN_FIELDS:
+            value = getattr(self, name)
+            if value is not None:
+                data[name] = value
+        return data
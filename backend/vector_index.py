@@ -0,0 +1,155 @@
+# backend/vector_index.py
+
+import json
+import logging
+import sqlite3
+import threading
+import time
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .schemas import CategorizationResponse
+
+logger = logging.getLogger(__name__)
+
+_INITIAL_CAPACITY = 1024
+
+
+class VectorIndex:
+    """
+    Index des embeddings des libellés déjà catégorisés, pour la recherche du plus
+    proche voisin par similarité cosinus.
+
+    Les vecteurs sont normalisés à l'insertion et conservés en mémoire dans une
+    matrice NumPy (capacité doublée au besoin) : une recherche est un simple produit
+    matrice-vecteur. Ils sont aussi persistés dans SQLite avec la catégorisation
+    associée et l'empreinte `fingerprint` (modèle + prompt) sous laquelle elle a été
+    obtenue ; les vecteurs produits par un autre modèle d'embedding, ou dont la
+    catégorisation vient d'un autre modèle ou prompt, sont purgés à l'ouverture.
+    """
+
+    def __init__(self, path: str, model: str, fingerprint: str):
+        self.path = path
+        self.model = model
+        self.fingerprint = fingerprint
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS embeddings (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                payload TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                prompt_fingerprint TEXT
+            )
+        """)
+        # Index antérieurs à l'empreinte du prompt : leurs catégorisations sont purgées ci-dessous
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(embeddings)")}
+        if "prompt_fingerprint" not in columns:
+            self._conn.execute("ALTER TABLE embeddings ADD COLUMN prompt_fingerprint TEXT")
+        purged = self._conn.execute(
+            "DELETE FROM embeddings WHERE model != ? OR prompt_fingerprint IS NOT ?", (model, fingerprint)
+        ).rowcount
+        if purged:
+            logger.info(f"Index vectoriel : {purged} embeddings invalidés (modèle d'embedding, modèle ou prompt modifié).")
+        self._conn.commit()
+
+        self._keys: List[str] = []
+        self._positions = {}
+        self._payloads: List[CategorizationResponse] = []
+        self._vectors: Optional[np.ndarray] = None
+        for key, vector, payload in self._conn.execute("SELECT key, vector, payload FROM embeddings"):
+            self._append(key, np.frombuffer(vector, dtype=np.float32),
+                         CategorizationResponse(**json.loads(payload)))
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        return vectors / np.where(norms == 0, 1, norms)
+
+    def _append(self, key: str, vector: np.ndarray, response: CategorizationResponse) -> bool:
+        vector = self._normalize(np.asarray(vector, dtype=np.float32))
+        if self._vectors is None:
+            self._vectors = np.empty((_INITIAL_CAPACITY, vector.shape[0]), dtype=np.float32)
+        elif vector.shape[0] != self._vectors.shape[1]:
+            logger.warning(f"Embedding de dimension {vector.shape[0]} ignoré (index en {self._vectors.shape[1]}).")
+            return False
+        position = self._positions.get(key)
+        if position is None:
+            position = len(self._keys)
+            if position == self._vectors.shape[0]:
+                grown = np.empty((position * 2, self._vectors.shape[1]), dtype=np.float32)
+                grown[:position] = self._vectors[:position]
+                self._vectors = grown
+            self._keys.append(key)
+            self._payloads.append(response)
+            self._positions[key] = position
+        else:
+            self._payloads[position] = response
+        self._vectors[position] = vector
+        return True
+
+    def search(self, vectors: Sequence[Sequence[float]]) -> List[Optional[Tuple[float, CategorizationResponse]]]:
+        """
+        Retourne, pour chaque vecteur, (similarité cosinus, catégorisation) de son plus
+        proche voisin, ou None si l'index est vide ou de dimension différente.
+        """
+        queries = self._normalize(np.asarray(vectors, dtype=np.float32).reshape(len(vectors), -1))
+        with self._lock:
+            size = len(self._keys)
+            if not size or queries.shape[1] != self._vectors.shape[1]:
+                return [None] * len(queries)
+            similarities = queries @ self._vectors[:size].T
+            best = similarities.argmax(axis=1)
+            return [(float(similarities[row, column]), self._payloads[column])
+                    for row, column in enumerate(best)]
+
+    def match(self, vectors: Sequence[Sequence[float]], threshold: float) -> List[Optional[CategorizationResponse]]:
+        """Catégorisation du plus proche voisin de chaque vecteur, si sa similarité atteint `threshold`."""
+        matches = []
+        for neighbour in self.search(vectors):
+            if neighbour is not None and neighbour[0] >= threshold:
+                self.hits += 1
+                matches.append(neighbour[1])
+            else:
+                self.misses += 1
+                matches.append(None)
+        return matches
+
+    def add(self, key: str, vector: Sequence[float], response: CategorizationResponse) -> None:
+        """Ajoute (ou remplace) l'embedding d'un libellé et sa catégorisation."""
+        if not key:
+            return
+        array = np.asarray(vector, dtype=np.float32)
+        payload = json.dumps(response.model_dump(), ensure_ascii=False)
+        with self._lock:
+            if not self._append(key, array, response):
+                return
+            self._conn.execute(
+                "INSERT OR REPLACE INTO embeddings (key, model, vector, payload, created_at, prompt_fingerprint) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, self.model, array.tobytes(), payload, time.time(), self.fingerprint)
+            )
+            self._conn.commit()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,109 @@
+# backend/warmup.py
+
+import asyncio
+import logging
+import os
+import time
+from typing import Dict, Optional
+
+from .ai_service import get_cache, preload_models
+from .anomaly import get_anomaly_detector
+from .llm_router import OLLAMA_HEALTH_INTERVAL
+from .recurring import get_recurring_index
+from .rules import get_rules_engine
+
+logger = logging.getLogger(__name__)
+
+# Préchauffage au démarrage : modèle chargé dans Ollama, règles, cache et statistiques prêts
+WARMUP_ENABLED = os.getenv("REVELIO_WARMUP", "1").lower() not in ("0", "false", "no")
+
+PENDING = "pending"
+DONE = "done"
+FAILED = "failed"
+
+# Étapes locales : (nom, fonction, exécutée dans un thread)
+LOCAL_STEPS = (
+    ("rules", get_rules_engine, False),
+    ("cache", get_cache, False),
+    ("recurring", get_recurring_index, True),
+    ("anomalies", get_anomaly_detector, True),
+)
+STEPS = tuple(name for name, _, _ in LOCAL_STEPS) + ("model",)
+
+
+class WarmupState:
+    """
+    Avancement du préchauffage, étape par étape, exposé par /ready.
+
+    Le service est prêt quand toutes les étapes sont terminées avec succès. Avant cela,
+    les requêtes sont servies quand même, mais plus lentement : ce qui n'est pas encore
+    chargé (statistiques, modèle dans Ollama) l'est par la première requête qui en a besoin.
+    """
+
+    def __init__(self, steps=STEPS):
+        self.steps: Dict[str, str] = {name: PENDING for name in steps}
+        self.errors: Dict[str, str] = {}
+        self.started_at = time.time()
+        self.finished_at: Optional[float] = None
+
+    @property
+    def ready(self) -> bool:
+        return all(status == DONE for status in self.steps.values())
+
+    def set(self, name: str, status: str, error: Optional[BaseException] = None) -> None:
+        self.steps[name] = status
+        if error is not None:
+            self.errors[name] = repr(error)
+        else:
+            self.errors.pop(name, None)
+        if all(status != PENDING for status in self.steps.values()):
+            self.finished_at = self.finished_at or time.time()
+
+    def to_dict(self) -> dict:
+        end = self.finished_at or time.time()
+        return {
+            "ready": self.ready,
+            "steps": dict(self.steps),
+            "errors": dict(self.errors),
+            "elapsed_seconds": round(end - self.started_at, 3),
+        }
+
+
+async def warm_up(state: WarmupState, retry_interval: float = OLLAMA_HEALTH_INTERVAL) -> None:
+    """
+    Prépare le service en tâche de fond, sans retarder le démarrage du serveur.
+
+    Les règles et le cache sont ouverts dans la boucle (quelques millisecondes), les
+    paiements récurrents et les statistiques d'anomalies sont calculés dans un thread.
+    En parallèle, le modèle est chargé dans chaque instance Ollama (`keep_alive`) ; tant
+    qu'aucune instance ne l'a chargé, le chargement est retenté toutes les
+    `retry_interval` secondes.
+    """
+    async def load_model():
+        while True:
+            try:
+                started = time.perf_counter()
+                count = await preload_models()
+                logger.info(f"Modèle chargé dans {count} instance(s) Ollama en {time.perf_counter() - started:.1f}s.")
+                state.set("model", DONE)
+                return
+            except Exception as e:
+                logger.warning(f"Chargement du modèle impossible ({repr(e)}), nouvel essai dans {retry_interval}s.")
+                state.set("model", PENDING, e)
+                await asyncio.sleep(retry_interval)
+
+    model = asyncio.create_task(load_model())
+    try:
+        for name, prime, in_thread in LOCAL_STEPS:
+            try:
+                if in_thread:
+                    await asyncio.to_thread(prime)
+                else:
+                    prime()
+                state.set(name, DONE)
+            except Exception as e:
+                logger.error(f"Préchauffage « {name} » impossible : {repr(e)}")
+                state.set(name, FAILED, e)
+        await model
+    finally:
+        model.cancel()
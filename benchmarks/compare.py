@@ -0,0 +1,62 @@
+# benchmarks/compare.py
+
+import argparse
+import json
+import sys
+
+# (chemin dans le rapport, plus grand = mieux)
+_PARSE_METRICS = [("transactions_per_s", True), ("peak_memory_mb", False), ("streaming_peak_memory_mb", False)]
+_PIPELINE_METRICS = [("time_to_first_result_s", False), ("total_s", False),
+                     ("completion_ms.p50", False), ("completion_ms.p99", False)]
+
+
+def _get(report: dict, path: str):
+    value = report
+    for part in path.split("."):
+        value = value.get(part) if isinstance(value, dict) else None
+    return value
+
+
+def compare(baseline: dict, candidate: dict, threshold: float) -> list:
+    """Retourne les lignes (métrique, avant, après, écart relatif, régression ?) des deux rapports."""
+    rows = []
+
+    def add(label, before, after, higher_is_better):
+        if before is None or after is None or not before:
+            return
+        change = (after - before) / before
+        regression = (-change if higher_is_better else change) > threshold
+        rows.append((label, before, after, change, regression))
+
+    for metric, higher in _PARSE_METRICS:
+        add(f"parse.{metric}", _get(baseline, f"parse.{metric}"), _get(candidate, f"parse.{metric}"), higher)
+    runs = {run["concurrency"]: run for run in candidate.get("pipeline", [])}
+    for before_run in baseline.get("pipeline", []):
+        after_run = runs.get(before_run["concurrency"])
+        if after_run is None:
+            continue
+        for metric, higher in _PIPELINE_METRICS:
+            add(f"pipeline[c={before_run['concurrency']}].{metric}", _get(before_run, metric), _get(after_run, metric), higher)
+    return rows
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Compare deux rapports de benchmarks.")
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Dégradation relative tolérée (0.10 = 10 %%).")
+    args = parser.parse_args(argv)
+    with open(args.baseline, encoding="utf-8") as handle:
+        baseline = json.load(handle)
+    with open(args.candidate, encoding="utf-8") as handle:
+        candidate = json.load(handle)
+
+    print(f"{baseline['meta']['commit']} → {candidate['meta']['commit']}")
+    rows = compare(baseline, candidate, args.threshold)
+    for label, before, after, change, regression in rows:
+        print(f"{'!!' if regression else '  '} {label:45} {before:>12} → {after:<12} {change:+.1%}")
+    return 1 if any(row[4] for row in rows) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,139 @@
+# benchmarks/fake_ollama.py
+
+import argparse
+import asyncio
+import json
+import random
+import re
+import socket
+import threading
+import time
+from typing import List, Optional
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+_BATCH_COUNT_RE = re.compile(r"exactement (\d+) objets")
+_CATEGORIES = ["Alimentation", "Logement", "Transport", "Loisirs", "Santé", "Abonnements", "Autre"]
+
+
+class FakeOllama:
+    """
+    Faux serveur Ollama pour les benchmarks : /api/generate (en flux ou non),
+    /api/embed et /api/tags. Chaque requête attend une latence tirée selon une loi
+    normale (`latency` ± `jitter`, en secondes) puis renvoie une réponse valide.
+    Les temps de service sont relevés pour le rapport.
+    """
+
+    def __init__(self, latency: float = 0.2, jitter: float = 0.05, per_item: float = 0.0,
+                 trailing_tokens: int = 0, seed: int = 0):
+        self.latency = latency
+        self.jitter = jitter
+        self.per_item = per_item
+        self.trailing_tokens = trailing_tokens
+        self.requests = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.service_times: List[float] = []
+        self._rng = random.Random(seed)
+        self.app = self._build_app()
+        self._server: Optional[uvicorn.Server] = None
+        self._thread: Optional[threading.Thread] = None
+        self.port: Optional[int] = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def _delay(self, items: int) -> float:
+        return max(0.0, self._rng.gauss(self.latency, self.jitter)) + self.per_item * items
+
+    def _categorization(self) -> dict:
+        return {"marchand_probable": f"Marchand {self._rng.randint(1, 500)}",
+                "categorie_suggeree": self._rng.choice(_CATEGORIES), "ville": None}
+
+    def _build_app(self) -> FastAPI:
+        app = FastAPI()
+
+        @app.get("/api/tags")
+        async def tags():
+            return {"models": [{"name": "fake"}]}
+
+        @app.post("/api/embed")
+        async def embed(request: Request):
+            body = await request.json()
+            inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+            await asyncio.sleep(self._delay(0) / 10)
+            return {"embeddings": [[self._rng.random() for _ in range(64)] for _ in inputs]}
+
+        @app.post("/api/generate")
+        async def generate(request: Request):
+            body = await request.json()
+            if not body.get("prompt"):
+                # Sans prompt, Ollama se contente de charger le modèle (préchauffage)
+                return {"model": body.get("model"), "response": "", "done": True, "done_reason": "load"}
+            match = _BATCH_COUNT_RE.search(body["prompt"])
+            count = int(match.group(1)) if match else 1
+            if match:
+                answer = {"resultats": [self._categorization() for _ in range(count)]}
+            elif '"justification"' in body["prompt"]:
+                answer = {"justification": "Montant nettement supérieur à l'habitude."}
+            else:
+                answer = self._categorization()
+            text = json.dumps(answer, ensure_ascii=False) + " \n" * self.trailing_tokens
+
+            started = time.perf_counter()
+            self.requests += 1
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+            try:
+                await asyncio.sleep(self._delay(count))
+            finally:
+                self.in_flight -= 1
+            self.service_times.append(time.perf_counter() - started)
+            done = {"response": "", "done": True, "eval_count": len(text) // 4, "eval_duration": 10 ** 9}
+            if not body.get("stream", True):
+                return JSONResponse({**done, "response": text})
+
+            async def tokens():
+                for i in range(0, len(text), 8):
+                    yield json.dumps({"response": text[i:i + 8], "done": False}) + "\n"
+                yield json.dumps(done) + "\n"
+            return StreamingResponse(tokens(), media_type="application/x-ndjson")
+
+        return app
+
+    def start(self, port: int = 0) -> "FakeOllama":
+        """Démarre le serveur dans un thread (port libre si 0)."""
+        if not port:
+            with socket.socket() as probe:
+                probe.bind(("127.0.0.1", 0))
+                port = probe.getsockname()[1]
+        self.port = port
+        self._server = uvicorn.Server(uvicorn.Config(self.app, host="127.0.0.1", port=port, log_level="warning"))
+        self._thread = threading.Thread(target=self._server.run, daemon=True)
+        self._thread.start()
+        while not self._server.started:
+            time.sleep(0.01)
+        return self
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.should_exit = True
+            self._thread.join()
+            self._server = None
+
+    def stats(self) -> dict:
+        return {"requests": self.requests, "peak_in_flight": self.peak_in_flight}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Lance un faux serveur Ollama.")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--jitter", type=float, default=0.05)
+    parser.add_argument("--per-item", type=float, default=0.0)
+    args = parser.parse_args()
+    fake = FakeOllama(args.latency, args.jitter, args.per_item)
+    uvicorn.run(fake.app, host="127.0.0.1", port=args.port, log_level="warning")
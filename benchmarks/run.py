@@ -0,0 +1,255 @@
+# benchmarks/run.py
+"""
+Benchmarks du pipeline parsing → enrichissement.
+
+    python -m benchmarks.run --transactions 20000 --concurrency 1 4 16 --latency 0.2 --jitter 0.05
+
+Mesure le débit et la mémoire de `parse_ofx`, puis, pour chaque niveau de
+concurrence, une analyse complète via /ws/analyze contre un faux Ollama :
+temps jusqu'au premier résultat, temps total et percentiles du temps écoulé
+depuis le début de l'analyse à l'arrivée de chaque résultat. Le rapport JSON peut être comparé à un autre avec benchmarks.compare.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from typing import List
+
+import httpx
+import websockets
+
+from backend.ofx_parser import iter_ofx_transactions, parse_ofx
+from .fake_ollama import FakeOllama
+from .synthetic_ofx import generate_ofx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+UPLOAD_CHUNK_SIZE = 256 * 1024
+
+
+def percentiles(values: List[float], points=(50, 90, 99)) -> dict:
+    if not values:
+        return {}
+    ordered = sorted(values)
+    result = {f"p{p}": round(ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))], 2) for p in points}
+    result["max"] = round(ordered[-1], 2)
+    return result
+
+
+def bench_parse(data: bytes, repeats: int) -> dict:
+    """Débit de parse_ofx (meilleur de `repeats`) et pic mémoire, en bloc puis en flux depuis un fichier."""
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        count = len(parse_ofx(data))
+        timings.append(time.perf_counter() - started)
+    best = min(timings)
+
+    tracemalloc.start()
+    parse_ofx(data)
+    in_memory_peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    with tempfile.NamedTemporaryFile(suffix=".ofx", delete=False) as handle:
+        handle.write(data)
+    try:
+        tracemalloc.start()
+        with open(handle.name, "rb") as stream:
+            for _ in iter_ofx_transactions(stream):
+                pass
+        streaming_peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    finally:
+        os.unlink(handle.name)
+
+    return {
+        "transactions": count,
+        "bytes": len(data),
+        "best_s": round(best, 4),
+        "transactions_per_s": round(count / best),
+        "mb_per_s": round(len(data) / best / 1e6, 2),
+        "peak_memory_mb": round(in_memory_peak / 1e6, 2),
+        "streaming_peak_memory_mb": round(streaming_peak / 1e6, 2),
+    }
+
+
+def _free_port() -> int:
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+
+def _start_server(port: int, env: dict, log_path: str) -> subprocess.Popen:
+    """Lance l'application dans un processus séparé ; ses journaux vont dans `log_path`."""
+    with open(log_path, "wb") as log:
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "backend.main:app", "--port", str(port), "--log-level", "warning"],
+            cwd=ROOT, env=env, stdout=log, stderr=subprocess.STDOUT
+        )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            with open(log_path, encoding="utf-8", errors="replace") as log:
+                raise RuntimeError(f"Le serveur de l'application s'est arrêté au démarrage :\n{log.read()[-2000:]}")
+        # Attendre la fin du préchauffage : les mesures portent sur le régime établi
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/ready", timeout=1).status_code == 200:
+                return server
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.1)
+    server.kill()
+    raise RuntimeError("Le serveur de l'application n'a pas démarré.")
+
+
+def _stop_server(server: subprocess.Popen) -> None:
+    server.send_signal(signal.SIGINT)
+    try:
+        server.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        server.kill()
+
+
+async def _analyze(port: int, data: bytes) -> dict:
+    """Envoie le fichier sur /ws/analyze et chronomètre l'arrivée de chaque résultat."""
+    # Instant d'arrivée de chaque résultat depuis le début de l'analyse : le fichier est
+    # envoyé d'un bloc, ce n'est donc pas une latence par lot mais un temps de complétion.
+    completions: List[float] = []
+    first_result = None
+    async with websockets.connect(f"ws://127.0.0.1:{port}/ws/analyze", max_size=None) as ws:
+        started = time.perf_counter()
+
+        async def send():
+            await ws.send(json.dumps({"type": "upload", "filename": "benchmark.ofx"}))
+            for offset in range(0, len(data), UPLOAD_CHUNK_SIZE):
+                await ws.send(data[offset:offset + UPLOAD_CHUNK_SIZE])
+            await ws.send(json.dumps({"type": "end"}))
+
+        sender = asyncio.create_task(send())
+        try:
+            async for raw in ws:
+                message = json.loads(raw)
+                now = time.perf_counter() - started
+                if message["type"] == "progress":
+                    if first_result is None:
+                        first_result = now
+                    completions.extend([now * 1000] * len(message["data"]))
+                elif message["type"] == "complete":
+                    break
+                elif message["type"] == "error":
+                    raise RuntimeError(f"Analyse en erreur : {message['message']}")
+        finally:
+            sender.cancel()
+        total = time.perf_counter() - started
+
+    return {
+        "time_to_first_result_s": round(first_result or total, 4),
+        "total_s": round(total, 4),
+        "transactions": len(completions),
+        "transactions_per_s": round(len(completions) / total, 1),
+        "completion_ms": percentiles(completions),
+    }
+
+
+def bench_pipeline(data: bytes, concurrency: int, args, workdir: str) -> dict:
+    """Analyse complète avec un niveau de concurrence fixe, bases vides et faux Ollama dédié."""
+    fake = FakeOllama(args.latency, args.jitter, args.per_item, args.trailing_tokens, seed=concurrency).start()
+    run_dir = os.path.join(workdir, f"c{concurrency}")
+    os.makedirs(run_dir, exist_ok=True)
+    env = {
+        **os.environ,
+        "OLLAMA_BACKENDS": f"{fake.url}|1|{concurrency}",
+        "OLLAMA_MAX_CONNECTIONS": str(max(concurrency, 16)),
+        "REVELIO_INITIAL_CONCURRENCY": str(concurrency),
+        "REVELIO_MAX_CONCURRENCY": str(concurrency),
+        "REVELIO_DB_PATH": os.path.join(run_dir, "revelio.sqlite3"),
+        "REVELIO_CACHE_PATH": os.path.join(run_dir, "cache.sqlite3"),
+        "REVELIO_VECTOR_INDEX_PATH": os.path.join(run_dir, "vectors.sqlite3"),
+    }
+    port = _free_port()
+    server = _start_server(port, env, os.path.join(run_dir, "server.log"))
+    try:
+        result = asyncio.run(_analyze(port, data))
+    finally:
+        _stop_server(server)
+        fake.stop()
+    result["concurrency"] = concurrency
+    result["ollama"] = {**fake.stats(), "service_ms": percentiles([t * 1000 for t in fake.service_times])}
+    return result
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def main(argv=None) -> dict:
+    parser = argparse.ArgumentParser(description="Benchmarks du pipeline parsing → enrichissement.")
+    parser.add_argument("--transactions", type=int, default=10_000, help="Taille du fichier OFX synthétique.")
+    parser.add_argument("--accounts", type=int, default=2)
+    parser.add_argument("--merchants", type=int, default=19, help="Nombre de marchands distincts.")
+    parser.add_argument("--pipeline-transactions", type=int, default=None,
+                        help="Taille du fichier analysé de bout en bout (par défaut --transactions).")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--latency", type=float, default=0.2, help="Latence moyenne du faux Ollama (s).")
+    parser.add_argument("--jitter", type=float, default=0.05, help="Écart-type de la latence (s).")
+    parser.add_argument("--per-item", type=float, default=0.01, help="Latence ajoutée par libellé d'un lot (s).")
+    parser.add_argument("--trailing-tokens", type=int, default=20,
+                        help="Espaces générés après l'objet JSON, comme le font les petits modèles.")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--skip-pipeline", action="store_true")
+    parser.add_argument("--output", default=None, help="Fichier JSON (par défaut benchmarks/results/).")
+    args = parser.parse_args(argv)
+
+    commit = _git_commit()
+    report = {
+        "meta": {
+            "commit": commit,
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "parameters": vars(args),
+        }
+    }
+
+    data = generate_ofx(args.transactions, accounts=args.accounts, merchants=args.merchants)
+    report["parse"] = bench_parse(data, args.repeats)
+    print(f"parse_ofx : {report['parse']['transactions_per_s']} transactions/s, "
+          f"pic {report['parse']['peak_memory_mb']} Mo (flux : {report['parse']['streaming_peak_memory_mb']} Mo)")
+
+    report["pipeline"] = []
+    if not args.skip_pipeline:
+        pipeline_data = data
+        if args.pipeline_transactions is not None:
+            pipeline_data = generate_ofx(args.pipeline_transactions, accounts=args.accounts, merchants=args.merchants)
+        with tempfile.TemporaryDirectory() as workdir:
+            for concurrency in args.concurrency:
+                result = bench_pipeline(pipeline_data, concurrency, args, workdir)
+                report["pipeline"].append(result)
+                print(f"concurrence {concurrency} : premier résultat {result['time_to_first_result_s']} s, "
+                      f"total {result['total_s']} s, complétion {result['completion_ms']}")
+
+    output = args.output or os.path.join(
+        ROOT, "benchmarks", "results", f"bench-{commit}-{datetime.now():%Y%m%d-%H%M%S}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as handle:
+        json.dump(report, handle, indent=2, ensure_ascii=False)
+    print(f"Rapport écrit dans {output}")
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+# benchmarks/synthetic_ofx.py
+
+import argparse
+import random
+from datetime import date, timedelta
+from typing import Iterator
+
+# Libellés typiques ; les suffixes (magasin, date, référence) varient d'une transaction à l'autre
+MERCHANTS = [
+    "CB CARREFOUR MARKET {store}", "CB LECLERC {store}", "CB MONOPRIX {store}", "CB LIDL {store}",
+    "PRLV SEPA NETFLIX {ref}", "PRLV SEPA SPOTIFY {ref}", "PRLV SEPA EDF {ref}", "PRLV SEPA FREE MOBILE {ref}",
+    "CB SNCF INTERNET {date}", "CB TOTALENERGIES {store}", "CB AMAZON PAYMENTS {ref}", "CB FNAC {store}",
+    "CB BOULANGERIE DU MARCHE {date}", "CB PHARMACIE CENTRALE {store}", "CB UBER TRIP {ref}",
+    "VIR SEPA LOYER {ref}", "CB DECATHLON {store}", "CB IKEA {store}", "RETRAIT DAB {store} {date}",
+]
+
+_HEADER = """OFXHEADER:100
+DATA:OFXSGML
+VERSION:102
+SECURITY:NONE
+ENCODING:USASCII
+CHARSET:1252
+COMPRESSION:NONE
+OLDFILEUID:NONE
+NEWFILEUID:NONE
+
+<OFX>
+<BANKMSGSRSV1>
+<STMTTRNRS>
+<TRNUID>1
+<STMTRS>
+<CURDEF>EUR
+"""
+
+
+def _description(rng: random.Random, merchant_count: int, day: date) -> str:
+    template = MERCHANTS[rng.randrange(min(merchant_count, len(MERCHANTS)))]
+    return template.format(
+        store=rng.randint(1, 40 * merchant_count),
+        ref=rng.randint(100000, 999999),
+        date=day.strftime("%d/%m"),
+    )
+
+
+def iter_ofx(transactions: int, accounts: int = 1, merchants: int = len(MERCHANTS),
+             seed: int = 42, start: date = date(2020, 1, 1)) -> Iterator[str]:
+    """
+    Produit, morceau par morceau, un fichier OFX (SGML 1.02) de `transactions` transactions
+    réparties sur `accounts` comptes. `merchants` règle le nombre de marchands distincts.
+    """
+    rng = random.Random(seed)
+    yield _HEADER
+    per_account = [transactions // accounts + (1 if i < transactions % accounts else 0) for i in range(accounts)]
+    for account, count in enumerate(per_account):
+        yield (f"<BANKACCTFROM>\n<BANKID>30004\n<BRANCHID>00001\n<ACCTID>{10000000 + account}\n"
+               f"<ACCTTYPE>CHECKING\n</BANKACCTFROM>\n<BANKTRANLIST>\n<DTSTART>{start:%Y%m%d}\n")
+        day = start
+        for i in range(count):
+            day += timedelta(days=rng.random() < 0.3)
+            amount = -round(rng.lognormvariate(3.2, 0.9), 2) if rng.random() < 0.93 else round(rng.uniform(500, 3000), 2)
+            yield (f"<STMTTRN>\n<TRNTYPE>{'DEBIT' if amount < 0 else 'CREDIT'}\n<DTPOSTED>{day:%Y%m%d}\n"
+                   f"<TRNAMT>{amount:.2f}\n<FITID>{account}-{i:09d}\n"
+                   f"<NAME>{_description(rng, merchants, day)[:32]}\n</STMTTRN>\n")
+        yield f"</BANKTRANLIST>\n<LEDGERBAL>\n<BALAMT>0.00\n<DTASOF>{day:%Y%m%d}\n</LEDGERBAL>\n"
+    yield "</STMTRS>\n</STMTTRNRS>\n</BANKMSGSRSV1>\n</OFX>\n"
+
+
+def generate_ofx(transactions: int, **options) -> bytes:
+    return "".join(iter_ofx(transactions, **options)).encode("cp1252")
+
+
+def write_ofx(path: str, transactions: int, **options) -> None:
+    with open(path, "w", encoding="cp1252") as handle:
+        handle.writelines(iter_ofx(transactions, **options))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Génère un fichier OFX synthétique.")
+    parser.add_argument("output")
+    parser.add_argument("--transactions", type=int, default=10_000)
+    parser.add_argument("--accounts", type=int, default=1)
+    parser.add_argument("--merchants", type=int, default=len(MERCHANTS))
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    write_ofx(args.output, args.transactions, accounts=args.accounts, merchants=args.merchants, seed=args.seed)